@@ -0,0 +1,114 @@
+import argparse
+import itertools
+import math
+import random
+import time
+
+from tabulate import tabulate
+
+from prices.lib.database import Database
+from prices.lib.optimizer import optimize_basket
+
+# Time the basket optimizer against exhaustive search on synthetic shopping lists:
+#   python -m prices.bench.basket --items 100 --items 200 --locations 60 --max-stores 3
+# Or plan a list made of every comparison in a database, across all of its locations:
+#   python -m prices.bench.basket --database prices.db
+
+
+def synthetic_prices(items: int, locations: int, stock_rate: float, seed: int) -> dict:
+    # Each location prices items around a store-wide level, so some locations are consistently cheaper, as in
+    # real data
+    rng = random.Random(seed)
+    levels = [rng.uniform(0.85, 1.15) for _ in range(locations)]
+    prices = {}
+    for item in range(items):
+        base = rng.uniform(1, 15)
+        prices[item] = {
+            location: round(base * levels[location] * rng.uniform(0.9, 1.1), 2)
+            for location in range(locations)
+            if rng.random() < stock_rate
+        }
+    return prices
+
+
+def database_prices(database_path: str) -> dict:
+    with Database(database_path) as db:
+        comparison_ids = [comparison["id"] for comparison in db.list_comparisons()]
+        offers = db.get_basket_offers(comparison_ids)
+
+    prices = {comparison_id: {} for comparison_id in comparison_ids}
+    for offer in offers:
+        prices[offer["comparison_id"]][offer["location_id"]] = offer["price"]
+    return prices
+
+
+def exhaustive(prices: dict, max_stores: int) -> tuple[float, int]:
+    # Every subset of up to max_stores locations; returns the best total for the most items covered
+    locations = sorted({location for offers in prices.values() for location in offers})
+    best = (math.inf, math.inf)
+    subsets = 0
+
+    for size in range(1, max_stores + 1):
+        for subset in itertools.combinations(locations, size):
+            subsets += 1
+            missing = 0
+            total = 0.0
+            for offers in prices.values():
+                stocked = [offers[location] for location in subset if location in offers]
+                if stocked:
+                    total += min(stocked)
+                else:
+                    missing += 1
+            best = min(best, (missing, total))
+
+    return best[1], subsets
+
+
+def bench(label: str, prices: dict, max_stores: int, brute_force_limit: int) -> list:
+    locations = len({location for offers in prices.values() for location in offers})
+
+    start = time.perf_counter()
+    plan = optimize_basket(prices, max_stores)
+    elapsed = time.perf_counter() - start
+
+    brute_seconds = ""
+    matches = ""
+    if math.comb(locations, max_stores) <= brute_force_limit:
+        start = time.perf_counter()
+        total, _ = exhaustive(prices, max_stores)
+        brute_seconds = f"{time.perf_counter() - start:.3f}"
+        matches = "yes" if math.isclose(total, plan.total, abs_tol=0.005) else "NO"
+
+    return [label, len(prices), locations, max_stores, f"{plan.total:.2f}", len(plan.unavailable), plan.nodes,
+            f"{elapsed:.3f}", brute_seconds, matches]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the cheapest-basket optimizer")
+    parser.add_argument("--database", help="Plan every comparison in this database instead of synthetic lists")
+    parser.add_argument("--items", type=int, action="append", help="Synthetic list sizes (default 100 and 200)")
+    parser.add_argument("--locations", type=int, default=40)
+    parser.add_argument("--stock-rate", type=float, default=0.8, help="Chance a location stocks a given item")
+    parser.add_argument("--max-stores", type=int, action="append", help="Store limits to try (default 1 to 3)")
+    parser.add_argument("--brute-force-limit", type=int, default=20000,
+                        help="Also run exhaustive search when it has at most this many largest-size subsets")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    limits = args.max_stores or [1, 2, 3]
+
+    if args.database:
+        cases = [(args.database, database_prices(args.database))]
+    else:
+        cases = [(f"synthetic {items}", synthetic_prices(items, args.locations, args.stock_rate, args.seed))
+                 for items in args.items or [100, 200]]
+
+    rows = [bench(label, prices, max_stores, args.brute_force_limit)
+            for label, prices in cases for max_stores in limits]
+
+    print(tabulate(rows, headers=["List", "Items", "Locations", "Max stores", "Total", "Unavailable", "Nodes",
+                                  "Seconds", "Exhaustive s", "Matches"]))
+
+
+if __name__ == "__main__":
+    main()
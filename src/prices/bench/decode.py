@@ -0,0 +1,118 @@
+import argparse
+import base64
+import gzip
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from tabulate import tabulate
+
+from prices.bench.scrapers import DEFAULT_FIXTURES, list_archives
+from prices.scrape import decode
+
+# Time JSON decoding of the responses in recorded fixture archives (see prices.bench.scrapers):
+#   python -m prices.bench.decode --processes 4 --threads 4
+# Each store's documents are decoded with the standard library, with the fast parser if installed, with the
+# scraper's field extractor, and through the process pool from several threads at once as concurrent scrapers would.
+
+# Which extractor the scrapers apply to a response, by URL
+EXTRACTORS = [
+    ("storefrontgateway.", decode.storefront_page),
+    ("api.aldi.us/v3/product-search", decode.aldi_products),
+    ("api.aldi.us/v2/products/", decode.aldi_product_detail),
+]
+
+
+def extractor_for(url: str):
+    for pattern, extract in EXTRACTORS:
+        if pattern in url:
+            return extract
+    return None
+
+
+def load_documents(path: str) -> list[tuple[bytes, object]]:
+    documents = []
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            exchange = json.loads(line)
+            content = base64.b64decode(exchange["content"])
+            if exchange["status"] == 200 and content[:1] in (b"{", b"["):
+                documents.append((content, extractor_for(exchange["url"])))
+    return documents
+
+
+def timed(function, documents: list, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(documents)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def stdlib(documents):
+    for content, _ in documents:
+        json.loads(content)
+
+
+def fast(documents):
+    for content, _ in documents:
+        decode.loads(content)
+
+
+def extracted(documents):
+    for content, extract in documents:
+        decode._decode(content, extract)
+
+
+def pooled(threads: int):
+    def run(documents):
+        with ThreadPoolExecutor(threads) as executor:
+            list(executor.map(lambda document: decode.decode(*document), documents))
+    return run
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark JSON decoding of recorded scraper responses")
+    parser.add_argument("--fixtures", default=DEFAULT_FIXTURES)
+    parser.add_argument("--processes", type=int, default=4, help="Decode pool size for the pooled run")
+    parser.add_argument("--threads", type=int, default=4, help="Concurrent decoding threads for the pooled run")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    archives = list_archives(args.fixtures)
+    if not archives:
+        raise SystemExit(f"No fixture archives in {args.fixtures}; record some with prices.bench.scrapers first")
+
+    decode.DECODE_PROCESSES = args.processes
+    # Warm the pool up so worker start-up isn't counted
+    decode._get_pool().submit(decode.loads, b"{}").result()
+
+    rows = []
+    for slug, location_code, path in archives:
+        documents = load_documents(path)
+        if not documents:
+            continue
+
+        size = sum(len(content) for content, _ in documents)
+        stdlib_seconds = timed(stdlib, documents, args.repeat)
+        fast_seconds = timed(fast, documents, args.repeat) if decode.orjson is not None else None
+        rows.append([
+            f"{slug} {location_code}",
+            len(documents),
+            f"{size / 1_000_000:.1f}",
+            f"{stdlib_seconds:.3f}",
+            f"{fast_seconds:.3f}" if fast_seconds is not None else "not installed",
+            f"{timed(extracted, documents, args.repeat):.3f}",
+            f"{timed(pooled(args.threads), documents, args.repeat):.3f}",
+            f"{size / 1_000_000 / stdlib_seconds:.0f}"
+        ])
+
+    decode.shutdown()
+
+    print(tabulate(rows, headers=["Archive", "Documents", "MB", "json s", "orjson s", "Extracted s",
+                                  f"Pool {args.processes}p/{args.threads}t s", "json MB/s"]))
+
+
+if __name__ == "__main__":
+    main()
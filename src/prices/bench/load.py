@@ -0,0 +1,152 @@
+import argparse
+import itertools
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+import requests
+from tabulate import tabulate
+
+# Compare the sync gunicorn setup with the ASGI server under the same concurrent load, against ./prices.db:
+#   python -m prices.bench.load --server sync --server asgi --clients 32 --duration 20
+# Or load an already running server:
+#   python -m prices.bench.load --url http://127.0.0.1:8000
+
+SERVERS = {
+    "sync": lambda port, workers: [sys.executable, "-m", "gunicorn", "--workers", str(workers), "--bind",
+                                   f"127.0.0.1:{port}", "prices.web.main:app"],
+    "asgi": lambda port, workers: [sys.executable, "-m", "uvicorn", "--workers", str(workers), "--port", str(port),
+                                   "--log-level", "warning", "prices.web.asgi:app"],
+}
+
+
+def wait_until_ready(url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(f"{url}/api/bargains?limit=1", timeout=1)
+            return
+        except requests.ConnectionError:
+            time.sleep(0.2)
+
+    raise SystemExit(f"Server at {url} didn't start within {timeout:.0f}s")
+
+
+def default_paths(url: str) -> list[str]:
+    # A mix of the hot API reads, using a real product for the price-history requests
+    paths = ["/api/products?limit=50", "/api/products?q=milk&limit=50", "/api/bargains?limit=50", "/api/comparisons"]
+
+    products = requests.get(f"{url}/api/products?limit=1", timeout=10).json()["items"]
+    if products:
+        store, sku = products[0]["store"], products[0]["sku"]
+        paths.append(f"/api/price-history/{store}/{sku}")
+        paths.append(f"/api/price-history/{store}/{sku}/prices.ndjson")
+
+    return paths
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return float("nan")
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def run_load(url: str, paths: list[str], clients: int, duration: float, bust_cache: bool) -> dict:
+    latencies = {path: [] for path in paths}
+    errors = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client(offset: int):
+        session = requests.Session()
+        for path in itertools.islice(itertools.cycle(paths), offset, None):
+            if time.monotonic() >= deadline:
+                return
+
+            target = f"{url}{path}"
+            if bust_cache:
+                # A unique query string makes every request miss the server's response cache
+                target += ("&" if "?" in path else "?") + f"_={uuid.uuid4().hex}"
+
+            start = time.perf_counter()
+            try:
+                response = session.get(target, timeout=60)
+                ok = response.status_code < 500
+            except requests.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - start
+
+            with lock:
+                if ok:
+                    latencies[path].append(elapsed)
+                else:
+                    errors.append(path)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    return {"latencies": latencies, "errors": len(errors), "seconds": elapsed}
+
+
+def report(label: str, result: dict) -> list[list]:
+    rows = []
+    everything = sorted(itertools.chain.from_iterable(result["latencies"].values()))
+
+    for path, values in [*result["latencies"].items(), ("all", everything)]:
+        values = sorted(values)
+        rows.append([
+            label,
+            path,
+            len(values),
+            f"{len(values) / result['seconds']:.1f}",
+            f"{percentile(values, 0.5) * 1000:.1f}",
+            f"{percentile(values, 0.99) * 1000:.1f}",
+            result["errors"] if path == "all" else ""
+        ])
+
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure API latency under concurrent clients")
+    parser.add_argument("--server", action="append", choices=sorted(SERVERS),
+                        help="Start this server mode and load it; may be repeated to compare modes")
+    parser.add_argument("--url", help="Load an already running server instead")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=2, help="Worker processes for started servers")
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds of load per server")
+    parser.add_argument("--bust-cache", action="store_true", help="Defeat the server's response cache")
+    args = parser.parse_args()
+
+    if not args.url and not args.server:
+        parser.error("pass --server and/or --url")
+
+    rows = []
+
+    if args.url:
+        url = args.url.rstrip("/")
+        rows += report(url, run_load(url, default_paths(url), args.clients, args.duration, args.bust_cache))
+
+    for mode in args.server or []:
+        url = f"http://127.0.0.1:{args.port}"
+        process = subprocess.Popen(SERVERS[mode](args.port, args.workers))
+        try:
+            wait_until_ready(url)
+            rows += report(mode, run_load(url, default_paths(url), args.clients, args.duration, args.bust_cache))
+        finally:
+            process.terminate()
+            process.wait()
+
+    print(tabulate(rows, headers=["Server", "Path", "Requests", "Req/s", "p50 ms", "p99 ms", "Errors"]))
+
+
+if __name__ == "__main__":
+    main()
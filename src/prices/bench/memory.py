@@ -0,0 +1,145 @@
+import argparse
+import gc
+import json
+import multiprocessing
+import random
+import resource
+
+from tabulate import tabulate
+
+from prices.lib.product import ScrapedProduct
+
+# Compare the memory held by scraped products waiting for the database worker, as the dicts queued one at a time
+# before and as the batched ScrapedProduct records queued now:
+#   python -m prices.bench.memory --items 200000
+# Each representation runs in a fresh interpreter. Items are decoded from JSON pages, as the scrapers do, so every
+# string starts out as a separate object.
+
+BRANDS = ["Trader Joe's", "Essential Everyday", "Kemps", "Barilla", "General Mills", "Kraft", "Annie's", "Tillamook"]
+UNITS = ["oz", "lb", "ea", "gal", "qt", "ct", "fl oz"]
+CATEGORIES = ["Dairy & Eggs", "Produce", "Frozen", "Pantry", "Bakery", "Meat & Seafood", "Beverages", "Snacks",
+              "Deli", "Household"]
+
+PAGE_SIZE = 50
+BATCH_SIZE = 500
+
+
+def pages(items: int, seed: int):
+    rng = random.Random(seed)
+    for start in range(0, items, PAGE_SIZE):
+        page = [{
+            "sku": f"{rng.randrange(10 ** 13):014d}",
+            "name": f"{rng.choice(BRANDS)} {rng.choice(['Organic', 'Whole', 'Lite', 'Classic'])} item {start + i}",
+            "price": round(rng.uniform(0.5, 20), 2),
+            "size": rng.choice([1, 8, 12, 16, 32, 64]),
+            "brand": rng.choice(BRANDS),
+            "unit": rng.choice(UNITS),
+            "snap_eligible": rng.random() < 0.8,
+            "available": rng.random() < 0.95,
+            "category": rng.choice(CATEGORIES)
+        } for i in range(min(PAGE_SIZE, items - start))]
+        yield json.dumps(page)
+
+
+def queued_dicts(items: int, seed: int) -> list:
+    # One (location_id, dict) tuple per product
+    queued = []
+    for page in pages(items, seed):
+        for item in json.loads(page):
+            queued.append((1, {
+                'sku': item["sku"],
+                'name': item["name"],
+                'price': item["price"],
+                'size': item["size"],
+                'brand': item["brand"],
+                'unit': item["unit"],
+                'snap_eligible': item["snap_eligible"],
+                'available': item["available"],
+                'category': item["category"]
+            }))
+    return queued
+
+
+def queued_records(items: int, seed: int) -> list:
+    # One (location_id, [ScrapedProduct, ...]) tuple per batch
+    queued = []
+    batch = []
+    for page in pages(items, seed):
+        for item in json.loads(page):
+            batch.append(ScrapedProduct.create(item["sku"], item["name"], item["price"], item["size"], item["brand"],
+                                               item["unit"], item["snap_eligible"], item["available"],
+                                               item["category"]))
+            if len(batch) >= BATCH_SIZE:
+                queued.append((1, batch))
+                batch = []
+    if batch:
+        queued.append((1, batch))
+    return queued
+
+
+REPRESENTATIONS = {
+    "dicts": queued_dicts,
+    "records": queued_records,
+}
+
+
+def rss_mb() -> float:
+    # Current resident set size; ru_maxrss would only give the peak
+    with open("/proc/self/statm") as f:
+        pages_resident = int(f.read().split()[1])
+    return pages_resident * resource.getpagesize() / 1024 / 1024
+
+
+def _measure(name: str, items: int, seed: int, results):
+    gc.collect()
+    before = rss_mb()
+
+    queued = REPRESENTATIONS[name](items, seed)
+
+    gc.collect()
+    held = rss_mb() - before
+
+    results.put({
+        "representation": name,
+        "items": items,
+        "queued": len(queued),
+        "held_mb": held,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    })
+
+
+def _run_isolated(target, *args):
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=target, args=(*args, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the memory held by queued scraped products")
+    parser.add_argument("--items", type=int, default=200000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rows = [_run_isolated(_measure, name, args.items, args.seed) for name in REPRESENTATIONS]
+    baseline = rows[0]["held_mb"]
+
+    table = [[
+        row["representation"],
+        row["items"],
+        row["queued"],
+        f"{row['held_mb']:.1f}",
+        f"{row['held_mb'] * 1024 * 1024 / row['items']:.0f}",
+        f"{row['held_mb'] / baseline:.0%}",
+        f"{row['peak_rss_mb']:.1f}"
+    ] for row in rows]
+
+    print(tabulate(table, headers=["Representation", "Items", "Queue entries", "Held (MB)", "Bytes/item",
+                                   "vs dicts", "Peak RSS (MB)"]))
+
+
+if __name__ == "__main__":
+    main()
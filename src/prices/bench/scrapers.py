@@ -0,0 +1,208 @@
+import argparse
+import glob
+import multiprocessing
+import os
+import queue
+import resource
+import tempfile
+import time
+
+from tabulate import tabulate
+
+from prices.lib.database import Database
+from prices.scrape import util
+from prices.scrape.aldi import scrape_aldi_products
+from prices.scrape.cub import scrape_cub_products
+from prices.scrape.fixtures import recording, replaying
+from prices.scrape.fresh_thyme import scrape_fresh_thyme_products
+from prices.scrape.hyvee import scrape_hyvee_products
+from prices.scrape.trader_joes import scrape_trader_joes_products
+
+# Record live traffic once:
+#   python -m prices.bench.scrapers record --store cub --location 1234
+# Then benchmark every recorded archive and the full pipeline offline:
+#   python -m prices.bench.scrapers run --latency 0.05
+
+STORES = {
+    "aldi": ("ALDI", scrape_aldi_products),
+    "cub": ("Cub", scrape_cub_products),
+    "fresh-thyme": ("Fresh Thyme", scrape_fresh_thyme_products),
+    "hyvee": ("Hy-Vee", scrape_hyvee_products),
+    "trader-joes": ("Trader Joe's", scrape_trader_joes_products),
+}
+
+DEFAULT_FIXTURES = "fixtures"
+
+
+def archive_path(fixtures: str, slug: str, location_code: str) -> str:
+    return os.path.join(fixtures, f"{slug}__{location_code}.jsonl.gz")
+
+
+def list_archives(fixtures: str) -> list[tuple[str, str, str]]:
+    archives = []
+    for path in sorted(glob.glob(os.path.join(fixtures, "*__*.jsonl.gz"))):
+        slug, location_code = os.path.basename(path)[:-len(".jsonl.gz")].split("__", 1)
+        if slug in STORES:
+            archives.append((slug, location_code, path))
+    return archives
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def record(slug: str, location_code: str, fixtures: str, limit: int | None):
+    _, scraper = STORES[slug]
+    path = archive_path(fixtures, slug, location_code)
+
+    if os.path.exists(path):
+        os.remove(path)
+
+    products = 0
+    with recording(path) as adapter:
+        for _ in scraper(location_code):
+            products += 1
+            if limit and products >= limit:
+                break
+
+    print(f"Recorded {adapter.request_count} requests ({products} products) to {path}")
+
+
+def _bench_scraper(slug: str, location_code: str, path: str, latency: float, throttle: bool, results):
+    if not throttle:
+        util.REQUEST_DELAY = 0
+
+    _, scraper = STORES[slug]
+    products = 0
+
+    with replaying(path, latency) as adapter:
+        start = time.perf_counter()
+        for _ in scraper(location_code):
+            products += 1
+        elapsed = time.perf_counter() - start
+
+    results.put({
+        "scraper": f"{slug} {location_code}",
+        "products": products,
+        "requests": adapter.request_count,
+        "misses": adapter.misses,
+        "seconds": elapsed,
+        "peak_rss_mb": peak_rss_mb()
+    })
+
+
+def _bench_pipeline(fixtures: str, latency: float, throttle: bool, results):
+    from prices.scrape.main import SCRAPERS, run_multi_threaded
+
+    if not throttle:
+        util.REQUEST_DELAY = 0
+
+    with tempfile.TemporaryDirectory() as directory:
+        database_path = os.path.join(directory, "prices.db")
+
+        with Database(database_path) as db:
+            for slug, location_code, _ in list_archives(fixtures):
+                store, _ = STORES[slug]
+                db.create_location(store, location_code, location_code, "")
+
+        with replaying(fixtures, latency) as adapter:
+            start = time.perf_counter()
+            run_multi_threaded(database_path)
+            elapsed = time.perf_counter() - start
+
+        with Database(database_path) as db:
+            db.local.cursor.execute("SELECT COUNT(*) FROM prices")
+            products = db.local.cursor.fetchone()[0]
+
+    results.put({
+        # Only the stores run_multi_threaded has enabled are scraped, whatever the fixtures hold
+        "scraper": f"run_multi_threaded ({', '.join(SCRAPERS)})",
+        "products": products,
+        "requests": adapter.request_count,
+        "misses": adapter.misses,
+        "seconds": elapsed,
+        "peak_rss_mb": peak_rss_mb()
+    })
+
+
+def _run_isolated(target, *args):
+    # Each benchmark gets a fresh interpreter so peak RSS is attributable to that scraper alone
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=target, args=(*args, results))
+    process.start()
+
+    # A child that dies, on an unreplayable request say, never puts a result, so don't wait on it forever
+    while True:
+        # Checked before the wait, so a result put just before exiting is still read
+        exited = process.exitcode is not None
+        try:
+            result = results.get(timeout=1)
+            break
+        except queue.Empty:
+            if exited:
+                raise SystemExit(f"{target.__name__} {' '.join(map(str, args[:2]))} exited with code "
+                                 f"{process.exitcode} without a result")
+
+    process.join()
+    return result
+
+
+def run(fixtures: str, latency: float, throttle: bool, pipeline: bool):
+    archives = list_archives(fixtures)
+    if not archives:
+        raise SystemExit(f"No fixture archives in {fixtures}; record some first")
+
+    rows = []
+    for slug, location_code, path in archives:
+        rows.append(_run_isolated(_bench_scraper, slug, location_code, path, latency, throttle))
+
+    if pipeline:
+        rows.append(_run_isolated(_bench_pipeline, fixtures, latency, throttle))
+
+    table = []
+    for row in rows:
+        seconds = row["seconds"] or float("nan")
+        products = row["products"] or float("nan")
+        table.append([
+            row["scraper"],
+            row["products"],
+            row["requests"],
+            row["misses"],
+            f"{row['seconds']:.2f}",
+            f"{row['products'] / seconds:.1f}",
+            f"{row['requests'] / products:.2f}",
+            f"{row['peak_rss_mb']:.1f}"
+        ])
+
+    print(tabulate(table, headers=["Scraper", "Products", "Requests", "Misses", "Seconds", "Products/s",
+                                   "Requests/product", "Peak RSS (MB)"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record and replay store API traffic to benchmark the scrapers")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = subparsers.add_parser("record", help="Scrape a live location and save its HTTP traffic")
+    record_parser.add_argument("--store", choices=sorted(STORES), required=True)
+    record_parser.add_argument("--location", required=True, help="Store location code passed to the scraper")
+    record_parser.add_argument("--fixtures", default=DEFAULT_FIXTURES)
+    record_parser.add_argument("--limit", type=int, help="Stop after this many products")
+
+    run_parser = subparsers.add_parser("run", help="Benchmark every recorded archive offline")
+    run_parser.add_argument("--fixtures", default=DEFAULT_FIXTURES)
+    run_parser.add_argument("--latency", type=float, default=0.0, help="Simulated seconds per request")
+    run_parser.add_argument("--throttle", action="store_true", help="Keep the scrapers' politeness delay")
+    run_parser.add_argument("--no-pipeline", action="store_true", help="Skip the run_multi_threaded benchmark")
+
+    args = parser.parse_args()
+
+    if args.command == "record":
+        record(args.store, args.location, args.fixtures, args.limit)
+    else:
+        run(args.fixtures, args.latency, args.throttle, not args.no_pipeline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+import argparse
+import multiprocessing
+import os
+import queue
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import date, timedelta
+
+from tabulate import tabulate
+
+from prices.bench import synthetic
+from prices.lib import database
+from prices.lib.constants import CATEGORIES
+from prices.lib.database import Database
+from prices.lib.product import ScrapedProduct
+from prices.scrape.main import DB_BATCH_SIZE
+
+# Compare the SQLite pragma profiles in prices.lib.database.PROFILES on the scraper's ingest and the web app's reads:
+#   python -m prices.bench.sqlite --profile default --profile ingest --profile serving
+# Try other settings as an extra "custom" profile layered over one of them:
+#   python -m prices.bench.sqlite --base-profile serving --pragma cache_size=-1048576 --pragma mmap_size=0
+# The dataset comes from prices.bench.synthetic: 100M price rows by default, which is 5 stores, 100 locations and about
+# 100k products over a year of weekly scrapes. It's generated once per size, seed and end date into --data-dir and
+# copied for each profile so they all start from the same file; it ends yesterday unless --end says otherwise, so
+# pass the date of an earlier dataset to reuse it. Each profile replays today's scrape of --ingest-locations
+# locations, then the bargain job, then a seeded mix of the serving reads, each phase in a fresh interpreter.
+
+QUERIES = ["search", "browse", "comparison", "comparisons", "history", "prices", "bargains"]
+
+
+def prepare(source: str, target: str, pragmas: dict):
+    shutil.copyfile(source, target)
+
+    # A profile's page size only applies once the file is rebuilt with it
+    if "page_size" in pragmas:
+        conn = sqlite3.connect(target)
+        if conn.execute("PRAGMA page_size").fetchone()[0] != pragmas["page_size"]:
+            conn.execute(f"PRAGMA page_size={pragmas['page_size']}")
+            conn.execute("VACUUM")
+        conn.close()
+
+
+def _ingest(path: str, profile: str, pragmas: dict, locations: int, seed: int, results):
+    database.PROFILES[profile] = pragmas
+    rng = random.Random(seed)
+
+    with Database(path, profile=profile) as db:
+        cursor = db.local.cursor
+
+        # The largest store's locations first, so the bargain job has prices to compare across them, each with a
+        # day's scrape built from its latest prices
+        cursor.execute('''
+            SELECT id FROM locations
+            ORDER BY (SELECT COUNT(*) FROM locations other WHERE other.store = locations.store) DESC, store, id
+            LIMIT ?
+        ''', (locations,))
+        scrapes = []
+        for (location_id,) in cursor.fetchall():
+            cursor.execute('''
+                SELECT p.sku, p.name, p.brand, p.size, p.unit, p.category, p.snap_eligible, pr.price
+                FROM prices pr JOIN products p ON p.id = pr.product_id
+                WHERE pr.location_id = ? AND pr.date = (SELECT MAX(date) FROM prices WHERE location_id = ?)
+            ''', (location_id, location_id))
+            scrapes.append((location_id, [
+                ScrapedProduct.create(sku, name, round(price * rng.uniform(0.9, 1.1), 2)
+                                      if rng.random() < synthetic.PRICE_CHANGE_RATE else price, size, brand, unit,
+                                      bool(snap_eligible), rng.random() >= synthetic.OUTAGE_RATE, category)
+                for sku, name, brand, size, unit, category, snap_eligible, price in cursor.fetchall()
+            ]))
+
+        start = time.perf_counter()
+        for location_id, products in scrapes:
+            for offset in range(0, len(products), DB_BATCH_SIZE):
+                db.save_batch(location_id, products[offset:offset + DB_BATCH_SIZE])
+            db.finish_location(location_id)
+        ingest_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        bargains = db.update_bargains()
+        bargain_seconds = time.perf_counter() - start
+
+    results.put({
+        "rows": sum(len(products) for _, products in scrapes),
+        "ingest_seconds": ingest_seconds,
+        "bargains": bargains,
+        "bargain_seconds": bargain_seconds
+    })
+
+
+def _serve(path: str, profile: str, pragmas: dict, requests: int, seed: int, results):
+    database.PROFILES[profile] = pragmas
+    rng = random.Random(seed)
+
+    with Database(path, profile=profile) as db:
+        cursor = db.local.cursor
+        cursor.execute("SELECT id, store, sku FROM products ORDER BY id")
+        products = cursor.fetchall()
+        comparison_ids = [comparison["id"] for comparison in db.list_comparisons()]
+
+        kinds = [kind for _, _, category_kinds in synthetic.CATEGORY_MIX.values() for kind in category_kinds]
+        queries = {
+            "search": lambda: db.search_products(query=rng.choice(kinds), limit=20),
+            "browse": lambda: db.search_products(store=rng.choice(list(synthetic.STORES)),
+                                                 category=rng.choice(CATEGORIES), limit=50),
+            "comparison": lambda: db.get_comparison(rng.choice(comparison_ids)),
+            "comparisons": lambda: db.list_comparison_summaries(),
+            "history": lambda: db.get_price_history(rng.choice(products)[0]),
+            "prices": lambda: db.get_prices(*rng.choice(products)[1:]),
+            "bargains": lambda: db.get_bargains(limit=50),
+        }
+
+        latencies = {query: [] for query in QUERIES}
+        for _ in range(requests):
+            query = rng.choice(QUERIES)
+            start = time.perf_counter()
+            queries[query]()
+            latencies[query].append(time.perf_counter() - start)
+
+    results.put(latencies)
+
+
+def _run_isolated(target, *args):
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=target, args=(*args, results))
+    process.start()
+
+    # A child that dies never puts a result, so don't wait on it forever
+    while True:
+        # Checked before the wait, so a result put just before exiting is still read
+        exited = process.exitcode is not None
+        try:
+            result = results.get(timeout=1)
+            break
+        except queue.Empty:
+            if exited:
+                raise SystemExit(f"{target.__name__} {args[1]} exited with code {process.exitcode} without a result")
+
+    process.join()
+    return result
+
+
+def percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    if not values:
+        return float("nan")
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark SQLite pragma profiles on the ingest and serving workloads")
+    parser.add_argument("--profile", action="append", choices=sorted(database.PROFILES),
+                        help="Profile to run, repeatable (default: all)")
+    parser.add_argument("--pragma", action="append", default=[], metavar="NAME=VALUE",
+                        help="Add a custom profile with this pragma set over --base-profile, repeatable")
+    parser.add_argument("--base-profile", default="default", choices=sorted(database.PROFILES))
+    parser.add_argument("--rows", type=int, default=synthetic.FULL_SCALE_ROWS, help="Price rows in the dataset")
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--interval", type=int, default=7, help="Days between scrapes")
+    parser.add_argument("--end", type=date.fromisoformat, default=date.today() - timedelta(days=1),
+                        help="Date of the dataset's last scrape (default: yesterday)")
+    parser.add_argument("--ingest-locations", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--data-dir", default="bench-data")
+    args = parser.parse_args()
+
+    profiles = {name: database.PROFILES[name] for name in args.profile or database.PROFILES}
+    if args.pragma:
+        custom = dict(database.PROFILES[args.base_profile])
+        for setting in args.pragma:
+            name, _, value = setting.partition("=")
+            custom[name] = int(value) if value.lstrip("-").isdigit() else value
+        profiles["custom"] = custom
+
+    if args.end >= date.today():
+        raise SystemExit("--end has to be before today, which is the day the ingest replays")
+
+    start = time.perf_counter()
+    source = synthetic.dataset(args.data_dir, args.rows, args.seed, args.days, args.interval, args.end)
+    print(f"Dataset {source} ready in {time.perf_counter() - start:.0f}s")
+
+    ingest_rows = []
+    serving_rows = []
+    with tempfile.TemporaryDirectory(dir=args.data_dir) as directory:
+        for name, pragmas in profiles.items():
+            path = os.path.join(directory, f"{name}.db")
+            prepare(source, path, pragmas)
+
+            ingest = _run_isolated(_ingest, path, name, pragmas, args.ingest_locations, args.seed)
+            latencies = _run_isolated(_serve, path, name, pragmas, args.requests, args.seed)
+
+            ingest_rows.append([
+                name,
+                ingest["rows"],
+                f"{ingest['ingest_seconds']:.2f}",
+                f"{ingest['rows'] / ingest['ingest_seconds']:.0f}",
+                ingest["bargains"],
+                f"{ingest['bargain_seconds']:.2f}",
+                f"{os.path.getsize(path) / 1_000_000:.0f}"
+            ])
+            serving_rows.append([name] + [
+                f"{percentile(latencies[query], 0.5) * 1000:.1f} / {percentile(latencies[query], 0.95) * 1000:.1f}"
+                for query in QUERIES
+            ])
+
+    print(tabulate(ingest_rows, headers=["Profile", "Rows", "Ingest s", "Rows/s", "Bargains", "Bargain job s",
+                                         "Size (MB)"]))
+    print()
+    print(tabulate(serving_rows, headers=["Profile"] + [f"{query} p50/p95 ms" for query in QUERIES]))
+
+
+if __name__ == "__main__":
+    main()
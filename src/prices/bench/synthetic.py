@@ -0,0 +1,357 @@
+import argparse
+import math
+import os
+import random
+import sqlite3
+import time
+from datetime import date, timedelta
+
+from tabulate import tabulate
+
+from prices.lib.database import Database
+from prices.scrape.util import normalize_units, split_size_and_unit
+
+# Generate a prices.db shaped like a real scrape, for scale testing Database, the bargain job and the web app:
+#   python -m prices.bench.synthetic --rows 10000000 --database synthetic.db
+# The size is a target number of price rows, from 1k to 100M. Locations and products follow from it, reaching 100
+# locations and about 100k products over a year of weekly scrapes at 100M:
+#   - stores differ in catalog size, location count, how often they run sales and whether prices vary by location
+#   - categories are weighted, each with its own price level and kinds of product
+#   - sizes start out in each store's raw API format and go through the scrapers' own parsing
+#   - prices drift upwards, sales mostly run chain-wide for a scrape or two, locations run out of stock for a few
+#     scrapes, and some products are introduced or discontinued during the year
+# The same rows, seed and end date always give the same database. Benchmarks get a cached copy with dataset().
+
+FULL_SCALE_ROWS = 100_000_000
+FULL_SCALE_LOCATIONS = 100
+
+# Share of the catalog and of the locations, share of scrapes that start a chain-wide sale, whether prices vary by
+# location, and the brands its own label products carry
+STORES = {
+    "Hy-Vee": {"products": 0.32, "locations": 0.30, "sales": 0.10, "zones": True, "label": "Hy-Vee"},
+    "Cub": {"products": 0.28, "locations": 0.25, "sales": 0.08, "zones": True, "label": "Essential Everyday"},
+    "Fresh Thyme": {"products": 0.16, "locations": 0.15, "sales": 0.12, "zones": True, "label": "Fresh Thyme"},
+    "Trader Joe's": {"products": 0.14, "locations": 0.10, "sales": 0.0, "zones": False, "label": "Trader Joe's"},
+    "ALDI": {"products": 0.10, "locations": 0.20, "sales": 0.04, "zones": False, "label": "Simply Nature"},
+}
+
+# Share of the catalog, typical shelf price and the kinds of product in each category
+CATEGORY_MIX = {
+    "Pantry & Dry Goods": (0.18, 3.5, ["Pasta", "Rice", "Beans", "Soup", "Sauce", "Cereal", "Flour", "Peanut Butter"]),
+    "Snacks & Desserts": (0.12, 4.0, ["Chips", "Crackers", "Cookies", "Popcorn", "Pretzels", "Ice Cream"]),
+    "Beverages": (0.10, 4.5, ["Juice", "Coffee", "Tea", "Sparkling Water", "Soda", "Kombucha"]),
+    "Frozen Foods": (0.10, 5.0, ["Pizza", "Burritos", "Vegetables", "Waffles", "Dumplings"]),
+    "Household & Personal Care": (0.08, 6.0, ["Paper Towels", "Detergent", "Shampoo", "Toothpaste", "Soap"]),
+    "Dairy & Eggs": (0.08, 3.5, ["Milk", "Cheese", "Yogurt", "Butter", "Eggs", "Cream Cheese"]),
+    "Produce": (0.08, 2.5, ["Apples", "Bananas", "Spinach", "Carrots", "Avocados", "Berries"]),
+    "Meat & Seafood": (0.07, 8.0, ["Chicken Breast", "Ground Beef", "Salmon", "Bacon", "Sausage"]),
+    "Bakery & Bread": (0.05, 3.5, ["Bread", "Bagels", "Tortillas", "Muffins", "Buns"]),
+    "Deli & Prepared Foods": (0.04, 6.5, ["Hummus", "Salsa", "Sliced Turkey", "Salad Kit"]),
+    "Pet Supplies": (0.03, 9.0, ["Dog Food", "Cat Food", "Cat Litter"]),
+    "Baby & Child": (0.02, 8.0, ["Diapers", "Baby Food", "Wipes"]),
+    "Seasonal & Special": (0.02, 5.5, ["Candy", "Pie", "Cider"]),
+    "Alcohol & Tobacco": (0.02, 11.0, ["Wine", "Beer", "Hard Seltzer"]),
+    "Miscellaneous": (0.01, 4.0, ["Batteries", "Candles", "Foil"]),
+}
+
+BRANDS = ["Kemps", "Barilla", "General Mills", "Kraft", "Annie's", "Tillamook", "Land O'Lakes", "Dole", "Nature's Own",
+          "Hormel", "Kellogg's", "Pepsi", "Tyson", "Purina", "Seventh Generation", "Newman's Own"]
+ADJECTIVES = ["Organic", "Whole", "Lite", "Classic", "Original", "Reduced Fat", "Unsweetened", "Family Size", "Mini",
+              "Spicy", "Honey", "Vanilla", "Gluten Free", "Low Sodium"]
+
+# Sizes as (count, size of each, unit) with their share of the catalog; a count above one is a multipack
+SIZES = [
+    ((1, 16, "oz"), 0.16), ((1, 12, "oz"), 0.12), ((1, 8, "oz"), 0.08), ((1, 32, "oz"), 0.06), ((1, 1, "lb"), 0.08),
+    ((1, 2, "lb"), 0.04), ((1, 1, "gal"), 0.03), ((1, 0.5, "gal"), 0.03), ((1, 64, "fl oz"), 0.05),
+    ((1, 1, "ea"), 0.15), ((1, 12, "ct"), 0.06), ((6, 3, "oz"), 0.04), ((12, 12, "fl oz"), 0.05),
+    ((4, 4, "oz"), 0.05),
+]
+
+# How Fresh Thyme's unitOfSize abbreviations and Trader Joe's sales_uom_description spell units
+FRESH_THYME_UNITS = {"oz": "Ounce", "lb": "Pound", "gal": "Gallon", "fl oz": "fl oz", "ea": "Each", "ct": "ct"}
+TRADER_JOES_UNITS = {"oz": "Oz", "lb": "Lb", "gal": "Gal", "fl oz": "Fl Oz", "ea": "Each", "ct": "Each"}
+PACKAGING = [" Bag", " Box", " Jar", " Can", " Bottle", " Carton"]
+
+# Products listed for the whole period, introduced during it, or discontinued during it
+NEW_RATE = 0.1
+DISCONTINUED_RATE = 0.1
+# Average share of the period a product is listed for
+LIFETIME = 1 - (NEW_RATE + DISCONTINUED_RATE) / 2
+
+# Share of a store's locations that carry a product
+STOCK_RATE = 0.9
+# Per scrape: a lasting price change, a promotion at a single location of a store with zone pricing, and a location
+# running out of stock or being restocked
+PRICE_CHANGE_RATE = 0.04
+LOCAL_SALE_RATE = 0.03
+OUTAGE_RATE = 0.02
+RESTOCK_RATE = 0.6
+
+BATCH_ROWS = 200000
+
+
+def weighted(rng: random.Random, options: list, weights: list):
+    return rng.choices(options, weights)[0]
+
+
+def allocate(total: int, shares: dict) -> dict:
+    # Splits total across the shares by largest remainder, giving each at least one
+    counts = {key: max(1, int(total * share)) for key, share in shares.items()}
+    by_remainder = sorted(shares, key=lambda key: total * shares[key] - int(total * shares[key]), reverse=True)
+    for key in by_remainder[:max(0, total - sum(counts.values()))]:
+        counts[key] += 1
+    return counts
+
+
+def shape(rows: int, days: int, interval: int) -> tuple[dict, dict, int]:
+    # Locations grow with the square root of the size and products make up the rest, so small datasets still have
+    # a few locations per store to compare
+    scrapes = len(range(0, days, interval))
+    locations = round(FULL_SCALE_LOCATIONS * math.sqrt(min(1.0, rows / FULL_SCALE_ROWS)))
+    store_locations = allocate(max(len(STORES), locations), {store: spec["locations"] for store, spec in STORES.items()})
+
+    rows_per_product = scrapes * STOCK_RATE * LIFETIME * sum(
+        spec["products"] * store_locations[store] for store, spec in STORES.items())
+    products = max(len(STORES), round(rows / rows_per_product))
+    store_products = allocate(products, {store: spec["products"] for store, spec in STORES.items()})
+
+    return store_locations, store_products, scrapes
+
+
+def raw_size(store: str, count: int, each: float, unit: str, rng: random.Random):
+    # The size fields as the store's API returns them
+    total = count * each
+    if store == "Cub":
+        # unitOfSize, which the scraper formats as "<size> <abbreviation>"
+        return f"{float(total)} {unit}"
+    if store == "Fresh Thyme":
+        return total, FRESH_THYME_UNITS[unit]
+    if store == "Trader Joe's":
+        return f"{total:g}", TRADER_JOES_UNITS[unit]
+
+    size = f"{count} x {each:g} {unit}" if count > 1 else f"{each:g} {unit}"
+    if store == "ALDI":
+        return size + "."
+    # Hy-Vee sometimes names the packaging
+    return size + (rng.choice(PACKAGING) if rng.random() < 0.2 else " ")
+
+
+def parse_size(store: str, raw) -> tuple[float, str]:
+    # As each scraper does
+    if store == "Fresh Thyme":
+        size, abbreviation = raw
+        return size, normalize_units(abbreviation) or "ea"
+    if store == "Trader Joe's":
+        sales_size, uom = raw
+        size, unit = split_size_and_unit(sales_size)
+        return size, unit or normalize_units(uom)
+    return split_size_and_unit(raw)
+
+
+def generate(database_path: str, rows: int, seed: int = 1, days: int = 365, interval: int = 7,
+             end: date | None = None) -> dict:
+    rng = random.Random(seed)
+    end = end or date.today()
+    store_locations, store_products, scrapes = shape(rows, days, interval)
+    dates = [(end - timedelta(days=offset)).isoformat() for offset in range(0, days, interval)][::-1]
+
+    # The schema comes from Database. The counter triggers and the secondary indexes on prices are dropped for the
+    # load; Database recreates them, seeds the counters and builds the rollups the next time it opens the file.
+    with Database(database_path):
+        pass
+
+    conn = sqlite3.connect(database_path)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    for (trigger,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'").fetchall():
+        conn.execute(f"DROP TRIGGER {trigger}")
+    for (index,) in conn.execute('''
+        SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name IN ('prices', 'price_events') AND sql IS NOT NULL
+    ''').fetchall():
+        conn.execute(f"DROP INDEX {index}")
+    conn.execute("DELETE FROM stats")
+
+    locations = {}
+    for store, count in store_locations.items():
+        locations[store] = []
+        # Drawn without replacement, since codes and SKUs are unique per store
+        for code in rng.sample(range(1000, 10000), count):
+            cursor = conn.execute("INSERT INTO locations (store, code, name, zip) VALUES (?, ?, ?, ?)",
+                                  (store, str(code), f"{store} #{len(locations[store]) + 1}",
+                                   f"55{rng.randrange(1000):03d}"))
+            # Zone pricing puts some locations consistently above others
+            level = rng.uniform(0.95, 1.1) if STORES[store]["zones"] else 1.0
+            locations[store].append((cursor.lastrowid, level))
+
+    conn.executemany("INSERT INTO store_runs (store, date) VALUES (?, ?)",
+                     [(store, day) for store in STORES for day in dates])
+
+    categories = list(CATEGORY_MIX)
+    category_weights = [share for share, _, _ in CATEGORY_MIX.values()]
+    sizes = [size for size, _ in SIZES]
+    size_weights = [share for _, share in SIZES]
+
+    price_rows = []
+    event_rows = []
+    product_count = 0
+    price_count = 0
+    event_count = 0
+
+    def flush():
+        conn.executemany("INSERT INTO prices (product_id, location_id, date, price, available) VALUES (?, ?, ?, ?, ?)",
+                         price_rows)
+        conn.executemany('''
+            INSERT INTO price_events (product_id, location_id, date, event, old_price, new_price)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', event_rows)
+        price_rows.clear()
+        event_rows.clear()
+
+    for store, count in store_products.items():
+        spec = STORES[store]
+        skus = rng.sample(range(10 ** 12), count)
+        for index in range(count):
+            category = weighted(rng, categories, category_weights)
+            _, median_price, kinds = CATEGORY_MIX[category]
+            brand = spec["label"] if rng.random() < 0.3 else rng.choice(BRANDS)
+            size, unit = parse_size(store, raw_size(store, *weighted(rng, sizes, size_weights), rng))
+
+            # The scrapes the product is listed for
+            first, last = 0, scrapes - 1
+            lifecycle = rng.random()
+            if lifecycle < NEW_RATE:
+                first = rng.randrange(scrapes)
+            elif lifecycle < NEW_RATE + DISCONTINUED_RATE:
+                last = rng.randrange(scrapes)
+
+            cursor = conn.execute('''
+                INSERT INTO products
+                (store, sku, name, brand, size, unit, category, snap_eligible, first_seen, last_seen, active)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (store, f"{skus[index]:012d}", f"{brand} {rng.choice(ADJECTIVES)} {rng.choice(kinds)}",
+                  brand, size, unit, category, category not in ("Household & Personal Care", "Alcohol & Tobacco",
+                                                                 "Pet Supplies"),
+                  dates[first], dates[last], last >= scrapes - 3))
+            product_id = cursor.lastrowid
+            product_count += 1
+
+            # The chain-wide price at each scrape, with sales
+            base = median_price * rng.lognormvariate(0, 0.5)
+            series = []
+            sale_left = 0
+            discount = 1.0
+            for _ in range(first, last + 1):
+                if rng.random() < PRICE_CHANGE_RATE:
+                    base *= rng.uniform(0.97, 1.12)
+                if sale_left == 0 and rng.random() < spec["sales"]:
+                    sale_left = rng.randint(1, 2)
+                    discount = 1 - rng.uniform(0.1, 0.35)
+                series.append(base * discount if sale_left else base)
+                sale_left = max(0, sale_left - 1)
+
+            for location_id, level in locations[store]:
+                if rng.random() >= STOCK_RATE:
+                    continue
+
+                available = True
+                previous = None
+                for offset, price in enumerate(series):
+                    day = dates[first + offset]
+                    if spec["zones"] and rng.random() < LOCAL_SALE_RATE:
+                        price *= 1 - rng.uniform(0.1, 0.3)
+                    price = round(price * level, 2)
+                    was_available = available
+                    available = rng.random() < RESTOCK_RATE if not available else rng.random() >= OUTAGE_RATE
+                    price_rows.append((product_id, location_id, day, price, available))
+
+                    if previous is None:
+                        event_rows.append((product_id, location_id, day, "new", None, price))
+                    else:
+                        if price != previous:
+                            event_rows.append((product_id, location_id, day,
+                                               "price_up" if price > previous else "price_down", previous, price))
+                        if available != was_available:
+                            event_rows.append((product_id, location_id, day,
+                                               "available" if available else "unavailable", previous, price))
+                    previous = price
+
+                if last < scrapes - 1:
+                    event_rows.append((product_id, location_id, dates[last + 1], "disappeared", previous, None))
+
+                price_count += len(series)
+
+            if len(price_rows) >= BATCH_ROWS:
+                event_count += len(event_rows)
+                flush()
+
+    event_count += len(event_rows)
+    flush()
+    conn.commit()
+    conn.close()
+
+    with Database(database_path) as db:
+        # Comparisons of the same kind of product across stores
+        comparison_count = 0
+        for _, _, kinds in CATEGORY_MIX.values():
+            for kind in kinds:
+                db.local.cursor.execute("SELECT id FROM products WHERE name LIKE ? ORDER BY id LIMIT 6",
+                                        (f"% {kind}",))
+                product_ids = [row[0] for row in db.local.cursor.fetchall()]
+                if len(product_ids) > 1:
+                    db.create_comparison(kind, product_ids)
+                    comparison_count += 1
+
+        bargain_count = db.update_bargains()
+
+    return {
+        "stores": len(STORES),
+        "locations": sum(store_locations.values()),
+        "products": product_count,
+        "scrapes": scrapes,
+        "prices": price_count,
+        "price_events": event_count,
+        "comparisons": comparison_count,
+        "bargains": bargain_count
+    }
+
+
+def dataset(data_dir: str, rows: int, seed: int = 1, days: int = 365, interval: int = 7,
+            end: date | None = None) -> str:
+    # The path of a generated database, generating it the first time
+    end = end or date.today()
+    path = os.path.join(data_dir, f"synthetic-{rows}-{days}d-{interval}i-{seed}-{end.isoformat()}.db")
+    if not os.path.exists(path):
+        os.makedirs(data_dir, exist_ok=True)
+        if os.path.exists(path + ".tmp"):
+            os.remove(path + ".tmp")
+        generate(path + ".tmp", rows, seed, days, interval, end)
+        os.replace(path + ".tmp", path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic prices database")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Target number of price rows")
+    parser.add_argument("--database", default="synthetic.db")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--interval", type=int, default=7, help="Days between scrapes")
+    parser.add_argument("--end", type=date.fromisoformat, help="Date of the last scrape (default: today)")
+    args = parser.parse_args()
+
+    if os.path.exists(args.database):
+        raise SystemExit(f"{args.database} already exists")
+
+    start = time.perf_counter()
+    summary = generate(args.database, args.rows, args.seed, args.days, args.interval, args.end)
+    seconds = time.perf_counter() - start
+
+    print(tabulate([[key, value] for key, value in summary.items()] + [
+        ["seconds", f"{seconds:.1f}"],
+        ["price rows/s", f"{summary['prices'] / seconds:.0f}"],
+        ["size (MB)", f"{os.path.getsize(args.database) / 1_000_000:.1f}"]
+    ], disable_numparse=True))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import argparse
+import glob
+import os
+import re
+from datetime import datetime, timedelta
+
+from prices.lib.log import configure_logging, get_logger
+
+# Price rows older than the horizon are moved out of the hot database into one SQLite file per year next to it
+# (prices-archive-2024.db for prices.db). The daily and weekly rollups stay in the hot database, so history charts
+# and bargains are unaffected; Database attaches the archives only for raw price reads that reach back that far.
+#   python -m prices.lib.archive --database prices.db --horizon-days 365 --vacuum
+# Set PRICES_ARCHIVE_HORIZON_DAYS=0 to stop the scraper archiving after each run.
+HORIZON_DAYS = int(os.getenv("PRICES_ARCHIVE_HORIZON_DAYS", "365"))
+
+# SQLite attaches at most 10 databases to a connection by default, so reads never attach more archives than this
+MAX_ATTACHED = 8
+
+logger = get_logger(__name__)
+
+
+def archive_path(database_path: str, year: int) -> str:
+    stem, _ = os.path.splitext(database_path)
+    return f"{stem}-archive-{year}.db"
+
+
+def list_archives(database_path: str) -> dict[int, str]:
+    stem, _ = os.path.splitext(database_path)
+    archives = {}
+    for path in glob.glob(f"{glob.escape(stem)}-archive-*.db"):
+        match = re.search(r"-archive-(\d{4})\.db$", path)
+        if match:
+            archives[int(match.group(1))] = path
+    return archives
+
+
+def archive_cutoff(horizon_days: int) -> str:
+    # Rounded down to a Monday so no week's rollup ever straddles the hot database and an archive
+    cutoff = datetime.now() - timedelta(days=horizon_days)
+    cutoff -= timedelta(days=cutoff.weekday())
+    return cutoff.strftime("%Y-%m-%d")
+
+
+def remember_last_prices(cursor, source: str, start: str, end: str):
+    # Keeps the latest price of each (product, location) among the rows being archived, so saving it again later is
+    # diffed against that rather than recorded as new. SQLite takes the bare columns from the row with MAX(date).
+    cursor.execute(f'''
+        INSERT INTO main.archived_last_prices (product_id, location_id, date, price, available)
+        SELECT product_id, location_id, MAX(date), price, available
+        FROM {source}
+        WHERE date >= ? AND date < ?
+        GROUP BY product_id, location_id
+        ON CONFLICT(product_id, location_id) DO UPDATE SET
+        date = excluded.date,
+        price = excluded.price,
+        available = excluded.available
+        WHERE excluded.date > archived_last_prices.date
+    ''', (start, end))
+
+
+def archive_prices(db, horizon_days: int = HORIZON_DAYS) -> dict[int, int]:
+    db.connect()
+    cursor = db.local.conn.cursor()
+    cutoff = archive_cutoff(horizon_days)
+
+    cursor.execute("SELECT DISTINCT CAST(substr(date, 1, 4) AS INTEGER) FROM prices WHERE date < ?", (cutoff,))
+    years = [row[0] for row in cursor.fetchall()]
+
+    # Archives written before archived_last_prices existed are read into it once, as many as can be attached
+    backfill = []
+    cursor.execute("SELECT EXISTS (SELECT 1 FROM archived_last_prices)")
+    if not cursor.fetchone()[0]:
+        older = [year for year in sorted(list_archives(db.database_path)) if year not in years]
+        backfill = older[max(0, len(older) - (MAX_ATTACHED - len(years))):]
+
+    if not years and not backfill:
+        return {}
+
+    # Archives have to be attached before the transaction that moves the rows starts
+    schemas = db.attach_archives(backfill + years, create=True)
+
+    moved = {}
+    try:
+        for year in backfill:
+            remember_last_prices(cursor, f"{schemas[year]}.prices", f"{year}-01-01", f"{year + 1}-01-01")
+
+        for year in years:
+            start = f"{year}-01-01"
+            end = min(f"{year + 1}-01-01", cutoff)
+
+            remember_last_prices(cursor, "main.prices", start, end)
+
+            cursor.execute(f'''
+                INSERT OR REPLACE INTO {schemas[year]}.prices (id, product_id, location_id, date, price, available)
+                SELECT id, product_id, location_id, date, price, available
+                FROM main.prices
+                WHERE date >= ? AND date < ?
+            ''', (start, end))
+            moved[year] = cursor.rowcount
+
+            cursor.execute("DELETE FROM main.prices WHERE date >= ? AND date < ?", (start, end))
+
+        # Archived prices still count towards the total shown on the index page
+        cursor.execute('''
+            UPDATE stats SET value = CAST(value AS INTEGER) + ? WHERE key = 'total_prices'
+        ''', (sum(moved.values()),))
+
+        db.local.conn.commit()
+    except Exception:
+        db.local.conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    for year, count in moved.items():
+        logger.info("archived prices", year=year, rows=count, cutoff=cutoff)
+
+    return moved
+
+
+def main():
+    from prices.lib.database import Database
+
+    parser = argparse.ArgumentParser(description="Move old price rows into per-year archive databases")
+    parser.add_argument("--database", default="prices.db")
+    parser.add_argument("--horizon-days", type=int, default=HORIZON_DAYS, help="Keep this many days in the hot database")
+    parser.add_argument("--vacuum", action="store_true", help="Shrink the hot database file afterwards")
+    args = parser.parse_args()
+
+    configure_logging()
+
+    with Database(args.database) as db:
+        moved = archive_prices(db, args.horizon_days)
+        if args.vacuum and moved:
+            db.local.conn.execute("VACUUM")
+
+    for year, count in sorted(moved.items()):
+        print(f"{year}: {count} prices -> {archive_path(args.database, year)}")
+
+
+if __name__ == "__main__":
+    main()
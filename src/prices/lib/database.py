@@ -1,13 +1,73 @@
+import base64
+import json
+import logging
 import math
+import os
 import random
 import sqlite3
 import threading
 from datetime import datetime, timedelta
 
+from prices.lib.archive import MAX_ATTACHED, archive_path, list_archives
+from prices.lib.log import get_logger
+from prices.lib.product import ScrapedProduct
+
+logger = get_logger(__name__)
+
+# Named sets of connection pragmas, picked with Database(path, profile=...). The scraper's ingest is bulk upserts
+# from a single writer, so it trades a sync per commit for throughput; the web app's reads are window functions over
+# prices, so it gets a large page cache and memory-mapped reads. Both use WAL so the web app can read while the
+# scraper writes. page_size only applies when a database is created or next vacuumed. Compare profiles on a
+# synthetic dataset with python -m prices.bench.sqlite.
+PROFILES = {
+    "default": {},
+    "ingest": {
+        "page_size": 8192,
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -64 * 1024,
+        "temp_store": "MEMORY",
+    },
+    "serving": {
+        "page_size": 8192,
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -256 * 1024,
+        "temp_store": "MEMORY",
+        "mmap_size": 1024 ** 3,
+    },
+}
+
+
+# Keyset pagination cursors are the sort key of the last row on a page, base64-encoded so clients treat them as
+# opaque tokens
+def encode_cursor(*values) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str, length: int) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, UnicodeError):
+        raise ValueError("Invalid cursor")
+
+    if not isinstance(values, list) or len(values) != length:
+        raise ValueError("Invalid cursor")
+
+    # Each value is bound as a query parameter, which only takes scalars
+    if not all(value is None or isinstance(value, (str, int, float)) for value in values):
+        raise ValueError("Invalid cursor")
+
+    return values
+
 
 class Database:
-    def __init__(self, database_path: str):
+    def __init__(self, database_path: str, profile: str = "default"):
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown database profile: {profile}")
+
         self.database_path = database_path
+        self.profile = profile
         self.local = threading.local()
 
     def connect(self):
@@ -15,8 +75,10 @@ class Database:
         if not hasattr(self.local, 'conn') or self.local.conn is None:
             self.local.conn = sqlite3.connect(self.database_path)
 
-            # Enable WAL mode
-            # self.local.conn.execute("PRAGMA journal_mode=WAL")
+            # Applied in order, since page_size has to come before the first table is created and before the
+            # switch to WAL
+            for pragma, value in PROFILES[self.profile].items():
+                self.local.conn.execute(f"PRAGMA {pragma}={value}")
 
             # Enable foreign keys
             self.local.conn.execute("PRAGMA foreign_keys=ON")
@@ -37,10 +99,25 @@ class Database:
                     snap_eligible BOOLEAN NOT NULL,
                     first_seen TEXT NOT NULL,
                     last_seen TEXT NOT NULL,
+                    active BOOLEAN NOT NULL DEFAULT 1,
                     UNIQUE(store, sku)
                 )
             ''')
 
+            # Databases created before products had an active flag
+            self.local.cursor.execute("PRAGMA table_info(products)")
+            if "active" not in {row[1] for row in self.local.cursor.fetchall()}:
+                self.local.cursor.execute("ALTER TABLE products ADD COLUMN active BOOLEAN NOT NULL DEFAULT 1")
+
+            # The dates each store was scraped completely, used to count the runs a product has been missing from
+            self.local.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS store_runs (
+                    store TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    PRIMARY KEY (store, date)
+                ) WITHOUT ROWID
+            ''')
+
             self.local.cursor.execute('''
                 CREATE TABLE IF NOT EXISTS locations (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -110,6 +187,22 @@ class Database:
                 )
             ''')
 
+            # Cheapest product per comparison, maintained so the comparisons listing doesn't have to price every
+            # comparison on each request
+            self.local.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS comparison_summary (
+                    comparison_id INTEGER PRIMARY KEY,
+                    product_count INTEGER NOT NULL,
+                    best_product_id INTEGER,
+                    best_unit_price REAL,
+                    second_unit_price REAL,
+                    unit TEXT,
+                    updated_on TEXT NOT NULL,
+                    FOREIGN KEY (comparison_id) REFERENCES comparisons(id) ON DELETE CASCADE,
+                    FOREIGN KEY (best_product_id) REFERENCES products(id)
+                )
+            ''')
+
             # New stats table with unique key
             self.local.cursor.execute('''
                 CREATE TABLE IF NOT EXISTS stats (
@@ -118,22 +211,312 @@ class Database:
                 )
             ''')
 
+            # Per (store, location) timings and counters for each scrape run
+            self.local.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS scrape_metrics (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    run_id TEXT NOT NULL,
+                    store TEXT NOT NULL,
+                    location_id INTEGER NOT NULL,
+                    started_at TEXT NOT NULL,
+                    wall_time REAL NOT NULL,
+                    http_requests INTEGER NOT NULL,
+                    http_bytes INTEGER NOT NULL,
+                    retries INTEGER NOT NULL,
+                    products INTEGER NOT NULL,
+                    db_rows INTEGER NOT NULL,
+                    network_time REAL NOT NULL,
+                    wait_time REAL NOT NULL,
+                    parse_time REAL NOT NULL,
+                    db_time REAL NOT NULL,
+                    error TEXT,
+                    FOREIGN KEY (location_id) REFERENCES locations(id)
+                )
+            ''')
+
+            self.local.cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_scrape_metrics_run ON scrape_metrics(run_id)
+            ''')
+
+            # Indexes matching the keyset pagination orders, so a page starts with an index seek instead of
+            # walking every earlier row. Searches default to products still on shelves, so they cover just the active
+            # part of the catalog; the rarer include_inactive searches make do with the other indexes. Full-catalog
+            # versions of these indexes from earlier databases cost every product write and are dropped.
+            for index in ("idx_products_name", "idx_products_store_name", "idx_products_category_name"):
+                self.local.cursor.execute(f"DROP INDEX IF EXISTS {index}")
+
+            self.local.cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_products_active_name ON products(name, id) WHERE active = 1
+            ''')
+
+            self.local.cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_products_active_store_name ON products(store, name, id) WHERE active = 1
+            ''')
+
+            self.local.cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_products_active_category_name ON products(category, name, id)
+                WHERE active = 1
+            ''')
+
+            self.local.cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_bargains_discount ON bargains(discount_percentage, id)
+            ''')
+
+            # Supports date-range reads of a single product's history
+            self.local.cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_prices_product_date ON prices(product_id, date)
+            ''')
+
+            # Supports exporting the prices recorded since a date
+            self.local.cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_prices_date ON prices(date)
+            ''')
+
+            # Append-only log of what changed for each (product, location) as prices are saved: new, price_up,
+            # price_down, available, unavailable and disappeared
+            self.local.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS price_events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    product_id INTEGER NOT NULL,
+                    location_id INTEGER NOT NULL,
+                    date TEXT NOT NULL,
+                    event TEXT NOT NULL,
+                    old_price REAL,
+                    new_price REAL,
+                    FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE,
+                    FOREIGN KEY (location_id) REFERENCES locations(id) ON DELETE CASCADE
+                )
+            ''')
+
+            self.local.cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_price_events_date ON price_events(date)
+            ''')
+
+            # The latest price of each (product, location) moved to an archive, for diffing when it's seen again
+            self.local.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS archived_last_prices (
+                    product_id INTEGER NOT NULL,
+                    location_id INTEGER NOT NULL,
+                    date TEXT NOT NULL,
+                    price REAL NOT NULL,
+                    available BOOLEAN NOT NULL,
+                    PRIMARY KEY (product_id, location_id),
+                    FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE,
+                    FOREIGN KEY (location_id) REFERENCES locations(id) ON DELETE CASCADE
+                ) WITHOUT ROWID
+            ''')
+
+            self.local.cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_price_events_product ON price_events(product_id, location_id)
+            ''')
+
+            # Per product rollups of the prices table, one row per day and per week (starting Monday). Sums and
+            # counts are stored rather than averages so they can be combined into longer periods. The available_*
+            # columns only cover locations where the product was in stock.
+            self.local.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS price_daily_product (
+                    product_id INTEGER NOT NULL,
+                    date TEXT NOT NULL,
+                    min_price REAL NOT NULL,
+                    max_price REAL NOT NULL,
+                    sum_price REAL NOT NULL,
+                    price_count INTEGER NOT NULL,
+                    location_count INTEGER NOT NULL,
+                    available_min_price REAL,
+                    available_sum_price REAL NOT NULL,
+                    available_count INTEGER NOT NULL,
+                    PRIMARY KEY (product_id, date),
+                    FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE
+                ) WITHOUT ROWID
+            ''')
+
+            self.local.cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_price_daily_product_date ON price_daily_product(date)
+            ''')
+
+            self.local.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS price_weekly_product (
+                    product_id INTEGER NOT NULL,
+                    week TEXT NOT NULL,
+                    min_price REAL NOT NULL,
+                    max_price REAL NOT NULL,
+                    sum_price REAL NOT NULL,
+                    price_count INTEGER NOT NULL,
+                    location_count INTEGER NOT NULL,
+                    available_min_price REAL,
+                    available_sum_price REAL NOT NULL,
+                    available_count INTEGER NOT NULL,
+                    PRIMARY KEY (product_id, week),
+                    FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE
+                ) WITHOUT ROWID
+            ''')
+
+            self.local.conn.commit()
+
+            # Keep the index page's counters current from within each write's own transaction. An upsert that
+            # resolves to an update doesn't fire the insert triggers, so re-scraping a product doesn't inflate them.
+            for table, key in (("products", "total_products"), ("prices", "total_prices"),
+                               ("locations", "total_locations")):
+                self.local.cursor.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS stats_{table}_insert AFTER INSERT ON {table} BEGIN
+                        UPDATE stats SET value = CAST(value AS INTEGER) + 1 WHERE key = '{key}';
+                    END
+                ''')
+                self.local.cursor.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS stats_{table}_delete AFTER DELETE ON {table} BEGIN
+                        UPDATE stats SET value = CAST(value AS INTEGER) - 1 WHERE key = '{key}';
+                    END
+                ''')
+
+            # There are only a handful of locations, so the store count is simply recounted
+            for event in ("INSERT", "DELETE"):
+                self.local.cursor.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS stats_stores_{event.lower()} AFTER {event} ON locations BEGIN
+                        UPDATE stats SET value = (SELECT COUNT(DISTINCT store) FROM locations)
+                        WHERE key = 'total_stores';
+                    END
+                ''')
+
             self.local.conn.commit()
 
+            # The counters are seeded with one scan the first time a database is opened
+            self.local.cursor.execute('''
+                SELECT COUNT(*) FROM stats
+                WHERE key IN ('total_stores', 'total_locations', 'total_products', 'total_prices')
+            ''')
+            if self.local.cursor.fetchone()[0] < 4:
+                self.set_stats(self.count_stats())
+
+            # Existing databases get their rollups built once from the full history
+            self.local.cursor.execute("SELECT EXISTS (SELECT 1 FROM price_daily_product)")
+            has_rollups = self.local.cursor.fetchone()[0]
+            self.local.cursor.execute("SELECT EXISTS (SELECT 1 FROM prices)")
+            has_prices = self.local.cursor.fetchone()[0]
+            if has_prices and not has_rollups:
+                self.rebuild_rollups()
+
     def close(self):
         if hasattr(self.local, 'conn') and self.local.conn:
             self.local.conn.close()
             self.local.conn = None
             self.local.cursor = None
+            self.local.archives = {}
+
+    def attach_archives(self, years: list[int], create: bool = False) -> dict[int, str]:
+        # Attaches the per-year price archives to this thread's connection, detaching any others first since SQLite
+        # limits how many databases can be attached at once. Must be called outside a transaction.
+        self.connect()
+
+        attached = getattr(self.local, "archives", None)
+        if attached is None:
+            attached = self.local.archives = {}
+
+        for year in [year for year in attached if year not in years]:
+            self.local.cursor.execute(f"DETACH DATABASE {attached.pop(year)}")
+
+        for year in years:
+            if year in attached:
+                continue
+
+            path = archive_path(self.database_path, year)
+            if not create and not os.path.exists(path):
+                continue
+
+            schema = f"archive_{year}"
+            self.local.cursor.execute("ATTACH DATABASE ? AS " + schema, (path,))
+            self.local.cursor.execute(f'''
+                CREATE TABLE IF NOT EXISTS {schema}.prices (
+                    id INTEGER PRIMARY KEY,
+                    product_id INTEGER NOT NULL,
+                    location_id INTEGER NOT NULL,
+                    date TEXT NOT NULL,
+                    price REAL NOT NULL,
+                    available BOOLEAN NOT NULL,
+                    UNIQUE(product_id, location_id, date)
+                )
+            ''')
+            self.local.cursor.execute(f"CREATE INDEX IF NOT EXISTS {schema}.idx_prices_date ON prices(date)")
+            attached[year] = schema
+
+        return dict(attached)
+
+    def _prices_source(self, start: str | None = None, end: str | None = None) -> str:
+        # The prices table, unioned with any archives overlapping the date range. Filters on the result are pushed
+        # down into each part of the union, so the archives' own indexes are still used.
+        for value in (start, end):
+            if value:
+                try:
+                    datetime.strptime(value, "%Y-%m-%d")
+                except ValueError:
+                    raise ValueError(f"Invalid date, expected YYYY-MM-DD: {value}")
+
+        archives = list_archives(self.database_path)
+        years = [year for year in sorted(archives)
+                 if (not start or year >= int(start[:4])) and (not end or year <= int(end[:4]))]
+
+        if not years:
+            return "prices"
+
+        if len(years) > MAX_ATTACHED:
+            logger.warning("too many archives for one read, using the most recent", start=start, end=end,
+                           archives=len(years), attached=MAX_ATTACHED)
+            years = years[-MAX_ATTACHED:]
+
+        schemas = self.attach_archives(years)
+        parts = ["SELECT id, product_id, location_id, date, price, available FROM main.prices"]
+        for year in years:
+            parts.append(f"SELECT id, product_id, location_id, date, price, available FROM {schemas[year]}.prices")
+
+        return "(" + " UNION ALL ".join(parts) + ")"
 
     def create_or_update_stat(self, key: str, value: str) -> None:
+        self.set_stats({key: value})
+
+    def set_stats(self, stats: dict[str, str]) -> None:
         self.connect()
-        self.local.cursor.execute(
-            "INSERT INTO stats (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = ?",
-            (key, value, value)
+        self.local.cursor.executemany(
+            "INSERT INTO stats (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            [(key, str(value)) for key, value in stats.items()]
         )
         self.local.conn.commit()
 
+    def get_data_version(self) -> str:
+        self.connect()
+        self.local.cursor.execute("SELECT value FROM stats WHERE key = 'data_version'")
+        row = self.local.cursor.fetchone()
+        return row[0] if row else "0"
+
+    def bump_data_version(self) -> None:
+        self.connect()
+        self._bump_data_version()
+        self.local.conn.commit()
+
+    def _bump_data_version(self) -> None:
+        # Readers such as the web tier's response cache compare this stamp to tell when their copies are stale
+        self.local.cursor.execute('''
+            INSERT INTO stats (key, value) VALUES ('data_version', '1')
+            ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1
+        ''')
+
+    def count_stats(self) -> dict[str, str]:
+        # Full scans; only needed to seed or repair the trigger-maintained counters
+        self.connect()
+        self.local.cursor.execute('''
+            SELECT
+                (SELECT COUNT(DISTINCT store) FROM locations),
+                (SELECT COUNT(*) FROM locations),
+                (SELECT COUNT(*) FROM products),
+                (SELECT COUNT(*) FROM prices)
+        ''')
+        total_stores, total_locations, total_products, total_prices = self.local.cursor.fetchone()
+
+        return {
+            "total_stores": str(total_stores),
+            "total_locations": str(total_locations),
+            "total_products": str(total_products),
+            "total_prices": str(total_prices)
+        }
+
     def get_stats(self) -> dict[str, str]:
         self.connect()
         self.local.cursor.execute("SELECT key, value FROM stats")
@@ -185,7 +568,10 @@ class Database:
 
         return locations
 
-    def save(self, location_id: int, data: dict) -> None:
+    def save(self, location_id: int, data: ScrapedProduct) -> None:
+        self.save_batch(location_id, [data])
+
+    def save_batch(self, location_id: int, products: list[ScrapedProduct]) -> None:
         self.connect()
         today = datetime.now().strftime("%Y-%m-%d")
 
@@ -197,73 +583,71 @@ class Database:
 
         store = location_data[0]
 
+        # The whole batch, including its rollups, is written in one transaction
+        try:
+            product_ids = [self._save_product(store, location_id, data, today) for data in products]
+            self._update_rollups(product_ids, today)
+        except Exception:
+            self.local.conn.rollback()
+            raise
+
+        self.local.conn.commit()
+
+        for data in products:
+            logger.sampled(logging.DEBUG, "saved product", location_id=location_id, sku=data.sku,
+                           price=data.price, available=data.available)
+
+    def _save_product(self, store: str, location_id: int, data: ScrapedProduct, today: str) -> int:
         # Find or create product
         self.local.cursor.execute('''
             SELECT id, first_seen FROM products WHERE store = ? AND sku = ?
-        ''', (store, data["sku"]))
+        ''', (store, data.sku))
         product = self.local.cursor.fetchone()
 
         if product:
             # Update existing product
             product_id = product[0]
 
-            # If category is not in data, use a separate update query that doesn't include category
-            if "category" not in data:
-                self.local.cursor.execute('''
-                    UPDATE products SET
-                    name = ?,
-                    brand = ?,
-                    size = ?,
-                    unit = ?,
-                    snap_eligible = ?,
-                    last_seen = ?
-                    WHERE id = ?
-                ''', (data["name"],
-                      data["brand"],
-                      data["size"],
-                      data["unit"],
-                      data["snap_eligible"],
-                      today,
-                      product_id))
-            else:
-                self.local.cursor.execute('''
-                    UPDATE products SET
-                    name = ?,
-                    brand = ?,
-                    size = ?,
-                    unit = ?,
-                    category = ?,
-                    snap_eligible = ?,
-                    last_seen = ?
-                    WHERE id = ?
-                ''', (data["name"],
-                      data["brand"],
-                      data["size"],
-                      data["unit"],
-                      data["category"],
-                      data["snap_eligible"],
-                      today,
-                      product_id))
+            # A product seen without a category (e.g. a quick ALDI scrape) keeps the one it has
+            self.local.cursor.execute('''
+                UPDATE products SET
+                name = ?,
+                brand = ?,
+                size = ?,
+                unit = ?,
+                category = COALESCE(?, category),
+                snap_eligible = ?,
+                last_seen = ?,
+                active = 1
+                WHERE id = ?
+            ''', (data.name,
+                  data.brand,
+                  data.size,
+                  data.unit,
+                  data.category,
+                  data.snap_eligible,
+                  today,
+                  product_id))
         else:
-            # Create new product - include category if available, otherwise use NULL
-            category = data.get("category")  # Will be None if category isn't in data
-
+            # Create new product
             self.local.cursor.execute('''
                 INSERT INTO products 
                 (store, sku, name, brand, size, unit, category, snap_eligible, first_seen, last_seen)
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             ''', (store,
-                  data["sku"],
-                  data["name"],
-                  data["brand"],
-                  data["size"],
-                  data["unit"],
-                  category,  # This will be None if category isn't in data
-                  data["snap_eligible"],
+                  data.sku,
+                  data.name,
+                  data.brand,
+                  data.size,
+                  data.unit,
+                  data.category,
+                  data.snap_eligible,
                   today,
                   today))
             product_id = self.local.cursor.lastrowid
 
+        self._record_price_events(product_id, location_id, data, today)
+
         # Save price information with availability
         self.local.cursor.execute('''
             INSERT INTO prices (product_id, location_id, date, price, available)
@@ -274,15 +658,259 @@ class Database:
         ''', (product_id,
               location_id,
               today,
-              data["price"],
-              data["available"]))
+              data.price,
+              data.available))
+
+        return product_id
+
+    def _record_price_events(self, product_id: int, location_id: int, data: ScrapedProduct, today: str) -> None:
+        # Diff against the latest observation at this location, including one saved earlier today
+        self.local.cursor.execute('''
+            SELECT price, available FROM prices
+            WHERE product_id = ? AND location_id = ? AND date <= ?
+            ORDER BY date DESC
+            LIMIT 1
+        ''', (product_id, location_id, today))
+        previous = self.local.cursor.fetchone()
+
+        if previous is None:
+            # Its last observation may have been archived
+            self.local.cursor.execute('''
+                SELECT price, available FROM archived_last_prices
+                WHERE product_id = ? AND location_id = ? AND date <= ?
+            ''', (product_id, location_id, today))
+            previous = self.local.cursor.fetchone()
+
+        events = []
+        if previous is None:
+            events.append(("new", None, data.price))
+        else:
+            old_price, old_available = previous
+            if data.price > old_price:
+                events.append(("price_up", old_price, data.price))
+            elif data.price < old_price:
+                events.append(("price_down", old_price, data.price))
+            if bool(data.available) != bool(old_available):
+                events.append(("available" if data.available else "unavailable", old_price, data.price))
+
+        if events:
+            self.local.cursor.executemany('''
+                INSERT INTO price_events (product_id, location_id, date, event, old_price, new_price)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', [(product_id, location_id, today, event, old_price, new_price)
+                  for event, old_price, new_price in events])
+
+    def finish_location(self, location_id: int) -> int:
+        # Called once a location has been scraped completely: anything it listed on its previous scrape that
+        # wasn't seen today has disappeared
+        self.connect()
+        today = datetime.now().strftime("%Y-%m-%d")
+
+        self.local.cursor.execute('''
+            INSERT INTO price_events (product_id, location_id, date, event, old_price, new_price)
+            SELECT
+                prev.product_id,
+                prev.location_id,
+                ?,
+                'disappeared',
+                prev.price,
+                NULL
+            FROM
+                prices prev
+            WHERE
+                prev.location_id = ? AND
+                prev.date = (SELECT MAX(date) FROM prices WHERE location_id = ? AND date < ?) AND
+                NOT EXISTS (
+                    SELECT 1 FROM prices pr
+                    WHERE pr.product_id = prev.product_id AND pr.location_id = prev.location_id AND pr.date = ?
+                ) AND
+                NOT EXISTS (
+                    SELECT 1 FROM price_events e
+                    WHERE e.product_id = prev.product_id AND e.location_id = prev.location_id AND
+                          e.date = ? AND e.event = 'disappeared'
+                )
+        ''', (today, location_id, location_id, today, today, today))
 
+        count = self.local.cursor.rowcount
         self.local.conn.commit()
 
-        print(data)
+        return count
+
+    def get_price_events(self, date: str | None = None, event: str | None = None, store: str | None = None,
+                         limit: int = 50, cursor: str | None = None) -> tuple[list[dict], str | None]:
+        self.connect()
+
+        query = '''
+        SELECT
+            e.id,
+            e.date,
+            e.event,
+            e.old_price,
+            e.new_price,
+            p.store,
+            p.sku,
+            p.name,
+            p.brand,
+            p.size,
+            p.unit,
+            l.name
+        FROM
+            price_events e
+        JOIN
+            products p ON e.product_id = p.id
+        JOIN
+            locations l ON e.location_id = l.id
+        WHERE
+            1=1
+        '''
+        params = []
+
+        if date:
+            query += " AND e.date = ?"
+            params.append(date)
+
+        if event:
+            query += " AND e.event = ?"
+            params.append(event)
+
+        if store:
+            query += " AND p.store = ?"
+            params.append(store)
+
+        # Newest first, continuing after the last event of the previous page
+        if cursor:
+            query += " AND e.id < ?"
+            params.extend(decode_cursor(cursor, 1))
+
+        query += " ORDER BY e.id DESC LIMIT ?"
+        params.append(limit)
+
+        self.local.cursor.execute(query, params)
+        rows = self.local.cursor.fetchall()
+
+        results = []
+        for row in rows:
+            id, date, event, old_price, new_price, store, sku, name, brand, size, unit, location_name = row
+
+            results.append({
+                "id": id,
+                "date": date,
+                "event": event,
+                "old_price": old_price,
+                "new_price": new_price,
+                "store": store,
+                "sku": sku,
+                "name": name,
+                "brand": brand,
+                "size": size,
+                "unit": unit,
+                "location": location_name
+            })
+
+        next_cursor = None
+        if results and len(results) == limit:
+            next_cursor = encode_cursor(results[-1]["id"])
+
+        return results, next_cursor
+
+    def summarize_price_events(self, date: str) -> dict[str, int]:
+        self.connect()
+        self.local.cursor.execute('''
+            SELECT event, COUNT(*) FROM price_events WHERE date = ? GROUP BY event ORDER BY event
+        ''', (date,))
+        return dict(self.local.cursor.fetchall())
+
+    def _update_rollups(self, product_ids: list[int], date: str) -> None:
+        # Recompute the day's and the week's rollup rows for just the products that were written
+        product_ids = sorted(set(product_ids))
+
+        for i in range(0, len(product_ids), 500):
+            chunk = product_ids[i:i + 500]
+            placeholders = ", ".join("?" * len(chunk))
+
+            self.local.cursor.execute(f'''
+                INSERT OR REPLACE INTO price_daily_product
+                SELECT
+                    pr.product_id,
+                    pr.date,
+                    MIN(pr.price),
+                    MAX(pr.price),
+                    SUM(pr.price),
+                    COUNT(*),
+                    COUNT(DISTINCT pr.location_id),
+                    MIN(CASE WHEN pr.available THEN pr.price END),
+                    TOTAL(CASE WHEN pr.available THEN pr.price END),
+                    COUNT(DISTINCT CASE WHEN pr.available THEN pr.location_id END)
+                FROM
+                    prices pr
+                WHERE
+                    pr.date = ? AND pr.product_id IN ({placeholders})
+                GROUP BY
+                    pr.product_id, pr.date
+            ''', (date, *chunk))
+
+            self.local.cursor.execute(f'''
+                INSERT OR REPLACE INTO price_weekly_product
+                SELECT
+                    pr.product_id,
+                    date(pr.date, 'weekday 0', '-6 days') AS week,
+                    MIN(pr.price),
+                    MAX(pr.price),
+                    SUM(pr.price),
+                    COUNT(*),
+                    COUNT(DISTINCT pr.location_id),
+                    MIN(CASE WHEN pr.available THEN pr.price END),
+                    TOTAL(CASE WHEN pr.available THEN pr.price END),
+                    COUNT(DISTINCT CASE WHEN pr.available THEN pr.location_id END)
+                FROM
+                    prices pr
+                WHERE
+                    pr.date >= date(?, 'weekday 0', '-6 days') AND
+                    pr.date <= date(?, 'weekday 0') AND
+                    pr.product_id IN ({placeholders})
+                GROUP BY
+                    pr.product_id, week
+            ''', (date, date, *chunk))
+
+    def rebuild_rollups(self) -> None:
+        self.connect()
+
+        # Archived prices are no longer here to rebuild from, so their rollups are kept and only the weeks still in
+        # the prices table are recomputed
+        self.local.cursor.execute("SELECT COALESCE(date(MIN(date), 'weekday 0', '-6 days'), '') FROM prices")
+        since = self.local.cursor.fetchone()[0]
+
+        self.local.cursor.execute("DELETE FROM price_daily_product WHERE date >= ?", (since,))
+        self.local.cursor.execute("DELETE FROM price_weekly_product WHERE week >= ?", (since,))
+
+        for table, period in (("price_daily_product", "pr.date"),
+                              ("price_weekly_product", "date(pr.date, 'weekday 0', '-6 days')")):
+            self.local.cursor.execute(f'''
+                INSERT INTO {table}
+                SELECT
+                    pr.product_id,
+                    {period} AS period,
+                    MIN(pr.price),
+                    MAX(pr.price),
+                    SUM(pr.price),
+                    COUNT(*),
+                    COUNT(DISTINCT pr.location_id),
+                    MIN(CASE WHEN pr.available THEN pr.price END),
+                    TOTAL(CASE WHEN pr.available THEN pr.price END),
+                    COUNT(DISTINCT CASE WHEN pr.available THEN pr.location_id END)
+                FROM
+                    prices pr
+                WHERE
+                    pr.date >= ?
+                GROUP BY
+                    pr.product_id, period
+            ''', (since,))
+
+        self.local.conn.commit()
 
     def search_products(self, query: str | None = None, snap: bool | None = None, store: str | None = None,
-                        category: str | None = None, limit: int = 20, offset: int = 0) -> list[dict]:
+                        category: str | None = None, limit: int = 20, cursor: str | None = None,
+                        include_inactive: bool = False) -> tuple[list[dict], str | None]:
         self.connect()
 
         # Base products selection
@@ -298,7 +926,8 @@ class Database:
                     p.unit,
                     p.category,
                     p.snap_eligible,
-                    p.last_seen
+                    p.last_seen,
+                    p.active
                 FROM 
                     products p
                 WHERE 
@@ -327,10 +956,19 @@ class Database:
             base_query += " AND p.category = ?"
             params.append(category)
 
-        # Complete the CTE with limit, offset and prices
+        # Leave out discontinued products unless asked for
+        if not include_inactive:
+            base_query += " AND p.active = 1"
+
+        # Continue after the last product of the previous page
+        if cursor:
+            base_query += " AND (p.name, p.id) > (?, ?)"
+            params.extend(decode_cursor(cursor, 2))
+
+        # Complete the CTE with limit and prices
         full_query = base_query + """
-                ORDER BY p.name ASC
-                LIMIT ? OFFSET ?
+                ORDER BY p.name ASC, p.id ASC
+                LIMIT ?
             ),
             latest_prices AS (
                 SELECT
@@ -364,6 +1002,7 @@ class Database:
                 ps.category,
                 ps.snap_eligible,
                 ps.last_seen,
+                ps.active,
                 min_p.price AS lowest_price,
                 max_p.price AS highest_price,
                 min_p.available
@@ -373,16 +1012,18 @@ class Database:
                 latest_prices min_p ON ps.id = min_p.product_id AND min_p.price_rank = 1
             LEFT JOIN
                 latest_prices max_p ON ps.id = max_p.product_id AND max_p.price_rank = max_p.price_count
+            ORDER BY
+                ps.name ASC, ps.id ASC
         """
 
-        params.extend([limit, offset])
+        params.append(limit)
 
         self.local.cursor.execute(full_query, params)
         rows = self.local.cursor.fetchall()
 
         results = []
         for row in rows:
-            id, store, sku, name, brand, size, unit, category, snap_eligible, last_seen, lowest_price, highest_price, available = row
+            id, store, sku, name, brand, size, unit, category, snap_eligible, last_seen, active, lowest_price, highest_price, available = row
 
             product_data = {
                 "id": id,
@@ -395,6 +1036,7 @@ class Database:
                 "category": category,
                 "snap_eligible": bool(snap_eligible),  # Convert from SQLite integer to Python boolean
                 "last_updated": last_seen,
+                "active": bool(active),
                 "lowest_price": lowest_price,
                 "highest_price": highest_price,
                 "available": bool(available)  # Convert from SQLite integer to Python boolean
@@ -402,7 +1044,39 @@ class Database:
 
             results.append(product_data)
 
-        return results
+        next_cursor = None
+        if results and len(results) == limit:
+            next_cursor = encode_cursor(results[-1]["name"], results[-1]["id"])
+
+        return results, next_cursor
+
+    def record_store_run(self, store: str) -> None:
+        # Called after every location of a store has been scraped without errors
+        self.connect()
+        today = datetime.now().strftime("%Y-%m-%d")
+        self.local.cursor.execute("INSERT OR IGNORE INTO store_runs (store, date) VALUES (?, ?)", (store, today))
+        self.local.conn.commit()
+
+    def update_product_lifecycle(self, missed_runs: int = 3) -> int:
+        # Products not seen in any of their store's last missed_runs complete runs are marked inactive. Saving a
+        # product marks it active again.
+        self.connect()
+
+        self.local.cursor.execute('''
+            UPDATE products SET active = 0
+            WHERE active = 1 AND last_seen < (
+                SELECT sr.date FROM store_runs sr
+                WHERE sr.store = products.store
+                ORDER BY sr.date DESC
+                LIMIT 1 OFFSET ?
+            )
+        ''', (missed_runs - 1,))
+
+        count = self.local.cursor.rowcount
+        self.local.conn.commit()
+
+        logger.info("marked products inactive", count=count, missed_runs=missed_runs)
+        return count
 
     def update_bargains(self, min_discount_percentage: float = 10.0):
         self.connect()
@@ -412,31 +1086,18 @@ class Database:
         self.local.cursor.execute("DELETE FROM bargain_locations")
         self.local.cursor.execute("DELETE FROM bargains")
 
-        # First, identify product discounts with current prices below average
+        # First, identify product discounts with current prices below average, using today's rollup of the
+        # in-stock prices rather than scanning the prices table
         product_query = '''
-        WITH current_prices AS (
-            -- Get current prices for all products
-            SELECT 
-                pr.product_id,
-                pr.location_id,
-                pr.price
-            FROM 
-                prices pr
-            JOIN 
-                products p ON pr.product_id = p.id
-            WHERE 
-                pr.date = ? AND pr.available = 1
-        ),
-        product_stats AS (
-            -- Calculate min price and avg price per product
+        WITH product_stats AS (
             SELECT 
                 product_id,
-                MIN(price) AS min_price,
-                AVG(price) AS avg_price
+                available_min_price AS min_price,
+                available_sum_price / available_count AS avg_price
             FROM 
-                current_prices
-            GROUP BY 
-                product_id
+                price_daily_product
+            WHERE 
+                date = ? AND available_count > 0
         )
         -- Select products with discount percentage above threshold
         SELECT 
@@ -492,18 +1153,36 @@ class Database:
 
         return inserted_count
 
-    def get_bargains(self, limit: int = 50, offset: int = 0) -> list[dict]:
+    def get_bargains(self, limit: int = 50, cursor: str | None = None) -> tuple[list[dict], str | None]:
         self.connect()
 
-        # First check if we have any bargains at all
-        self.local.cursor.execute("SELECT COUNT(*) FROM bargains")
-        bargain_count = self.local.cursor.fetchone()[0]
-        print(f"Found {bargain_count} bargains in the database")
+        params = []
+        page_filter = ""
 
-        if bargain_count == 0:
-            return []
+        # Continue after the last bargain of the previous page
+        if cursor:
+            page_filter = "WHERE (b.discount_percentage, b.id) < (?, ?)"
+            params.extend(decode_cursor(cursor, 2))
 
-        query = '''
+        params.append(limit)
+
+        # Pick the page from the discount index first, then join and group only those bargains
+        query = f'''
+        WITH page AS (
+            SELECT
+                b.id,
+                b.product_id,
+                b.avg_price,
+                b.current_price,
+                b.discount_percentage,
+                b.date_identified
+            FROM
+                bargains b
+            {page_filter}
+            ORDER BY
+                b.discount_percentage DESC, b.id DESC
+            LIMIT ?
+        )
         SELECT 
             b.id AS bargain_id,
             p.store, 
@@ -519,7 +1198,7 @@ class Database:
             b.date_identified,
             GROUP_CONCAT(l.name, ', ') AS locations
         FROM 
-            bargains b
+            page b
         JOIN 
             products p ON b.product_id = p.id
         JOIN 
@@ -529,14 +1208,16 @@ class Database:
         GROUP BY 
             b.id
         ORDER BY 
-            b.discount_percentage DESC
-        LIMIT ? OFFSET ?
+            b.discount_percentage DESC, b.id DESC
         '''
 
-        self.local.cursor.execute(query, (limit, offset))
+        self.local.cursor.execute(query, params)
         rows = self.local.cursor.fetchall()
 
+        logger.debug("found bargains", count=len(rows))
+
         results = []
+        next_cursor = None
         for row in rows:
             bargain_id, store, sku, name, brand, size, unit, category, avg_price, current_price, discount_percentage, date_identified, locations = row
 
@@ -558,12 +1239,18 @@ class Database:
 
             results.append(bargain_data)
 
-        return results
+            # The cursor keeps the unrounded discount so the next page resumes exactly after this row
+            next_cursor = encode_cursor(discount_percentage, bargain_id)
+
+        if len(results) < limit:
+            next_cursor = None
+
+        return results, next_cursor
 
-    def get_prices(self, store: str, sku: str) -> list[dict]:
+    def get_prices(self, store: str, sku: str, start: str | None = None, end: str | None = None) -> list[dict]:
         self.connect()
 
-        query = '''
+        query = f'''
         SELECT 
             p.store,
             pr.date,
@@ -572,18 +1259,20 @@ class Database:
             pr.price,
             pr.available
         FROM 
-            prices pr
+            {self._prices_source(start, end)} pr
         JOIN 
             products p ON pr.product_id = p.id
         JOIN 
             locations l ON pr.location_id = l.id
         WHERE 
-            p.store = ? AND p.sku = ?
+            p.store = ? AND p.sku = ? AND
+            pr.date >= COALESCE(?, '') AND
+            pr.date <= COALESCE(?, '9999-12-31')
         ORDER BY 
             pr.date DESC, l.name ASC
         '''
 
-        self.local.cursor.execute(query, (store, sku))
+        self.local.cursor.execute(query, (store, sku, start, end))
         rows = self.local.cursor.fetchall()
 
         results = []
@@ -603,6 +1292,324 @@ class Database:
 
         return results
 
+    def get_product(self, store: str, sku: str) -> dict | None:
+        self.connect()
+
+        query = '''
+        SELECT
+            p.id,
+            p.store,
+            p.sku,
+            p.name,
+            p.brand,
+            p.size,
+            p.unit,
+            p.category,
+            p.snap_eligible,
+            p.last_seen,
+            p.active,
+            MIN(pr.price) AS lowest_price,
+            MAX(pr.price) AS highest_price,
+            MAX(pr.available) AS available
+        FROM
+            products p
+        LEFT JOIN
+            prices pr ON pr.product_id = p.id AND pr.date = p.last_seen
+        WHERE
+            p.store = ? AND p.sku = ?
+        GROUP BY
+            p.id
+        '''
+
+        self.local.cursor.execute(query, (store, sku))
+        row = self.local.cursor.fetchone()
+
+        if not row:
+            return None
+
+        id, store, sku, name, brand, size, unit, category, snap_eligible, last_seen, active, lowest_price, highest_price, available = row
+
+        return {
+            "id": id,
+            "store": store,
+            "sku": sku,
+            "name": name,
+            "brand": brand,
+            "size": size,
+            "unit": unit,
+            "category": category,
+            "snap_eligible": bool(snap_eligible),
+            "last_updated": last_seen,
+            "active": bool(active),
+            "lowest_price": lowest_price,
+            "highest_price": highest_price,
+            "available": bool(available)
+        }
+
+    def get_price_history(self, product_id: int, start: str | None = None, end: str | None = None,
+                          bucket: str = "day") -> list[dict]:
+        self.connect()
+
+        # Longer histories can be downsampled to one point per week (starting Monday) or month. Days and weeks
+        # come straight from their rollup tables; months are combined from the daily rollups, so their location
+        # counts are the highest seen on any one day of the month.
+        buckets = {
+            "day": ("price_daily_product", "date", "location_count", "available_count"),
+            "week": ("price_weekly_product", "week", "location_count", "available_count"),
+            "month": ("price_daily_product", "strftime('%Y-%m-01', date)", "MAX(location_count)",
+                      "MAX(available_count)")
+        }
+
+        if bucket not in buckets:
+            raise ValueError(f"Unknown bucket: {bucket}")
+
+        table, period, location_count, available_count = buckets[bucket]
+        column = "date" if bucket != "week" else "week"
+
+        query = f'''
+        SELECT
+            {period} AS period,
+            MIN(min_price),
+            MAX(max_price),
+            SUM(sum_price) / SUM(price_count),
+            {location_count},
+            {available_count}
+        FROM
+            {table}
+        WHERE
+            product_id = ? AND
+            {column} >= COALESCE(?, '') AND
+            {column} <= COALESCE(?, '9999-12-31')
+        GROUP BY
+            period
+        ORDER BY
+            period DESC
+        '''
+
+        # Weeks are keyed by their Monday, so widen the start to include the week it falls in
+        if bucket == "week" and start:
+            self.local.cursor.execute("SELECT date(?, 'weekday 0', '-6 days')", (start,))
+            start = self.local.cursor.fetchone()[0]
+
+        self.local.cursor.execute(query, (product_id, start, end))
+        rows = self.local.cursor.fetchall()
+
+        results = []
+        for row in rows:
+            date, min_price, max_price, avg_price, location_count, available_count = row
+
+            results.append({
+                "date": date,
+                "min_price": min_price,
+                "max_price": max_price,
+                "avg_price": avg_price,
+                "location_count": location_count,
+                "available_count": available_count
+            })
+
+        return results
+
+    def get_current_prices(self, product_id: int) -> list[dict]:
+        self.connect()
+
+        query = '''
+        SELECT
+            p.store,
+            pr.date,
+            l.name AS location_name,
+            l.zip AS location_zip,
+            pr.price,
+            pr.available
+        FROM
+            products p
+        JOIN
+            prices pr ON pr.product_id = p.id AND pr.date = p.last_seen
+        JOIN
+            locations l ON pr.location_id = l.id
+        WHERE
+            p.id = ?
+        ORDER BY
+            pr.price ASC, l.name ASC
+        '''
+
+        self.local.cursor.execute(query, (product_id,))
+        rows = self.local.cursor.fetchall()
+
+        results = []
+        for row in rows:
+            store, date, location_name, location_zip, price, available = row
+
+            results.append({
+                "store": store,
+                "date": date,
+                "location": location_name,
+                "zip": location_zip,
+                "price": price,
+                "available": bool(available)
+            })
+
+        return results
+
+    def iter_prices(self, product_id: int, start: str | None = None, end: str | None = None,
+                    batch_size: int = 1000):
+        # Every per-location price of a product, oldest first, read in batches so long histories can be streamed
+        # without holding them in memory. Uses its own cursor so other queries on this thread don't disturb it.
+        self.connect()
+        source = self._prices_source(start, end)
+        cursor = self.local.conn.cursor()
+
+        cursor.execute(f'''
+        SELECT
+            pr.date,
+            l.name AS location_name,
+            l.zip AS location_zip,
+            pr.price,
+            pr.available
+        FROM
+            {source} pr
+        JOIN
+            locations l ON pr.location_id = l.id
+        WHERE
+            pr.product_id = ? AND
+            pr.date >= COALESCE(?, '') AND
+            pr.date <= COALESCE(?, '9999-12-31')
+        ORDER BY
+            pr.date ASC, l.name ASC
+        ''', (product_id, start, end))
+
+        try:
+            while rows := cursor.fetchmany(batch_size):
+                for date, location_name, location_zip, price, available in rows:
+                    yield {
+                        "date": date,
+                        "location": location_name,
+                        "zip": location_zip,
+                        "price": price,
+                        "available": bool(available)
+                    }
+        finally:
+            cursor.close()
+
+    def export_products(self, store: str | None = None, category: str | None = None, since: str | None = None,
+                        until: str | None = None, batch_size: int = 1000):
+        # The whole catalog, optionally limited to products seen within a date range, read in batches so it can
+        # be streamed with constant memory
+        self.connect()
+        cursor = self.local.conn.cursor()
+
+        query = '''
+        SELECT
+            p.id,
+            p.store,
+            p.sku,
+            p.name,
+            p.brand,
+            p.size,
+            p.unit,
+            p.category,
+            p.snap_eligible,
+            p.first_seen,
+            p.last_seen,
+            p.active
+        FROM
+            products p
+        WHERE
+            p.last_seen >= COALESCE(?, '') AND
+            p.last_seen <= COALESCE(?, '9999-12-31')
+        '''
+        params = [since, until]
+
+        if store:
+            query += " AND p.store = ?"
+            params.append(store)
+
+        if category:
+            query += " AND p.category = ?"
+            params.append(category)
+
+        query += " ORDER BY p.id"
+
+        cursor.execute(query, params)
+
+        try:
+            while rows := cursor.fetchmany(batch_size):
+                for row in rows:
+                    id, store, sku, name, brand, size, unit, category, snap_eligible, first_seen, last_seen, active = row
+                    yield {
+                        "id": id,
+                        "store": store,
+                        "sku": sku,
+                        "name": name,
+                        "brand": brand,
+                        "size": size,
+                        "unit": unit,
+                        "category": category,
+                        "snap_eligible": bool(snap_eligible),
+                        "first_seen": first_seen,
+                        "last_seen": last_seen,
+                        "active": bool(active)
+                    }
+        finally:
+            cursor.close()
+
+    def export_prices(self, store: str | None = None, category: str | None = None, since: str | None = None,
+                      until: str | None = None, batch_size: int = 1000):
+        # Every per-location price recorded within a date range, in date order so incremental pulls can resume
+        # from the last date they saw
+        self.connect()
+        source = self._prices_source(since, until)
+        cursor = self.local.conn.cursor()
+
+        query = f'''
+        SELECT
+            pr.date,
+            p.id,
+            p.store,
+            p.sku,
+            l.code,
+            l.name,
+            pr.price,
+            pr.available
+        FROM
+            {source} pr
+        JOIN
+            products p ON pr.product_id = p.id
+        JOIN
+            locations l ON pr.location_id = l.id
+        WHERE
+            pr.date >= COALESCE(?, '') AND
+            pr.date <= COALESCE(?, '9999-12-31')
+        '''
+        params = [since, until]
+
+        if store:
+            query += " AND p.store = ?"
+            params.append(store)
+
+        if category:
+            query += " AND p.category = ?"
+            params.append(category)
+
+        query += " ORDER BY pr.date, pr.id"
+
+        cursor.execute(query, params)
+
+        try:
+            while rows := cursor.fetchmany(batch_size):
+                for date, product_id, store, sku, location_code, location_name, price, available in rows:
+                    yield {
+                        "date": date,
+                        "product_id": product_id,
+                        "store": store,
+                        "sku": sku,
+                        "location_code": location_code,
+                        "location": location_name,
+                        "price": price,
+                        "available": bool(available)
+                    }
+        finally:
+            cursor.close()
+
     def list_comparisons(self) -> list[dict]:
         self.connect()
 
@@ -749,6 +1756,216 @@ class Database:
 
         return result
 
+    def list_comparison_summaries(self) -> list[dict]:
+        self.connect()
+
+        query = '''
+        SELECT
+            c.id,
+            c.title,
+            c.created_on,
+            s.comparison_id IS NOT NULL AS has_summary,
+            s.best_unit_price,
+            s.second_unit_price,
+            s.unit,
+            p.store,
+            p.sku,
+            p.name,
+            p.brand,
+            p.size
+        FROM
+            comparisons c
+        LEFT JOIN
+            comparison_summary s ON s.comparison_id = c.id
+        LEFT JOIN
+            products p ON p.id = s.best_product_id
+        ORDER BY
+            c.created_on DESC
+        '''
+
+        self.local.cursor.execute(query)
+        rows = self.local.cursor.fetchall()
+
+        # Comparisons saved before summaries existed are summarised once, on first listing
+        missing = [row[0] for row in rows if not row[3]]
+        if missing:
+            self._refresh_comparison_summaries(missing)
+            self.local.conn.commit()
+            self.local.cursor.execute(query)
+            rows = self.local.cursor.fetchall()
+
+        results = []
+        for row in rows:
+            comparison_id, title, created_on, _, best_unit_price, second_unit_price, unit, store, sku, name, brand, size = row
+
+            best_value_product = None
+            if best_unit_price is not None:
+                best_value_product = {
+                    "store": store,
+                    "sku": sku,
+                    "name": name,
+                    "brand": brand or "",
+                    "size": size,
+                    "unit_price": best_unit_price
+                }
+
+            # Savings is the difference between the best and second best unit prices
+            savings = None
+            if best_unit_price is not None and second_unit_price is not None:
+                savings = best_unit_price - second_unit_price
+
+            results.append({
+                "id": comparison_id,
+                "title": title,
+                "created_on": created_on,
+                "best_value_product": best_value_product,
+                "unit": unit,
+                "savings": savings
+            })
+
+        return results
+
+    def refresh_comparison_summaries(self, comparison_ids: list[int] | None = None) -> None:
+        self.connect()
+        self._refresh_comparison_summaries(comparison_ids)
+        self.local.conn.commit()
+
+    def _refresh_comparison_summaries(self, comparison_ids: list[int] | None = None) -> None:
+        # Recomputes the summaries for the given comparisons (or all of them) in one statement, without committing
+        updated_on = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+        product_filter = ""
+        comparison_filter = ""
+        ids = []
+        if comparison_ids is not None:
+            if not comparison_ids:
+                return
+            placeholders = ", ".join("?" for _ in comparison_ids)
+            product_filter = f"WHERE cp.comparison_id IN ({placeholders})"
+            comparison_filter = f"WHERE c.id IN ({placeholders})"
+            ids = list(comparison_ids)
+
+        query = f'''
+        INSERT OR REPLACE INTO comparison_summary
+            (comparison_id, product_count, best_product_id, best_unit_price, second_unit_price, unit, updated_on)
+        WITH product_unit_prices AS (
+            -- Lowest current price per unit of size for every product in a comparison
+            SELECT
+                cp.comparison_id,
+                p.id AS product_id,
+                p.unit,
+                CASE WHEN p.size > 0 THEN MIN(pr.price) / p.size END AS unit_price
+            FROM
+                comparison_products cp
+            JOIN
+                products p ON cp.product_id = p.id
+            LEFT JOIN
+                prices pr ON pr.product_id = p.id AND pr.date = p.last_seen
+            {product_filter}
+            GROUP BY
+                cp.comparison_id, p.id
+        ),
+        ranked AS (
+            SELECT
+                *,
+                ROW_NUMBER() OVER (
+                    PARTITION BY comparison_id
+                    ORDER BY unit_price IS NULL, unit_price, product_id
+                ) AS unit_price_rank
+            FROM
+                product_unit_prices
+        )
+        SELECT
+            c.id,
+            COUNT(r.product_id),
+            MAX(CASE WHEN r.unit_price_rank = 1 AND r.unit_price IS NOT NULL THEN r.product_id END),
+            MAX(CASE WHEN r.unit_price_rank = 1 THEN r.unit_price END),
+            MAX(CASE WHEN r.unit_price_rank = 2 THEN r.unit_price END),
+            MAX(CASE WHEN r.unit_price_rank = 1 AND r.unit_price IS NOT NULL THEN r.unit END),
+            ?
+        FROM
+            comparisons c
+        LEFT JOIN
+            ranked r ON r.comparison_id = c.id
+        {comparison_filter}
+        GROUP BY
+            c.id
+        '''
+
+        self.local.cursor.execute(query, ids + [updated_on] + ids)
+
+    def get_basket_offers(self, comparison_ids: list[int], stores: list[str] | None = None) -> list[dict]:
+        # For each comparison and location, the cheapest of the comparison's products available there today
+        self.connect()
+
+        if not comparison_ids:
+            return []
+
+        placeholders = ", ".join("?" * len(comparison_ids))
+        params = list(comparison_ids)
+
+        store_filter = ""
+        if stores:
+            store_filter = f"AND l.store IN ({', '.join('?' * len(stores))})"
+            params.extend(stores)
+
+        # SQLite takes the bare product and location columns from the row that has the MIN price
+        query = f'''
+        SELECT
+            c.id,
+            c.title,
+            l.id,
+            l.store,
+            l.name,
+            p.id,
+            p.sku,
+            p.name,
+            p.brand,
+            p.size,
+            p.unit,
+            MIN(pr.price)
+        FROM
+            comparisons c
+        JOIN
+            comparison_products cp ON cp.comparison_id = c.id
+        JOIN
+            products p ON cp.product_id = p.id
+        JOIN
+            prices pr ON pr.product_id = p.id AND pr.date = p.last_seen
+        JOIN
+            locations l ON pr.location_id = l.id
+        WHERE
+            c.id IN ({placeholders}) AND
+            pr.available = 1
+            {store_filter}
+        GROUP BY
+            c.id, l.id
+        '''
+
+        self.local.cursor.execute(query, params)
+        rows = self.local.cursor.fetchall()
+
+        results = []
+        for row in rows:
+            comparison_id, title, location_id, store, location_name, product_id, sku, name, brand, size, unit, price = row
+
+            results.append({
+                "comparison_id": comparison_id,
+                "title": title,
+                "location_id": location_id,
+                "store": store,
+                "location": location_name,
+                "product_id": product_id,
+                "sku": sku,
+                "name": name,
+                "brand": brand,
+                "size": size,
+                "unit": unit,
+                "price": price
+            })
+
+        return results
+
     def create_comparison(self, title: str, product_ids: list[int]) -> int:
         self.connect()
         created_on = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -768,6 +1985,9 @@ class Database:
                 VALUES (?, ?)
             ''', (comparison_id, product_id))
 
+        self._refresh_comparison_summaries([comparison_id])
+        self._bump_data_version()
+
         self.local.conn.commit()
         return comparison_id
 
@@ -802,6 +2022,10 @@ class Database:
                     VALUES (?, ?)
                 ''', (comparison_id, product_id))
 
+            self._refresh_comparison_summaries([comparison_id])
+
+        self._bump_data_version()
+
         self.local.conn.commit()
         return True
 
@@ -815,16 +2039,99 @@ class Database:
 
         # Delete the comparison (will cascade to comparison_products due to ON DELETE CASCADE)
         self.local.cursor.execute("DELETE FROM comparisons WHERE id = ?", (comparison_id,))
+        self._bump_data_version()
 
         self.local.conn.commit()
         return True
 
+    def save_scrape_metrics(self, metrics: list[dict]) -> None:
+        self.connect()
+
+        self.local.cursor.executemany('''
+            INSERT INTO scrape_metrics (run_id, store, location_id, started_at, wall_time, http_requests, http_bytes,
+                                        retries, products, db_rows, network_time, wait_time, parse_time, db_time, error)
+            VALUES (:run_id, :store, :location_id, :started_at, :wall_time, :http_requests, :http_bytes,
+                    :retries, :products, :db_rows, :network_time, :wait_time, :parse_time, :db_time, :error)
+        ''', metrics)
+
+        self.local.conn.commit()
+
+    def get_scrape_metrics(self, run_id: str | None = None) -> list[dict]:
+        self.connect()
+
+        # Default to the most recent run
+        query = '''
+        SELECT
+            m.run_id,
+            m.store,
+            l.name AS location_name,
+            l.code AS location_code,
+            m.started_at,
+            m.wall_time,
+            m.http_requests,
+            m.http_bytes,
+            m.retries,
+            m.products,
+            m.db_rows,
+            m.network_time,
+            m.wait_time,
+            m.parse_time,
+            m.db_time,
+            m.error
+        FROM
+            scrape_metrics m
+        JOIN
+            locations l ON m.location_id = l.id
+        WHERE
+            m.run_id = COALESCE(?, (SELECT MAX(run_id) FROM scrape_metrics))
+        ORDER BY
+            m.wall_time DESC
+        '''
+
+        self.local.cursor.execute(query, (run_id,))
+        columns = [column[0] for column in self.local.cursor.description]
+
+        return [dict(zip(columns, row)) for row in self.local.cursor.fetchall()]
+
+    def list_scrape_runs(self, limit: int = 20) -> list[dict]:
+        self.connect()
+
+        query = '''
+        SELECT
+            run_id,
+            COUNT(*) AS jobs,
+            SUM(products) AS products,
+            SUM(http_requests) AS http_requests,
+            SUM(http_bytes) AS http_bytes,
+            SUM(retries) AS retries,
+            MAX(wall_time) AS longest_job,
+            SUM(CASE WHEN error IS NOT NULL THEN 1 ELSE 0 END) AS errors
+        FROM
+            scrape_metrics
+        GROUP BY
+            run_id
+        ORDER BY
+            run_id DESC
+        LIMIT ?
+        '''
+
+        self.local.cursor.execute(query, (limit,))
+        columns = [column[0] for column in self.local.cursor.description]
+
+        return [dict(zip(columns, row)) for row in self.local.cursor.fetchall()]
+
     def clear(self):
         self.connect()
         self.local.cursor.execute("DELETE FROM bargain_locations")
         self.local.cursor.execute("DELETE FROM bargains")
+        self.local.cursor.execute("DELETE FROM price_events")
+        self.local.cursor.execute("DELETE FROM archived_last_prices")
+        self.local.cursor.execute("DELETE FROM price_daily_product")
+        self.local.cursor.execute("DELETE FROM price_weekly_product")
         self.local.cursor.execute("DELETE FROM prices")
         self.local.cursor.execute("DELETE FROM products")
+        self.local.cursor.execute("DELETE FROM scrape_metrics")
+        self.local.cursor.execute("DELETE FROM store_runs")
         self.local.cursor.execute("DELETE FROM locations")
         self.local.conn.commit()
 
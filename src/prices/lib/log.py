@@ -0,0 +1,105 @@
+import atexit
+import copy
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from datetime import datetime
+
+# Verbosity and per-item sampling can be tuned without code changes, e.g. PRICES_LOG_LEVEL=DEBUG to see every
+# saved product, or PRICES_LOG_SAMPLE_RATE=1 to disable sampling
+LOG_LEVEL = os.getenv("PRICES_LOG_LEVEL", "INFO").upper()
+SAMPLE_RATE = float(os.getenv("PRICES_LOG_SAMPLE_RATE", "0.01"))
+
+_listener = None
+
+
+class StructuredFormatter(logging.Formatter):
+    # One logfmt line per record: time, level, logger and message followed by the record's key=value fields
+    def format(self, record: logging.LogRecord) -> str:
+        timestamp = datetime.fromtimestamp(record.created).strftime("%Y-%m-%d %H:%M:%S")
+        parts = [
+            f"time={timestamp}",
+            f"level={record.levelname.lower()}",
+            f"logger={record.name}",
+            f"msg={self.quote(record.getMessage())}"
+        ]
+
+        for key, value in getattr(record, "fields", {}).items():
+            parts.append(f"{key}={self.quote(value)}")
+
+        line = " ".join(parts)
+
+        if record.exc_text:
+            line += "\n" + record.exc_text
+
+        return line
+
+    @staticmethod
+    def quote(value) -> str:
+        value = str(value)
+        if not value or any(c in value for c in ' "=\n'):
+            value = '"' + value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        return value
+
+
+class BackgroundQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve the message and traceback while they're still valid, but leave the formatting to the listener
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class StructuredLogger(logging.LoggerAdapter):
+    # Keyword arguments that aren't logging's own become structured fields:
+    #   logger.info("scraped location", store="Cub", products=1234)
+    RESERVED = {"exc_info", "stack_info", "stacklevel", "extra"}
+
+    def process(self, msg, kwargs):
+        fields = {key: kwargs.pop(key) for key in list(kwargs) if key not in self.RESERVED}
+        kwargs.setdefault("extra", {})["fields"] = fields
+        return msg, kwargs
+
+    def sampled(self, level: int, msg: str, rate: float | None = None, **fields):
+        # For per-item events: skipped entirely unless the level is enabled, then only a fraction are emitted
+        if not self.isEnabledFor(level):
+            return
+
+        rate = SAMPLE_RATE if rate is None else rate
+        if rate < 1.0 and random.random() >= rate:
+            return
+
+        self.log(level, msg, sample_rate=rate, **fields)
+
+
+def configure_logging(level: str | None = None):
+    global _listener
+
+    if _listener is not None:
+        return
+
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(StructuredFormatter())
+
+    # Records are handed to a queue on the calling thread and written to stderr by a background listener, so
+    # scraper and database threads never block on terminal I/O
+    log_queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    root = logging.getLogger("prices")
+    root.setLevel(level or LOG_LEVEL)
+    root.addHandler(BackgroundQueueHandler(log_queue))
+    root.propagate = False
+
+
+def get_logger(name: str) -> StructuredLogger:
+    return StructuredLogger(logging.getLogger(name), {})
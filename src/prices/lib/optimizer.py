@@ -0,0 +1,145 @@
+import heapq
+import math
+from typing import NamedTuple
+
+# Cheapest-basket planning: given the best current price of every item at every location, choose at most
+# max_stores locations minimizing the basket's total when each item is bought wherever it's cheapest among them.
+#
+# The search is a depth-first branch and bound over location subsets. Locations are visited best-first so a good
+# plan is found early, and a branch is pruned when no completion can beat it, using two lower bounds:
+#   - every item at its cheapest price among the chosen and all not yet considered locations
+#   - the current total minus the largest savings the remaining store slots could add, since the saving from adding
+#     several stores is never more than the sum of what each would save alone
+
+
+class BasketPlan(NamedTuple):
+    locations: list
+    total: float
+    assignments: dict
+    unavailable: list
+    nodes: int
+
+
+def optimize_basket(prices: dict, max_stores: int, quantities: dict | None = None) -> BasketPlan:
+    # prices maps each item to {location: price} for the locations that stock it. Items that can't be bought at the
+    # chosen locations (including those stocked nowhere) are reported as unavailable and left out of the total.
+    quantities = quantities or {}
+
+    items = [item for item, offers in prices.items() if offers]
+    unavailable = [item for item, offers in prices.items() if not offers]
+
+    if not items or max_stores < 1:
+        return BasketPlan([], 0.0, {}, unavailable + items, 0)
+
+    # A missing item costs more than any whole basket, so the search covers as many items as it can first and only
+    # then minimizes the price
+    missing = 1.0 + sum(max(offers.values()) * quantities.get(item, 1) for item, offers in prices.items() if offers)
+
+    # One vector of line totals per location
+    vectors = {}
+    for index, item in enumerate(items):
+        quantity = quantities.get(item, 1)
+        for location, price in prices[item].items():
+            vectors.setdefault(location, [missing] * len(items))[index] = price * quantity
+
+    # Best first: locations stocking the most items, then the cheapest for what they stock
+    locations = sorted(vectors, key=lambda l: (sum(v == missing for v in vectors[l]),
+                                               sum(v for v in vectors[l] if v < missing)))
+    vectors = [vectors[location] for location in locations]
+
+    # suffix[i][j] is the cheapest line total for item j among locations i onwards
+    suffix = [[missing] * len(items)]
+    for vector in reversed(vectors):
+        suffix.append(list(map(min, vector, suffix[-1])))
+    suffix.reverse()
+
+    best_total = math.inf
+    best_chosen = []
+    nodes = 0
+
+    def search(start: int, chosen: list[int], current: list[float], total: float):
+        nonlocal best_total, best_chosen, nodes
+        nodes += 1
+
+        if chosen and total < best_total:
+            best_total = total
+            best_chosen = list(chosen)
+
+        slots = max_stores - len(chosen)
+        if slots == 0 or start == len(vectors):
+            return
+
+        # What each remaining location would save on its own
+        gains = [sum(c - v for c, v in zip(current, vectors[i]) if v < c) for i in range(start, len(vectors))]
+
+        for i in range(start, len(vectors)):
+            gain = gains[i - start]
+            if gain <= 0:
+                continue
+
+            # Savings bound: this location's saving plus the best the other free slots could add
+            others = heapq.nlargest(slots - 1, gains[i - start + 1:]) if slots > 1 else []
+            if total - gain - sum(others) >= best_total:
+                continue
+
+            merged = list(map(min, current, vectors[i]))
+
+            # Suffix bound: every item at its cheapest among the chosen and the later locations
+            if sum(map(min, merged, suffix[i + 1])) >= best_total:
+                continue
+
+            search(i + 1, chosen + [i], merged, total - gain)
+
+    search(0, [], [missing] * len(items), missing * len(items))
+
+    chosen = [locations[i] for i in best_chosen]
+    assignments = {}
+    total = 0.0
+    for item in items:
+        stocked = [location for location in chosen if location in prices[item]]
+        if not stocked:
+            unavailable.append(item)
+            continue
+        location = min(stocked, key=lambda l: prices[item][l])
+        assignments[item] = (location, prices[item][location])
+        total += prices[item][location] * quantities.get(item, 1)
+
+    return BasketPlan(chosen, total, assignments, unavailable, nodes)
+
+
+def plan_basket(offers: list[dict], quantities: dict[int, int], max_stores: int) -> dict:
+    # offers are Database.get_basket_offers rows: the cheapest current product of each comparison at each location
+    prices = {comparison_id: {} for comparison_id in quantities}
+    details = {}
+    for offer in offers:
+        prices[offer["comparison_id"]][offer["location_id"]] = offer["price"]
+        details[(offer["comparison_id"], offer["location_id"])] = offer
+
+    plan = optimize_basket(prices, max_stores, quantities)
+
+    locations = {}
+    items = []
+    for comparison_id, (location_id, price) in plan.assignments.items():
+        offer = details[(comparison_id, location_id)]
+        locations[location_id] = {"id": location_id, "store": offer["store"], "name": offer["location"]}
+        items.append({
+            "comparison_id": comparison_id,
+            "title": offer["title"],
+            "quantity": quantities[comparison_id],
+            "location_id": location_id,
+            "product_id": offer["product_id"],
+            "store": offer["store"],
+            "sku": offer["sku"],
+            "name": offer["name"],
+            "brand": offer["brand"],
+            "size": offer["size"],
+            "unit": offer["unit"],
+            "price": price
+        })
+
+    return {
+        "locations": [locations[location_id] for location_id in plan.locations if location_id in locations],
+        "total": round(plan.total, 2),
+        "items": items,
+        "unavailable": plan.unavailable
+    }
@@ -0,0 +1,27 @@
+import sys
+from typing import NamedTuple
+
+
+class ScrapedProduct(NamedTuple):
+    # One scraped observation of a product at a location, as yielded by every scraper and written by
+    # Database.save_batch. A tuple with no per-item __dict__ is much smaller than the dicts it replaces, and a run
+    # holds hundreds of thousands of them between the scraper threads and the database worker.
+    sku: str
+    name: str
+    price: float
+    size: float | None
+    brand: str
+    unit: str
+    snap_eligible: bool
+    available: bool
+    # None leaves an existing product's category alone, for scrapes that don't fetch categories
+    category: str | None = None
+
+    @classmethod
+    def create(cls, sku, name, price, size, brand, unit, snap_eligible, available, category=None) -> "ScrapedProduct":
+        # Brands, units and categories repeat across nearly every item, so each distinct value is stored once
+        return cls(sku, name, price, size, intern(brand), intern(unit), snap_eligible, available, intern(category))
+
+
+def intern(value: str | None) -> str | None:
+    return sys.intern(value) if isinstance(value, str) else value
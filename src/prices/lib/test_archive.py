@@ -0,0 +1,66 @@
+import os
+
+import pytest
+
+from prices.lib import archive
+from prices.lib.database import Database
+from prices.lib.product import ScrapedProduct
+
+
+@pytest.fixture
+def db(tmp_path):
+    with Database(str(tmp_path / "prices.db")) as db:
+        yield db
+
+
+def save_on(db, location_id: int, date: str, price: float):
+    db.save(location_id, ScrapedProduct.create("1", "Milk", price, 1.0, "Brand", "gal", True, True, "Dairy"))
+    db.local.cursor.execute("UPDATE prices SET date = ? WHERE date > ?", (date, date))
+    db.local.conn.commit()
+
+
+def test_old_prices_move_to_yearly_archives(db):
+    location_id = db.create_location("Cub", "Cub #1", "1", "55101")
+    save_on(db, location_id, "2022-06-06", 2.00)
+    save_on(db, location_id, "2023-06-05", 2.50)
+
+    assert archive.archive_prices(db, horizon_days=365) == {2022: 1, 2023: 1}
+    assert sorted(archive.list_archives(db.database_path)) == [2022, 2023]
+    assert all(os.path.exists(path) for path in archive.list_archives(db.database_path).values())
+
+    db.local.cursor.execute("SELECT COUNT(*) FROM main.prices")
+    assert db.local.cursor.fetchone()[0] == 0
+    # Archived rows still count towards the total and are still read back
+    assert db.get_stats()["total_prices"] == "2"
+    assert [row["price"] for row in db.get_prices("Cub", "1")] == [2.50, 2.00]
+    assert [row["price"] for row in db.get_prices("Cub", "1", start="2023-01-01")] == [2.50]
+
+    # Nothing is left to move the second time
+    assert archive.archive_prices(db, horizon_days=365) == {}
+
+
+def test_a_reappearing_product_is_diffed_against_its_archived_price(db):
+    location_id = db.create_location("Cub", "Cub #1", "1", "55101")
+    save_on(db, location_id, "2022-06-06", 2.00)
+    archive.archive_prices(db, horizon_days=365)
+
+    db.save(location_id, ScrapedProduct.create("1", "Milk", 1.50, 1.0, "Brand", "gal", True, True, "Dairy"))
+
+    events, _ = db.get_price_events()
+    assert [(event["event"], event["old_price"]) for event in events] == [("price_down", 2.00), ("new", None)]
+
+
+def test_attaching_archives_detaches_the_others(db):
+    assert sorted(db.attach_archives([2021, 2022], create=True)) == [2021, 2022]
+    assert sorted(db.attach_archives([2022, 2023], create=True)) == [2022, 2023]
+
+    db.local.cursor.execute("PRAGMA database_list")
+    assert sorted(name for _, name, _ in db.local.cursor.fetchall()) == ["archive_2022", "archive_2023", "main"]
+
+    # Without create, years with no archive file are skipped
+    assert sorted(db.attach_archives([2023, 2030])) == [2023]
+
+
+def test_invalid_dates_are_rejected(db):
+    with pytest.raises(ValueError):
+        db.get_prices("Cub", "1", start="last year")
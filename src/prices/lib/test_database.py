@@ -0,0 +1,146 @@
+import pytest
+
+from prices.lib.database import Database, decode_cursor, encode_cursor
+from prices.lib.product import ScrapedProduct
+
+
+@pytest.fixture
+def db(tmp_path):
+    with Database(str(tmp_path / "prices.db")) as db:
+        yield db
+
+
+def product(sku: str, name: str, price: float = 1.99) -> ScrapedProduct:
+    return ScrapedProduct.create(sku, name, price, 1.0, "Brand", "oz", True, True, "Pantry")
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor("Apples", 7), 2) == ["Apples", 7]
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!",
+    encode_cursor("Apples"),
+    encode_cursor("Apples", 7, 8),
+    encode_cursor(["Apples"], 7),
+    encode_cursor({"name": "Apples"}, 7),
+])
+def test_invalid_cursors_are_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, 2)
+
+
+def test_search_pages_cover_every_product_once(db):
+    location_id = db.create_location("Cub", "Cub #1", "1", "55101")
+    # Repeated names make the id the tie-breaker within the sort key
+    db.save_batch(location_id, [product(str(sku), f"Product {sku % 4}") for sku in range(10)])
+
+    seen = []
+    cursor = None
+    while True:
+        page, cursor = db.search_products(limit=3, cursor=cursor)
+        seen.extend(page)
+        if cursor is None:
+            break
+
+    assert len(seen) == 10
+    assert len({item["id"] for item in seen}) == 10
+    assert [(item["name"], item["id"]) for item in seen] == sorted((item["name"], item["id"]) for item in seen)
+
+
+def test_search_empty_page_has_no_cursor(db):
+    location_id = db.create_location("Cub", "Cub #1", "1", "55101")
+    db.save_batch(location_id, [product(str(sku), f"Product {sku}") for sku in range(4)])
+
+    # The second page is full, so it has a cursor; the page after it is empty
+    _, cursor = db.search_products(limit=2)
+    _, cursor = db.search_products(limit=2, cursor=cursor)
+    assert db.search_products(limit=2, cursor=cursor) == ([], None)
+    assert db.search_products(limit=0) == ([], None)
+
+
+def test_search_leaves_out_inactive_products(db):
+    location_id = db.create_location("Cub", "Cub #1", "1", "55101")
+    db.save_batch(location_id, [product("1", "Kept"), product("2", "Discontinued")])
+    db.local.cursor.execute("UPDATE products SET active = 0 WHERE sku = '2'")
+    db.local.conn.commit()
+
+    assert [item["name"] for item in db.search_products()[0]] == ["Kept"]
+    assert [item["name"] for item in db.search_products(include_inactive=True)[0]] == ["Discontinued", "Kept"]
+
+
+def test_price_events_diff_against_the_previous_observation(db):
+    location_id = db.create_location("Cub", "Cub #1", "1", "55101")
+    db.save(location_id, product("1", "Milk", 2.00))
+    db.save(location_id, product("1", "Milk", 2.50))
+    db.save(location_id, product("1", "Milk", 2.25))
+    db.save(location_id, product("1", "Milk", 2.25)._replace(available=False))
+
+    events, _ = db.get_price_events()
+    assert [(event["event"], event["old_price"], event["new_price"]) for event in reversed(events)] == [
+        ("new", None, 2.00),
+        ("price_up", 2.00, 2.50),
+        ("price_down", 2.50, 2.25),
+        ("unavailable", 2.25, 2.25),
+    ]
+
+
+def test_finish_location_records_disappeared_products(db):
+    location_id = db.create_location("Cub", "Cub #1", "1", "55101")
+    db.save_batch(location_id, [product("1", "Milk"), product("2", "Eggs")])
+    # Move the first scrape back a day, then scrape again without the eggs
+    db.local.cursor.execute("UPDATE prices SET date = DATE(date, '-1 day')")
+    db.local.conn.commit()
+    db.save(location_id, product("1", "Milk"))
+
+    assert db.finish_location(location_id) == 1
+    assert db.finish_location(location_id) == 0
+    events, _ = db.get_price_events(event="disappeared")
+    assert [event["name"] for event in events] == ["Eggs"]
+
+
+def test_price_event_pages(db):
+    location_id = db.create_location("Cub", "Cub #1", "1", "55101")
+    db.save_batch(location_id, [product(str(sku), f"Product {sku}") for sku in range(4)])
+
+    first, cursor = db.get_price_events(limit=2)
+    second, cursor = db.get_price_events(limit=2, cursor=cursor)
+    assert {event["id"] for event in first}.isdisjoint(event["id"] for event in second)
+    assert db.get_price_events(limit=2, cursor=cursor) == ([], None)
+    assert db.get_price_events(limit=0) == ([], None)
+
+
+def rollups(db) -> list[tuple]:
+    tables = []
+    for table in ("price_daily_product", "price_weekly_product"):
+        db.local.cursor.execute(f"SELECT * FROM {table} ORDER BY 1, 2")
+        tables.append(db.local.cursor.fetchall())
+    return tables
+
+
+def test_rollups_follow_saved_prices(db):
+    first = db.create_location("Cub", "Cub #1", "1", "55101")
+    second = db.create_location("Cub", "Cub #2", "2", "55102")
+    db.save(first, product("1", "Milk", 2.00))
+    db.save(second, product("1", "Milk", 3.00)._replace(available=False))
+    # A rescrape replaces the day's price rather than adding another observation
+    db.save(first, product("1", "Milk", 1.00))
+
+    [day] = db.get_price_history(1)
+    assert (day["min_price"], day["max_price"], day["avg_price"]) == (1.00, 3.00, 2.00)
+    assert (day["location_count"], day["available_count"]) == (2, 1)
+    assert db.get_price_history(1, bucket="week")[0]["avg_price"] == 2.00
+
+    # The incrementally maintained rollups match a rebuild from scratch
+    maintained = rollups(db)
+    db.rebuild_rollups()
+    assert rollups(db) == maintained
+
+
+def test_counters_match_a_full_count(db):
+    location_id = db.create_location("Cub", "Cub #1", "1", "55101")
+    db.create_location("ALDI", "ALDI #1", "1", "55101")
+    db.save_batch(location_id, [product(str(sku), f"Product {sku}") for sku in range(3)])
+
+    stats = db.get_stats()
+    assert {key: stats[key] for key in db.count_stats()} == db.count_stats()
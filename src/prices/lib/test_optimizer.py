@@ -0,0 +1,64 @@
+import itertools
+import random
+
+import pytest
+
+from prices.lib.optimizer import optimize_basket, plan_basket
+
+
+def exhaustive(prices: dict, max_stores: int, quantities: dict) -> tuple[int, float]:
+    # The fewest missing items, then the lowest total, over every subset of at most max_stores locations
+    locations = sorted({location for offers in prices.values() for location in offers})
+    best = (len(prices), 0.0)
+    for count in range(1, min(max_stores, len(locations)) + 1):
+        for chosen in itertools.combinations(locations, count):
+            missing = 0
+            total = 0.0
+            for item, offers in prices.items():
+                stocked = [offers[location] for location in chosen if location in offers]
+                if stocked:
+                    total += min(stocked) * quantities.get(item, 1)
+                else:
+                    missing += 1
+            best = min(best, (missing, total))
+    return best
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_matches_exhaustive_search(seed):
+    rng = random.Random(seed)
+    locations = range(rng.randint(1, 7))
+    prices = {
+        item: {location: round(rng.uniform(0.5, 10), 2) for location in locations if rng.random() < 0.7}
+        for item in range(rng.randint(1, 8))
+    }
+    quantities = {item: rng.randint(1, 3) for item in prices}
+    max_stores = rng.randint(1, 3)
+
+    plan = optimize_basket(prices, max_stores, quantities)
+    missing, total = exhaustive(prices, max_stores, quantities)
+
+    assert len(plan.locations) <= max_stores
+    assert len(plan.unavailable) == missing
+    assert plan.total == pytest.approx(total)
+
+
+def test_items_stocked_nowhere_are_unavailable():
+    plan = optimize_basket({1: {"a": 2.0}, 2: {}}, 1)
+    assert plan.locations == ["a"]
+    assert plan.unavailable == [2]
+    assert plan.total == 2.0
+
+
+def test_plan_basket_assigns_each_item_to_its_cheapest_chosen_location():
+    def offer(comparison_id, location_id, price):
+        return {"comparison_id": comparison_id, "title": f"Item {comparison_id}", "location_id": location_id,
+                "store": "Cub", "location": f"Cub #{location_id}", "product_id": comparison_id * 10 + location_id,
+                "sku": "sku", "name": "name", "brand": "brand", "size": 1.0, "unit": "oz", "price": price}
+
+    offers = [offer(1, 1, 2.0), offer(1, 2, 3.0), offer(2, 1, 5.0), offer(2, 2, 1.0)]
+    plan = plan_basket(offers, {1: 2, 2: 1}, 2)
+
+    assert plan["total"] == 5.0
+    assert {item["comparison_id"]: item["location_id"] for item in plan["items"]} == {1: 1, 2: 2}
+    assert plan["unavailable"] == []
@@ -1,7 +1,10 @@
-from logging import Logger
+import logging
 
-import requests
-from prices.scrape.util import retry, split_price, split_size_and_unit, get_simplified_category
+from prices.lib.log import get_logger
+from prices.lib.product import ScrapedProduct
+from prices.scrape import pagination
+from prices.scrape.decode import aldi_product_detail, aldi_products, response_json
+from prices.scrape.util import retry, http_get, split_price, split_size_and_unit, get_simplified_category
 
 
 # {
@@ -141,23 +144,36 @@ from prices.scrape.util import retry, split_price, split_size_and_unit, get_simp
 #   ]
 # }
 
+logger = get_logger(__name__)
+
+
+PAGE_SIZE = 30
+MAX_PAGE_SIZE = 120
+
+
 def scrape_aldi_products(store_id: str, quick: bool = False):
-    limit = 30
+    # ALDI's search isn't split into categories, so the whole catalogue counts as one
+    pager = pagination.controller("ALDI", PAGE_SIZE, MAX_PAGE_SIZE)
     offset = 0
 
     while True:
+        limit = pager.size
         url = f"https://api.aldi.us/v3/product-search?currency=USD&serviceType=pickup&limit={limit}&offset={offset}&sort=relevance&servicePoint={store_id}"
 
         with retry():
-            response = requests.get(url)
+            response = http_get(url)
 
         if response.status_code != 200:
+            if pager.failed("all", limit):
+                continue
             break
 
-        data = response.json()["data"]
-        products = 0
+        data = response_json(response, aldi_products)
+        offset += len(data["items"])
+        # Without a total in the response this falls back to stopping at the first short page
+        exhausted = pager.page("all", limit, len(data["items"]), offset, data["total"])
 
-        for item in data:
+        for item in data["items"]:
             name = " ".join(item["name"].split())
             sku = item["sku"]
             price = split_price(item["price"]["comparisonDisplay"] or item["price"]["amountRelevantDisplay"])
@@ -169,10 +185,10 @@ def scrape_aldi_products(store_id: str, quick: bool = False):
             category = "Unknown"
             if not quick:
                 with retry():
-                    detail_response = requests.get(f"https://api.aldi.us/v2/products/{sku}?servicePoint={store_id}&serviceType=pickup")
+                    detail_response = http_get(f"https://api.aldi.us/v2/products/{sku}?servicePoint={store_id}&serviceType=pickup")
 
                 if detail_response.status_code == 200:
-                    detail_data = detail_response.json()["data"]
+                    detail_data = response_json(detail_response, aldi_product_detail)
 
                     categories = detail_data.get("categories", [])
                     if categories:
@@ -183,30 +199,14 @@ def scrape_aldi_products(store_id: str, quick: bool = False):
                 name = item.get("urlSlugText", None)
                 if name:
                     name = name.replace("-", " ").title()
-                print(item)
-                # print(detail_data)
-                print(name)
-                print("====================================")
-
-            product = {
-                'sku': sku,
-                'name': name,
-                'price': price,
-                'size': size,
-                'brand': brand,
-                'unit': unit,
-                'snap_eligible': snap_eligible,
-                'available': available
-            }
-
-            if not quick:
-                product['category'] = category
-
-            products += 1
+                logger.warning("product has no name, using URL slug", store_id=store_id, sku=sku, name=name)
+                logger.sampled(logging.DEBUG, "unnamed product", store_id=store_id, item=item)
 
-            yield product
+            # Quick scrapes skip the detail requests, so they leave the stored category as it is
+            yield ScrapedProduct.create(sku, name, price, size, brand, unit, snap_eligible, available,
+                                        None if quick else category)
 
-        if not products:
+        if exhausted:
             break
 
-        offset += limit
+    pager.report(store_id)
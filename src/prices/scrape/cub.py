@@ -1,8 +1,11 @@
 import random
 import time
 
-import requests
-from prices.scrape.util import retry, split_price, split_size_and_unit, get_simplified_category
+from prices.lib.log import get_logger
+from prices.lib.product import ScrapedProduct
+from prices.scrape import pagination
+from prices.scrape.decode import response_json, storefront_page
+from prices.scrape.util import fan_out, retry, http_get, split_price, split_size_and_unit, get_simplified_category
 
 # {
 #   // Metadata tracking information
@@ -210,88 +213,100 @@ category_ids = [
 ]
 
 
-def scrape_cub_products(location_id: str):
-    limit = 50
-    product_skus = set()
+logger = get_logger(__name__)
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+# Categories fetched at once for a location
+CATEGORY_WORKERS = 4
 
-    for category_id in category_ids:
-        offset = 0
 
-        while True:
-            url = f"https://storefrontgateway.cub.com/api/stores/{location_id}/categories/{category_id}/search?take={limit}&skip={offset}&page={offset // limit + 1}&sort=relevance"
+def scrape_cub_category(location_id: str, category_id: str, pager: pagination.PageSizeController):
+    offset = 0
 
-            with retry():
-                response = requests.get(url)
-                data = response.json()
+    while True:
+        limit = pager.size
+        url = f"https://storefrontgateway.cub.com/api/stores/{location_id}/categories/{category_id}/search?take={limit}&skip={offset}&page={offset // limit + 1}&sort=relevance"
 
-            if "items" not in data or not data["items"]:
-                break
+        with retry():
+            response = http_get(url)
+            if response.status_code != 200 and pager.failed(category_id, limit):
+                continue
+            data = response_json(response, storefront_page)
 
-            for item in data["items"]:
-                sku = item.get("sku")
-                if sku in product_skus:
-                    continue
+        items = data["items"]
+        offset += len(items)
+        exhausted = pager.page(category_id, limit, len(items), offset, data.get("total"))
 
-                name = item.get("name", "Unknown")
+        for item in items:
+            sku = item.get("sku")
 
-                size = "1.0 each"
-                if "unitOfSize" in item and item["unitOfSize"]:
-                    size_value = item["unitOfSize"].get("size", 1.0)
-                    size_type = item["unitOfSize"].get("abbreviation") or item["unitOfSize"].get("type", "each")
-                    size = f"{size_value} {size_type}"
+            name = item.get("name", "Unknown")
 
-                size, unit = split_size_and_unit(size)
+            size = "1.0 each"
+            if "unitOfSize" in item and item["unitOfSize"]:
+                size_value = item["unitOfSize"].get("size", 1.0)
+                size_type = item["unitOfSize"].get("abbreviation") or item["unitOfSize"].get("type", "each")
+                size = f"{size_value} {size_type}"
 
-                # Get unit information
-                # unit = "each"
-                # if "unitOfMeasure" in item and item["unitOfMeasure"]:
-                #     unit = item["unitOfMeasure"].get("type", "each")
+            size, unit = split_size_and_unit(size)
 
-                # Get brand information
-                brand = item.get("brand", "")
+            # Get unit information
+            # unit = "each"
+            # if "unitOfMeasure" in item and item["unitOfMeasure"]:
+            #     unit = item["unitOfMeasure"].get("type", "each")
 
-                # Get SNAP eligibility
-                snap_eligible = False
-                if "attributes" in item and item["attributes"]:
-                    snap_flag = item["attributes"].get("aurus SNAP Flag", "N")
-                    snap_eligible = (snap_flag == "Y")
+            # Get brand information
+            brand = item.get("brand", "")
 
-                # Check availability
-                available = item.get("available", True)
+            # Get SNAP eligibility
+            snap_eligible = False
+            if "attributes" in item and item["attributes"]:
+                snap_flag = item["attributes"].get("aurus SNAP Flag", "N")
+                snap_eligible = (snap_flag == "Y")
 
-                price_str = None
-                if "price" in item and item["price"]:
-                    if isinstance(item["price"], str) and "avg/ea" in item["price"]:
-                        price_str = item.get("pricePerUnit")
-                    else:
-                        price_str = item["price"]
-                elif "priceNumeric" in item:
-                    price_str = f"${item['priceNumeric']}"
+            # Check availability
+            available = item.get("available", True)
 
-                categories = item.get("categories", [])
-                if categories:
-                    category = categories[1].get("category")
-                    category = get_simplified_category(category)
+            price_str = None
+            if "price" in item and item["price"]:
+                if isinstance(item["price"], str) and "avg/ea" in item["price"]:
+                    price_str = item.get("pricePerUnit")
                 else:
-                    raise ValueError(f"Category not found for {sku}")
+                    price_str = item["price"]
+            elif "priceNumeric" in item:
+                price_str = f"${item['priceNumeric']}"
+
+            # Listings are deduplicated after parsing, so a listing without categories can be a duplicate of one
+            # that has them; skip it rather than ending the location
+            categories = item.get("categories", [])
+            if not categories:
+                logger.warning("category not found", sku=sku, category=category_id)
+                continue
+            category = categories[1].get("category")
+            category = get_simplified_category(category)
+
+            if price_str:
+                price = split_price(price_str)
+                yield ScrapedProduct.create(sku, name, price, size, brand, unit, snap_eligible, available,
+                                            category)
+
+        if exhausted:
+            break
+
+
+def scrape_cub_products(location_id: str):
+    pager = pagination.controller("Cub", PAGE_SIZE, MAX_PAGE_SIZE)
+    product_skus = set()
 
-                if price_str:
-                    price = split_price(price_str)
-                    product_skus.add(sku)
-                    product = {
-                        'sku': sku,
-                        'name': name,
-                        'category': category,
-                        'price': price,
-                        'size': size,
-                        'brand': brand,
-                        'unit': unit,
-                        'snap_eligible': snap_eligible,
-                        'available': available
-                    }
-                    yield product
+    # Categories are fetched concurrently but yielded in order, so the first category listing a SKU keeps it
+    categories = fan_out(category_ids, lambda category_id: scrape_cub_category(location_id, category_id, pager),
+                         CATEGORY_WORKERS)
 
-            if len(data["items"]) < limit:
-                break
+    for product in categories:
+        if product.sku in product_skus:
+            continue
+        product_skus.add(product.sku)
+        yield product
 
-            offset += limit
+    pager.report(location_id)
@@ -0,0 +1,96 @@
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# JSON decoding for scraper responses. orjson is used when installed (pip install prices[speedups]). An extractor
+# cuts a decoded document down to the fields its scraper reads, so only those stay alive while a page is processed.
+# It also limits what has to be sent back from the decode pool.
+#
+# With PRICES_DECODE_PROCESSES > 0, large bodies are decoded in worker processes, so scraper threads parsing at the
+# same time aren't serialized on the GIL. Small documents such as Hy-Vee product details always decode inline,
+# because sending them to a worker costs more than parsing them.
+DECODE_PROCESSES = int(os.getenv("PRICES_DECODE_PROCESSES", "0"))
+POOL_MIN_BYTES = 256 * 1024
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def loads(content: bytes | str):
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+def _decode(content: bytes, extract=None):
+    data = loads(content)
+    return extract(data) if extract is not None else data
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Scraper threads are running, so workers are spawned rather than forked
+            _pool = ProcessPoolExecutor(DECODE_PROCESSES, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def decode(content: bytes, extract=None):
+    # extract has to be a module-level function so it can be sent to a worker process
+    if DECODE_PROCESSES > 0 and len(content) >= POOL_MIN_BYTES:
+        return _get_pool().submit(_decode, content, extract).result()
+    return _decode(content, extract)
+
+
+def response_json(response, extract=None):
+    # Drop-in for response.json()
+    return decode(response.content, extract)
+
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
+
+
+def _pick(item: dict, fields: tuple) -> dict:
+    # Absent keys stay absent, since the scrapers distinguish missing fields from empty ones
+    return {field: item[field] for field in fields if field in item}
+
+
+# Storefront search pages, shared by Cub and Fresh Thyme
+STOREFRONT_FIELDS = ("sku", "name", "brand", "available", "price", "pricePerUnit", "priceNumeric", "unitOfSize",
+                     "attributes", "categories", "defaultCategory")
+
+
+def storefront_page(data: dict) -> dict:
+    items = []
+    for item in data.get("items") or []:
+        item = _pick(item, STOREFRONT_FIELDS)
+        if item.get("attributes"):
+            item["attributes"] = _pick(item["attributes"], ("aurus SNAP Flag",))
+        items.append(item)
+    return {"items": items, "total": data.get("total")}
+
+
+ALDI_FIELDS = ("sku", "name", "price", "sellingSize", "brandName", "countryExtensions", "discontinued", "notForSale",
+               "urlSlugText")
+
+
+def aldi_products(data: dict) -> dict:
+    pagination = (data.get("meta") or {}).get("pagination") or {}
+    return {"items": [_pick(item, ALDI_FIELDS) for item in data["data"]], "total": pagination.get("totalCount")}
+
+
+def aldi_product_detail(data: dict) -> dict:
+    return {"categories": data["data"].get("categories", [])}
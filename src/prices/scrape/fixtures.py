@@ -0,0 +1,153 @@
+import base64
+import glob
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+
+# Fixture archives are gzipped JSON lines, one HTTP exchange per line. Requests are matched on method, URL and a
+# hash of the body, so the same archive can be replayed by any scraper that issues the same calls in any order.
+
+
+def request_key(method: str, url: str, body) -> str:
+    if body is None:
+        body = b""
+    elif isinstance(body, str):
+        body = body.encode("utf-8")
+    return f"{method.upper()} {url} {hashlib.sha1(body).hexdigest()}"
+
+
+class RecordingAdapter(HTTPAdapter):
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = gzip.open(path, "at", encoding="utf-8")
+        self.request_count = 0
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+
+        exchange = {
+            "key": request_key(request.method, request.url, request.body),
+            "method": request.method,
+            "url": request.url,
+            "status": response.status_code,
+            "headers": dict(response.headers),
+            "content": base64.b64encode(response.content).decode("ascii")
+        }
+
+        with self.lock:
+            self.file.write(json.dumps(exchange) + "\n")
+            self.request_count += 1
+
+        return response
+
+    def close(self):
+        super().close()
+        with self.lock:
+            self.file.close()
+
+
+class ReplayAdapter(BaseAdapter):
+    def __init__(self, paths: list[str], latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.exchanges = {}
+        self.positions = {}
+        self.request_count = 0
+        self.bytes_served = 0
+        self.misses = 0
+
+        for path in paths:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    exchange = json.loads(line)
+                    self.exchanges.setdefault(exchange["key"], []).append(exchange)
+
+    def send(self, request, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+
+        key = request_key(request.method, request.url, request.body)
+
+        with self.lock:
+            self.request_count += 1
+            candidates = self.exchanges.get(key)
+
+            if not candidates:
+                self.misses += 1
+                exchange = None
+            else:
+                # Identical requests are served in recorded order, repeating the last one once exhausted
+                position = self.positions.get(key, 0)
+                exchange = candidates[min(position, len(candidates) - 1)]
+                self.positions[key] = position + 1
+
+        response = requests.Response()
+        response.request = request
+        response.url = request.url
+        response.reason = "Replayed"
+
+        if exchange is None:
+            response.status_code = 404
+            response._content = b""
+            return response
+
+        content = base64.b64decode(exchange["content"])
+
+        response.status_code = exchange["status"]
+        response.headers = CaseInsensitiveDict(exchange["headers"])
+        # The recorded body has already been decoded, so drop headers that would make requests decode it again
+        response.headers.pop("Content-Encoding", None)
+        response.headers["Content-Length"] = str(len(content))
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = content
+
+        with self.lock:
+            self.bytes_served += len(content)
+
+        return response
+
+    def close(self):
+        pass
+
+
+@contextmanager
+def _mounted(adapter):
+    # Scrapers call requests.get/post, which build a fresh Session per call, so the adapter is patched in at the
+    # class level rather than mounted on a particular session
+    original = requests.Session.get_adapter
+    requests.Session.get_adapter = lambda session, url: adapter
+    try:
+        yield adapter
+    finally:
+        requests.Session.get_adapter = original
+        adapter.close()
+
+
+def recording(path: str):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    return _mounted(RecordingAdapter(path))
+
+
+def replaying(path: str, latency: float = 0.0):
+    if os.path.isdir(path):
+        paths = sorted(glob.glob(os.path.join(path, "*.jsonl.gz")))
+    else:
+        paths = [path]
+
+    if not paths:
+        raise FileNotFoundError(f"No fixture archives found at {path}")
+
+    return _mounted(ReplayAdapter(paths, latency))
@@ -1,159 +1,171 @@
-import requests
 import re
-from typing import Generator, Any
-from prices.scrape.util import retry, split_price, split_size_and_unit, get_simplified_category, normalize_units
-
-
-def scrape_fresh_thyme_products(store_id: str = "508") -> Generator[dict[str, Any], None, None]:
-    headers = {
-        "accept": "application/json",
-        "user-agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/134.0.0.0 Safari/537.36"
-    }
-
-    # Explicitly defined categories from the provided HTML
-    categories = [
-        ("69298", "Supplements"),
-        ("69288", "OTC Internal"),
-        ("69292", "Baby & Kids"),
-        ("69235", "Vitamins and Minerals"),
-        ("69237", "Multivitamins"),
-        ("69238", "Single Vitamins"),
-        ("69239", "Minerals"),
-        ("69245", "Digestive Health"),
-        ("69246", "Probiotics"),
-        ("69247", "Enzymes"),
-        ("69266", "Digestive Aids"),
-        ("69225", "Wellness"),
-        ("69228", "Superfoods & Greens"),
-        ("69229", "Calcium & Joint Health"),
-        ("69231", "Heart Health"),
-        ("69232", "Antioxidants"),
-        ("69233", "Women's & Men's Health"),
-        ("69234", "Children's Health"),
-        ("69297", "Children's Vitamins"),
-        ("69296", "Children's Supplements"),
-        ("69227", "Nutritional Oils"),
-        ("69286", "Plant Oils"),
-        ("69285", "Fish Oils"),
-        ("69267", "CBD"),
-        ("69240", "Protein and Fitness"),
-        ("69283", "Collagen"),
-        ("69241", "Protein Powders & Shakes"),
-        ("69243", "Amino Acids"),
-        ("69244", "Weight Loss & Diet"),
-        ("69242", "Sports Nutrition"),
-        ("69248", "Herbs & Natural Remedies"),
-        ("69249", "Mood & Sleep"),
-        ("69250", "Seasonal Wellness & Immune"),
-        ("69251", "Homeopathy"),
-        ("69230", "Herbs"),
-        ("69252", "Cleanse & Detox"),
-        ("12994", "Bakery"),
-        ("68949", "Tortillas & Flat Bread"),
-        ("68950", "Breakfast Bakery"),
-        ("68951", "Bread"),
-        ("68952", "Bakery Desserts"),
-        ("68953", "Buns & Rolls"),
-        ("13003", "Frozen"),
-        ("69014", "Frozen Pizza & Meals"),
-        ("69006", "Vegan & Vegetarian"),
-        ("69008", "Breads & Doughs"),
-        ("69009", "Appetizers & Sides"),
-        ("69010", "Breakfast"),
-        ("69011", "Produce"),
-        ("69013", "Dessert, Ice Cream & Ice"),
-        ("69016", "Meat & Seafood"),
-        ("13004", "Produce"),
-        ("69019", "Fresh Herbs"),
-        ("69020", "Fresh Vegetables"),
-        ("69021", "Packaged Vegetables & Fruits"),
-        ("69022", "Fresh Fruits"),
-        ("69047", "Floral"),
-        ("69137", "Fresh Juice"),
-        ("13007", "Meat & Seafood"),
-        ("69025", "Packaged Poultry"),
-        ("69026", "Seafood"),
-        ("69027", "All Natural Meat"),
-        ("69028", "All Natural Poultry"),
-        ("69029", "Packaged Seafood"),
-        ("69030", "Hot Dogs, Bacon & Sausage"),
-        ("69031", "Packaged Meat"),
-        ("69136", "All Natural Pork")
-    ]
-
+from typing import Generator
+from prices.lib.product import ScrapedProduct
+from prices.scrape import pagination
+from prices.scrape.decode import response_json, storefront_page
+from prices.scrape.util import fan_out, plan_categories, retry, http_get, split_price, split_size_and_unit, get_simplified_category, normalize_units
+
+
+PAGE_SIZE = 48
+MAX_PAGE_SIZE = 192
+# Categories fetched at once for a location
+CATEGORY_WORKERS = 4
+
+HEADERS = {
+    "accept": "application/json",
+    "user-agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/134.0.0.0 Safari/537.36"
+}
+
+# Categories from the site's navigation. Departments list every product in their subcategories, so only they are
+# fetched; plan_categories skips subcategories they cover.
+CATEGORIES = [
+    {"id": "69298", "name": "Supplements"},
+    {"id": "69288", "name": "OTC Internal"},
+    {"id": "69292", "name": "Baby & Kids"},
+    {"id": "69235", "name": "Vitamins and Minerals"},
+    {"id": "69237", "name": "Multivitamins"},
+    {"id": "69238", "name": "Single Vitamins"},
+    {"id": "69239", "name": "Minerals"},
+    {"id": "69245", "name": "Digestive Health"},
+    {"id": "69246", "name": "Probiotics"},
+    {"id": "69247", "name": "Enzymes"},
+    {"id": "69266", "name": "Digestive Aids"},
+    {"id": "69225", "name": "Wellness"},
+    {"id": "69228", "name": "Superfoods & Greens"},
+    {"id": "69229", "name": "Calcium & Joint Health"},
+    {"id": "69231", "name": "Heart Health"},
+    {"id": "69232", "name": "Antioxidants"},
+    {"id": "69233", "name": "Women's & Men's Health"},
+    {"id": "69234", "name": "Children's Health"},
+    {"id": "69297", "name": "Children's Vitamins"},
+    {"id": "69296", "name": "Children's Supplements"},
+    {"id": "69227", "name": "Nutritional Oils"},
+    {"id": "69286", "name": "Plant Oils"},
+    {"id": "69285", "name": "Fish Oils"},
+    {"id": "69267", "name": "CBD"},
+    {"id": "69240", "name": "Protein and Fitness"},
+    {"id": "69283", "name": "Collagen"},
+    {"id": "69241", "name": "Protein Powders & Shakes"},
+    {"id": "69243", "name": "Amino Acids"},
+    {"id": "69244", "name": "Weight Loss & Diet"},
+    {"id": "69242", "name": "Sports Nutrition"},
+    {"id": "69248", "name": "Herbs & Natural Remedies"},
+    {"id": "69249", "name": "Mood & Sleep"},
+    {"id": "69250", "name": "Seasonal Wellness & Immune"},
+    {"id": "69251", "name": "Homeopathy"},
+    {"id": "69230", "name": "Herbs"},
+    {"id": "69252", "name": "Cleanse & Detox"},
+    {"id": "12994", "name": "Bakery", "children": [
+        {"id": "68949", "name": "Tortillas & Flat Bread"},
+        {"id": "68950", "name": "Breakfast Bakery"},
+        {"id": "68951", "name": "Bread"},
+        {"id": "68952", "name": "Bakery Desserts"},
+        {"id": "68953", "name": "Buns & Rolls"}
+    ]},
+    {"id": "13003", "name": "Frozen", "children": [
+        {"id": "69014", "name": "Frozen Pizza & Meals"},
+        {"id": "69006", "name": "Vegan & Vegetarian"},
+        {"id": "69008", "name": "Breads & Doughs"},
+        {"id": "69009", "name": "Appetizers & Sides"},
+        {"id": "69010", "name": "Breakfast"},
+        {"id": "69011", "name": "Produce"},
+        {"id": "69013", "name": "Dessert, Ice Cream & Ice"},
+        {"id": "69016", "name": "Meat & Seafood"}
+    ]},
+    {"id": "13004", "name": "Produce", "children": [
+        {"id": "69019", "name": "Fresh Herbs"},
+        {"id": "69020", "name": "Fresh Vegetables"},
+        {"id": "69021", "name": "Packaged Vegetables & Fruits"},
+        {"id": "69022", "name": "Fresh Fruits"},
+        {"id": "69047", "name": "Floral"},
+        {"id": "69137", "name": "Fresh Juice"}
+    ]},
+    {"id": "13007", "name": "Meat & Seafood", "children": [
+        {"id": "69025", "name": "Packaged Poultry"},
+        {"id": "69026", "name": "Seafood"},
+        {"id": "69027", "name": "All Natural Meat"},
+        {"id": "69028", "name": "All Natural Poultry"},
+        {"id": "69029", "name": "Packaged Seafood"},
+        {"id": "69030", "name": "Hot Dogs, Bacon & Sausage"},
+        {"id": "69031", "name": "Packaged Meat"},
+        {"id": "69136", "name": "All Natural Pork"}
+    ]}
+]
+
+
+def scrape_fresh_thyme_category(store_id: str, category_id: str, category_name: str,
+                                pager: pagination.PageSizeController) -> Generator[ScrapedProduct, None, None]:
+    skip = 0
+
+    while True:
+        page_size = pager.size
+        url = f"https://storefrontgateway.freshthyme.com/api/stores/{store_id}/categories/{category_id}/search?take={page_size}&skip={skip}&page={skip // page_size + 1}"
+
+        with retry():
+            response = http_get(url, headers=HEADERS)
+
+        if response.status_code != 200:
+            if pager.failed(category_id, page_size):
+                continue
+            break
+
+        data = response_json(response, storefront_page)
+
+        products = data.get('items', [])
+        skip += len(products)
+        exhausted = pager.page(category_id, page_size, len(products), skip, data.get('total'))
+
+        for product in products:
+            sku = product.get('sku')
+
+            if not sku:
+                continue
+
+            name = product.get('name', '').strip()
+
+            price = None
+            if product.get('priceNumeric') is not None:
+                price = float(product.get('priceNumeric'))
+
+            size = None
+            unit = None
+            if 'unitOfSize' in product:
+                unit_of_size = product['unitOfSize']
+                size = unit_of_size.get('size')
+                unit = normalize_units(unit_of_size.get('abbreviation', ''))
+
+            if not unit:
+                unit = 'ea'
+
+            brand = product.get('brand', '')
+            available = product.get('available', False)
+            snap_eligible = False
+
+            if product.get('defaultCategory') and len(product['defaultCategory']) > 0:
+                raw_category = product['defaultCategory'][0].get('category', category_name)
+                category = get_simplified_category(raw_category)
+            else:
+                category = get_simplified_category(category_name)
+
+            yield ScrapedProduct.create(sku, name, price, size, brand, unit, snap_eligible, available, category)
+
+        if exhausted:
+            break
+
+
+def scrape_fresh_thyme_products(store_id: str = "508") -> Generator[ScrapedProduct, None, None]:
+    pager = pagination.controller("Fresh Thyme", PAGE_SIZE, MAX_PAGE_SIZE)
     processed_skus = set()
 
-    for category_id, category_name in categories:
-        page = 1
-        page_size = 48
-        skip = 0
-
-        while True:
-            url = f"https://storefrontgateway.freshthyme.com/api/stores/{store_id}/categories/{category_id}/search?take={page_size}&skip={skip}&page={page}"
-
-            with retry():
-                response = requests.get(url, headers=headers)
-
-            if response.status_code != 200:
-                break
-
-            data = response.json()
-
-            if not data.get('items'):
-                break
-
-            products = data.get('items', [])
-
-            for product in products:
-                sku = product.get('sku')
-
-                if not sku or sku in processed_skus:
-                    continue
-
-                processed_skus.add(sku)
-
-                name = product.get('name', '').strip()
-
-                price = None
-                if product.get('priceNumeric') is not None:
-                    price = float(product.get('priceNumeric'))
-
-                size = None
-                unit = None
-                if 'unitOfSize' in product:
-                    unit_of_size = product['unitOfSize']
-                    size = unit_of_size.get('size')
-                    unit = normalize_units(unit_of_size.get('abbreviation', ''))
-
-                if not unit:
-                    unit = 'ea'
-
-                brand = product.get('brand', '')
-                available = product.get('available', False)
-                snap_eligible = False
-
-                if product.get('defaultCategory') and len(product['defaultCategory']) > 0:
-                    raw_category = product['defaultCategory'][0].get('category', category_name)
-                    category = get_simplified_category(raw_category)
-                else:
-                    category = get_simplified_category(category_name)
-
-                product_info = {
-                    'sku': sku,
-                    'name': name,
-                    'price': price,
-                    'size': size,
-                    'brand': brand,
-                    'unit': unit,
-                    'snap_eligible': snap_eligible,
-                    'available': available,
-                    'category': category
-                }
-
-                yield product_info
+    # Categories are fetched concurrently but yielded in order, so the first category listing a SKU keeps it
+    products = fan_out(plan_categories(CATEGORIES),
+                       lambda category: scrape_fresh_thyme_category(store_id, category["id"], category["name"], pager),
+                       CATEGORY_WORKERS)
 
-            if len(products) < page_size or data.get('total', 0) <= skip + len(products):
-                break
+    for product in products:
+        if product.sku in processed_skus:
+            continue
+        processed_skus.add(product.sku)
+        yield product
 
-            page += 1
-            skip += page_size
\ No newline at end of file
+    pager.report(store_id)
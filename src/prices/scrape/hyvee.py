@@ -1,6 +1,15 @@
-import requests
+import logging
 
-from prices.scrape.util import retry, split_size_and_unit, get_simplified_category
+from prices.lib.log import get_logger
+from prices.lib.product import ScrapedProduct
+from prices.scrape.decode import response_json
+from prices.scrape.util import fan_out, retry, http_post, split_size_and_unit, get_simplified_category
+
+logger = get_logger(__name__)
+
+# Category listings and product details fetched at once for a location
+CATEGORY_WORKERS = 4
+DETAIL_WORKERS = 4
 
 
 def get_category_groups(store_id, category_id, aisle_id):
@@ -53,9 +62,9 @@ def get_category_groups(store_id, category_id, aisle_id):
     }
 
     with retry():
-        response = requests.post(url, headers=headers, json=data)
+        response = http_post(url, headers=headers, json=data)
 
-    return response.json()
+    return response_json(response)
 
 # {
 #   // Root data object
@@ -355,11 +364,11 @@ def get_hyvee_product(product_id, store_id):
     }
 
     with retry():
-        response = requests.post(url, headers=headers, json=data)
-    return response.json()
+        response = http_post(url, headers=headers, json=data)
+    return response_json(response)
 
 
-def get_all_products(store_id, category_id, aisle_id):
+def get_category_product_ids(store_id, category_id, aisle_id):
     categories = get_category_groups(store_id, category_id, aisle_id)
 
     if not categories or 'data' not in categories:
@@ -369,66 +378,55 @@ def get_all_products(store_id, category_id, aisle_id):
     # Process each category group
     category_groups = categories['data']['categoriesGroups']['categoriesGroups']
     for group in category_groups:
-        group_name = group['categoriesGroupName']
-        # results[group_name] = []
-
-        # Process direct products in this group
+        # Direct products in this group
         for product in group['categoriesGroupProducts']:
-            product_id = int(product['productId'])
-            product_details = get_hyvee_product(product_id, store_id)
-
-            if product_details and 'data' in product_details:
-                # Extract data from product_details
-                product_data = product_details['data']['product']
-                item_data = product_data.get('item', {})
-
-                # Get store product info (for price and availability)
-                store_products = product_details['data'].get('storeProducts', {}).get('storeProducts', [])
-                store_product = store_products[0] if store_products else {}
-
-                # Use department name as category
-                category = ""
-                if store_product and 'department' in store_product:
-                    category = store_product['department'].get('name', '')
-                    category = get_simplified_category(category)
-
-                # Extract details
-                sku = str(product_id)
-                name = item_data.get('description', '')
-                price = store_product.get('price', 0)
-                size = product_data.get('size', '')
-                size, unit = split_size_and_unit(size)
-
-                # Brand extraction (often part of the product name)
-                brand = ""
-                # if ' ' in name:
-                #     brand = name.split(' ')[0]  # Simple extraction - first word as brand
-
-                # Unit of measure (from retail items if available)
-                # unit = ""
-                # if 'retailItems' in item_data and item_data['retailItems']:
-                #     if 'soldByUnitOfMeasure' in item_data['retailItems'][0]:
-                #         unit = item_data['retailItems'][0]['soldByUnitOfMeasure'].get('name', '')
-
-                # SNAP eligibility (approximation - would need specific API data)
-                snap_eligible = False  # Default value
-
-                # Availability based on ecommerceStatus
-                available = item_data.get('ecommerceStatus', '') == 'ACTIVE'
-
-                product = {
-                    'sku': sku,
-                    'category': category,
-                    'name': name,
-                    'price': price,
-                    'size': size,
-                    'brand': brand,
-                    'unit': unit,
-                    'snap_eligible': snap_eligible,
-                    'available': available
-                }
-
-                yield product
+            yield int(product['productId'])
+
+
+def get_product(product_id, store_id):
+    product_details = get_hyvee_product(product_id, store_id)
+
+    if product_details and 'data' in product_details:
+        # Extract data from product_details
+        product_data = product_details['data']['product']
+        item_data = product_data.get('item', {})
+
+        # Get store product info (for price and availability)
+        store_products = product_details['data'].get('storeProducts', {}).get('storeProducts', [])
+        store_product = store_products[0] if store_products else {}
+
+        # Use department name as category
+        category = ""
+        if store_product and 'department' in store_product:
+            category = store_product['department'].get('name', '')
+            category = get_simplified_category(category)
+
+        # Extract details
+        sku = str(product_id)
+        name = item_data.get('description', '')
+        price = store_product.get('price', 0)
+        size = product_data.get('size', '')
+        size, unit = split_size_and_unit(size)
+
+        # Brand extraction (often part of the product name)
+        brand = ""
+        # if ' ' in name:
+        #     brand = name.split(' ')[0]  # Simple extraction - first word as brand
+
+        # Unit of measure (from retail items if available)
+        # unit = ""
+        # if 'retailItems' in item_data and item_data['retailItems']:
+        #     if 'soldByUnitOfMeasure' in item_data['retailItems'][0]:
+        #         unit = item_data['retailItems'][0]['soldByUnitOfMeasure'].get('name', '')
+
+        # SNAP eligibility (approximation - would need specific API data)
+        snap_eligible = False  # Default value
+
+        # Availability based on ecommerceStatus
+        available = item_data.get('ecommerceStatus', '') == 'ACTIVE'
+
+        yield ScrapedProduct.create(sku, name, price, size, brand, unit, snap_eligible, available, category)
+
 
 def scrape_hyvee_products(location_id: str):
     categories = [
@@ -450,14 +448,23 @@ def scrape_hyvee_products(location_id: str):
     # WTF is this?
     aisle_id = "b162d1a2fd29451c9ccb791be0cc2edd"
 
-    seen_products = {}
-
-    for category_id in categories:
-        for product in get_all_products(location_id, category_id, aisle_id):
-            if product["sku"] in seen_products.keys():
-                print("DUPLICATE")
-                print(product)
-                print(seen_products[product["sku"]])
-                continue
-            seen_products[product["sku"]] = product
-            yield product
+    # Products are listed in several groups and categories, so every category's product IDs are collected first and
+    # each product's details are then fetched once
+    seen_ids = set()
+    product_ids = []
+    listed = 0
+
+    listings = fan_out(categories, lambda category_id: get_category_product_ids(location_id, category_id, aisle_id),
+                       CATEGORY_WORKERS)
+
+    for product_id in listings:
+        listed += 1
+        if product_id in seen_ids:
+            logger.sampled(logging.DEBUG, "duplicate product", store_id=location_id, sku=product_id)
+            continue
+        seen_ids.add(product_id)
+        product_ids.append(product_id)
+
+    logger.info("planned product fetches", store_id=location_id, listed=listed, unique=len(product_ids))
+
+    yield from fan_out(product_ids, lambda product_id: get_product(product_id, location_id), DETAIL_WORKERS)
@@ -1,40 +1,33 @@
 import queue
 import threading
+import time
+from datetime import datetime
 
+from prices.lib import archive
 from prices.lib.database import Database
+from prices.lib.log import configure_logging, get_logger
+from prices.scrape import decode
 from prices.scrape.aldi import scrape_aldi_products
 from prices.scrape.cub import scrape_cub_products
 from prices.scrape.fresh_thyme import scrape_fresh_thyme_products
 from prices.scrape.hyvee import scrape_hyvee_products
-from prices.scrape.notifications import send_message
+from prices.scrape.notifications import send_message, flush_messages
+from prices.scrape.telemetry import JobMetrics, format_report
 from prices.scrape.trader_joes import scrape_trader_joes_products
 
+logger = get_logger(__name__)
 
-def calculate_stats():
-    with Database("prices.db") as db:
-        db.connect()
-
-        # Count unique stores
-        db.cursor.execute("SELECT COUNT(DISTINCT store) FROM locations")
-        total_stores = str(db.cursor.fetchone()[0])
-
-        # Count unique locations
-        db.cursor.execute("SELECT COUNT(*) FROM locations")
-        total_locations = str(db.cursor.fetchone()[0])
-
-        # Count total products
-        db.cursor.execute("SELECT COUNT(*) FROM products")
-        total_products = str(db.cursor.fetchone()[0])
+# Products per queued batch, and so per database transaction, in run_multi_threaded
+DB_BATCH_SIZE = 500
 
-        # Count total prices
-        db.cursor.execute("SELECT COUNT(*) FROM prices")
-        total_prices = str(db.cursor.fetchone()[0])
-
-        # Save stats
-        db.create_or_update_stat("total_stores", total_stores)
-        db.create_or_update_stat("total_locations", total_locations)
-        db.create_or_update_stat("total_products", total_products)
-        db.create_or_update_stat("total_prices", total_prices)
+# The stores run_multi_threaded scrapes, each on its own thread
+SCRAPERS = {
+    "Fresh Thyme": scrape_fresh_thyme_products,
+    "Trader Joe's": scrape_trader_joes_products,
+    # "ALDI": scrape_aldi_products,
+    # "Hy-Vee": scrape_hyvee_products,
+    # "Cub": scrape_cub_products,
+}
 
 
 def run_single_threaded():
@@ -51,140 +44,149 @@ def run_single_threaded():
             send_message(f"Scraping Fresh Thyme for {location['name']}")
             for product in scrape_fresh_thyme_products(location["code"]):
                 db.save(location["id"], product)
+            db.finish_location(location["id"])
             send_message(f"Finished scraping Fresh Thyme for {location['name']}")
 
+        db.record_store_run("Fresh Thyme")
+
         for location in trader_joes_locations:
             send_message(f"Scraping Trader Joe's for {location['name']}")
             for product in scrape_trader_joes_products(location["code"]):
                 db.save(location["id"], product)
+            db.finish_location(location["id"])
             send_message(f"Finished scraping Trader Joe's for {location['name']}")
 
+        db.record_store_run("Trader Joe's")
+
         for location in aldi_locations:
             send_message(f"Scraping ALDI for {location['name']}")
             for product in scrape_aldi_products(location["code"]):
                 db.save(location["id"], product)
+            db.finish_location(location["id"])
             send_message(f"Finished scraping ALDI for {location['name']}")
 
+        db.record_store_run("ALDI")
+
         for location in hyvee_locations:
             send_message(f"Scraping Hy-Vee for {location['name']}")
             for product in scrape_hyvee_products(location["code"]):
                 db.save(location["id"], product)
+            db.finish_location(location["id"])
             send_message(f"Finished scraping Hy-Vee for {location['name']}")
 
+        db.record_store_run("Hy-Vee")
+
         for location in cub_locations:
             send_message(f"Scraping Cub for {location['name']}")
             for product in scrape_cub_products(location["code"]):
                 db.save(location["id"], product)
+            db.finish_location(location["id"])
             send_message(f"Finished scraping Cub for {location['name']}")
 
-    calculate_stats()
+        db.record_store_run("Cub")
+
+    db.update_product_lifecycle()
     db.update_bargains()
+    db.refresh_comparison_summaries()
+
+    if archive.HORIZON_DAYS > 0:
+        archive.archive_prices(db)
+
+    # Let the web tier know its cached responses are stale
+    db.bump_data_version()
+
+    changes = db.summarize_price_events(datetime.now().strftime("%Y-%m-%d"))
+    if changes:
+        send_message("Price changes: " + ", ".join(f"{count} {event}" for event, count in changes.items()))
 
     send_message("END")
+    flush_messages()
 
 
-def run_multi_threaded():
+def run_multi_threaded(database_path: str = "prices.db"):
     # ====================================================================
     # Create a queue for database operations
     db_queue = queue.Queue()
     # Flag to signal when scraping is complete
     scraping_done = threading.Event()
 
+    # Metrics for each (store, location) job, keyed by location id
+    run_id = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    jobs = {}
+
     # Get all scraper information in the main thread
-    with Database("prices.db") as db:
-        fresh_thyme_locations = db.get_locations("Fresh Thyme")
-        trader_joes_locations = db.get_locations("Trader Joe's")
-        aldi_locations = db.get_locations("ALDI")
-        hyvee_locations = db.get_locations("Hy-Vee")
-        cub_locations = db.get_locations("Cub")
+    with Database(database_path, profile="ingest") as db:
+        locations = {store: db.get_locations(store) for store in ["Fresh Thyme", "Trader Joe's", "ALDI", "Hy-Vee", "Cub"]}
 
     # Database worker thread - handles all DB operations
+    def save_batch(db, location_id, products):
+        start = time.perf_counter()
+        try:
+            db.save_batch(location_id, products)
+        except Exception:
+            # Fall back to saving one at a time so a single bad product doesn't lose the rest of the batch
+            for product in products:
+                try:
+                    db.save(location_id, product)
+                except Exception:
+                    logger.exception("error in database worker", location_id=location_id, sku=product.sku)
+        jobs[location_id].add(db_rows=len(products), db_time=time.perf_counter() - start)
+
     def db_worker():
-        with Database("prices.db") as db:
+        with Database(database_path, profile="ingest") as db:
             while not (scraping_done.is_set() and db_queue.empty()):
                 try:
-                    # Get a database operation with timeout
-                    location_id, product = db_queue.get(timeout=0.5)
-                    db.save(location_id, product)
-                    db_queue.task_done()
+                    location_id, products = db_queue.get(timeout=0.5)
                 except queue.Empty:
-                    # Just continue and check conditions again
                     continue
-                except Exception as e:
-                    print(f"Error in database worker: {e}")
-                    db_queue.task_done()
 
+                # A None batch marks the end of a location's scrape; it's queued after all of its products
+                if products is None:
+                    try:
+                        db.finish_location(location_id)
+                    except Exception:
+                        logger.exception("error finishing location", location_id=location_id)
+                else:
+                    save_batch(db, location_id, products)
+
+                db_queue.task_done()
 
     # Start the database worker thread
     db_thread = threading.Thread(target=db_worker)
     db_thread.daemon = False
     db_thread.start()
 
-    def run_fresh_thyme_scraper():
-        for location in fresh_thyme_locations:
-            try:
-                send_message(f"Scraping Fresh Thyme for {location['name']}")
-                products = scrape_fresh_thyme_products(location["code"])
-                for product in products:
-                    db_queue.put((location["id"], product))
-                send_message(f"Fresh Thyme scraping for location {location['code']} completed")
-            except Exception as e:
-                send_message(f"Error in Fresh Thyme scraper for location {location['code']}")
-
-    def run_trader_joes_scraper():
-        for location in trader_joes_locations:
-            try:
-                send_message(f"Scraping Trader Joe's for {location['name']}")
-                products = scrape_trader_joes_products(location["code"])
-                for product in products:
-                    db_queue.put((location["id"], product))
-                send_message(f"Trader Joe's scraping for location {location['code']} completed")
-            except Exception as e:
-                send_message(f"Error in Trader Joe's scraper for location {location['code']}")
-
-    def run_aldi_scraper():
-        for location in aldi_locations:
-            try:
-                send_message(f"Scraping ALDI for {location['name']}")
-                products = scrape_aldi_products(location["code"])
-                for product in products:
-                    db_queue.put((location["id"], product))
-                send_message(f"ALDI scraping for location {location['code']} completed")
-            except Exception as e:
-                send_message(f"Error in ALDI scraper for location {location['code']}")
-
-    def run_hyvee_scraper():
-        for location in hyvee_locations:
-            try:
-                send_message(f"Scraping Hy-Vee for {location['name']}")
-                products = scrape_hyvee_products(location["code"])
-                for product in products:
-                    db_queue.put((location["id"], product))
-                send_message(f"Hy-Vee scraping for location {location['code']} completed")
-            except Exception as e:
-                send_message(f"Error in Hy-Vee scraper for location {location['code']}")
-
-    def run_cub_scraper():
-        for location in cub_locations:
+    def run_scraper(store, scrape):
+        for location in locations[store]:
+            job = JobMetrics(run_id, store, location["id"], location["name"])
+            jobs[location["id"]] = job
             try:
-                send_message(f"Scraping Cub for {location['name']}")
-                products = scrape_cub_products(location["code"])
-                for product in products:
-                    db_queue.put((location["id"], product))
-                send_message(f"Cub scraping for location {location['code']} completed")
+                send_message(f"Scraping {store} for {location['name']}")
+                with job.track():
+                    # Products are queued in batches rather than one tuple each, so the queue holds a few lists
+                    # instead of a tuple per product when the database falls behind
+                    batch = []
+                    try:
+                        for product in job.products(scrape(location["code"])):
+                            batch.append(product)
+                            if len(batch) >= DB_BATCH_SIZE:
+                                db_queue.put((location["id"], batch))
+                                batch = []
+                    finally:
+                        # Whatever was scraped before an error is still saved
+                        if batch:
+                            db_queue.put((location["id"], batch))
+                # Only a complete scrape can tell which products have disappeared
+                db_queue.put((location["id"], None))
+                send_message(f"{store} scraping for location {location['code']} completed")
             except Exception as e:
-                send_message(f"Error in Cub scraper for location {location['code']}")
+                job.error = str(e)
+                send_message(f"Error in {store} scraper for location {location['code']}")
 
     send_message("START")
 
     # Run all scrapers in separate threads
-    scraper_threads = [
-        threading.Thread(target=run_fresh_thyme_scraper),
-        threading.Thread(target=run_trader_joes_scraper),
-        # threading.Thread(target=run_aldi_scraper),
-        # threading.Thread(target=run_hyvee_scraper),
-        # threading.Thread(target=run_cub_scraper)
-    ]
+    scraper_threads = [threading.Thread(target=run_scraper, args=(store, scrape)) for store, scrape in SCRAPERS.items()]
 
     # Start all scraper threads
     for thread in scraper_threads:
@@ -194,6 +196,8 @@ def run_multi_threaded():
     for thread in scraper_threads:
         thread.join()
 
+    decode.shutdown()
+
     # Signal database worker that scraping is done
     send_message("Waiting for database operations to finish...")
     scraping_done.set()
@@ -204,13 +208,40 @@ def run_multi_threaded():
     # Wait for database thread to finish
     db_thread.join()
 
-    # Calculate stats and update bargains
-    calculate_stats()
+    # Persist and report the run's metrics
+    with Database(database_path) as db:
+        db.save_scrape_metrics([job.as_dict() for job in jobs.values()])
+
+        # Only stores where every location was scraped without errors count as a run for discontinuing products
+        for store in locations:
+            store_jobs = [job for job in jobs.values() if job.store == store]
+            if store_jobs and not any(job.error for job in store_jobs):
+                db.record_store_run(store)
+
+    report = format_report(list(jobs.values()))
+    logger.info("scrape run finished\n" + report, run_id=run_id)
+    send_message(report)
+
+    # Stats are kept current by the database as products are saved, so only the bargains need updating
+    db.update_product_lifecycle()
     db.update_bargains()
+    db.refresh_comparison_summaries()
+
+    if archive.HORIZON_DAYS > 0:
+        archive.archive_prices(db)
+
+    # Let the web tier know its cached responses are stale
+    db.bump_data_version()
+
+    changes = db.summarize_price_events(datetime.now().strftime("%Y-%m-%d"))
+    if changes:
+        send_message("Price changes: " + ", ".join(f"{count} {event}" for event, count in changes.items()))
 
     send_message("END")
+    flush_messages()
 
 
 if __name__ == "__main__":
+    configure_logging()
     run_multi_threaded()
     # run_single_threaded()
@@ -1,8 +1,13 @@
 import asyncio
+import atexit
 import os
 import re
+import threading
 
 from telegram import Bot
+from telegram.error import BadRequest, TelegramError
+
+from prices.lib.log import get_logger
 
 
 # NOTE: You need to initiate a conversation with the bot before it can send you messages
@@ -12,8 +17,200 @@ BOT_TOKEN = os.getenv("BOT_TOKEN")
 # Send a message to @userinfobot to obtain this
 USER_ID = os.getenv("USER_ID")
 
+logger = get_logger(__name__)
+
+# Telegram rejects messages longer than this
+MAX_MESSAGE_LENGTH = 4096
+
+
+def escape(msg: str) -> str:
+    return re.sub(r"([_*[\]()~`>#\+\-=|{}.!\\])", r"\\\1", msg)
+
+
+def escape_truncated(msg: str, limit: int) -> str:
+    # Escapes at most limit characters of output without cutting an escape sequence in half, which would leave a
+    # lone backslash that Telegram rejects. Every escape starts a pair, so an odd run of trailing backslashes ends
+    # with half of one.
+    line = escape(msg[:limit])[:limit]
+    if (len(line) - len(line.rstrip("\\"))) % 2:
+        line = line[:-1]
+    return line
+
+
+class NotificationService:
+    def __init__(self, token: str | None, chat_id: str | None, window: float = 5.0, max_pending: int = 1000,
+                 max_retry_delay: float = 300.0):
+        self.token = token
+        self.chat_id = chat_id
+        self.window = window
+        self.max_pending = max_pending
+        self.max_retry_delay = max_retry_delay
+
+        self.lock = threading.Lock()
+        self.loop = None
+        self.thread = None
+        self.bot = None
+        self.pending = []
+        self.flush_handle = None
+        self.retry_delay = window
+        self.dropped = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.token and self.chat_id)
+
+    def start(self):
+        with self.lock:
+            if self.thread is not None:
+                return
+
+            self.loop = asyncio.new_event_loop()
+            self.thread = threading.Thread(target=self.loop.run_forever, name="notifications", daemon=True)
+            self.thread.start()
+
+    def send(self, msg: str):
+        # Never blocks the caller: the message is handed to the notification loop and coalesced with anything
+        # else sent within the same window
+        if not self.enabled:
+            return
+
+        self.start()
+        with self.lock:
+            loop = self.loop
+
+        # close() may have run since start(), and may have closed the loop too
+        if loop is None:
+            return
+        try:
+            loop.call_soon_threadsafe(self._enqueue, msg)
+        except RuntimeError:
+            pass
+
+    def close(self, timeout: float = 10.0):
+        with self.lock:
+            if self.thread is None:
+                return
+            loop, thread = self.loop, self.thread
+            self.loop = None
+            self.thread = None
+
+        future = asyncio.run_coroutine_threadsafe(self._shutdown(), loop)
+        try:
+            future.result(timeout)
+        except Exception as e:
+            logger.warning("error flushing notifications", error=e)
+
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout)
+        loop.close()
+
+    def _enqueue(self, msg: str):
+        self.pending.append(msg)
+
+        # Bound memory while offline by dropping the oldest messages
+        if len(self.pending) > self.max_pending:
+            overflow = len(self.pending) - self.max_pending
+            del self.pending[:overflow]
+            self.dropped += overflow
+
+        if self.flush_handle is None:
+            self._schedule_flush(self.window)
+
+    def _schedule_flush(self, delay: float):
+        self.flush_handle = asyncio.get_running_loop().call_later(delay, lambda: asyncio.ensure_future(self._flush()))
+
+    def _digests(self, messages: list[str]) -> list[tuple[str, int]]:
+        # Split the digest so each escaped chunk fits in one Telegram message, leaving room for the code fence
+        limit = MAX_MESSAGE_LENGTH - 10
+        chunks = []
+        lines = []
+        length = 0
+        for msg in messages:
+            line = escape_truncated(msg, limit)
+            if lines and length + len(line) + 1 > limit:
+                chunks.append(("\n".join(lines), len(lines)))
+                lines = []
+                length = 0
+            lines.append(line)
+            length += len(line) + 1
+        if lines:
+            chunks.append(("\n".join(lines), len(lines)))
+
+        return chunks
+
+    async def _flush(self):
+        self.flush_handle = None
+
+        if not self.pending:
+            return
+
+        messages = self.pending
+        self.pending = []
+
+        if self.dropped:
+            messages.insert(0, f"({self.dropped} notifications dropped while offline)")
+            self.dropped = 0
+
+        try:
+            if self.bot is None:
+                bot = Bot(token=self.token)
+                await bot.initialize()
+                self.bot = bot
+
+            for text, count in self._digests(messages):
+                try:
+                    await self.bot.send_message(chat_id=self.chat_id, text=f"```\n{text}\n```",
+                                                parse_mode="MarkdownV2")
+                except BadRequest as e:
+                    # Telegram will never accept this digest, so retrying it would hold up everything after it
+                    logger.error("notification rejected", error=e, messages=count)
+                # Only count messages as done once Telegram has accepted or rejected them
+                messages = messages[count:]
+
+            self.retry_delay = self.window
+        except (TelegramError, OSError) as e:
+            # Offline or rate limited: keep what wasn't delivered and try again later with backoff
+            logger.warning("error sending notification", error=e, pending=len(messages))
+            self.pending = messages + self.pending
+            if len(self.pending) > self.max_pending:
+                overflow = len(self.pending) - self.max_pending
+                del self.pending[:overflow]
+                self.dropped += overflow
+            self.retry_delay = min(self.retry_delay * 2, self.max_retry_delay)
+            if self.flush_handle is None:
+                self._schedule_flush(self.retry_delay)
+            return
+
+        if self.pending and self.flush_handle is None:
+            self._schedule_flush(self.window)
+
+    async def _shutdown(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+
+        # One last attempt; anything still undeliverable is dropped
+        await self._flush()
+
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+
+        if self.bot is not None:
+            try:
+                await self.bot.shutdown()
+            except (TelegramError, OSError):
+                pass
+            self.bot = None
+
+
+notifier = NotificationService(BOT_TOKEN, USER_ID)
+atexit.register(notifier.close)
+
 
 def send_message(msg: str):
-    bot = Bot(token=BOT_TOKEN)
-    msg = re.sub(r"([_*[\]()~`>#\+\-=|{}.!])", r"\\\1", msg)
-    asyncio.run(bot.send_message(chat_id=USER_ID, text=f"```\n{msg}\n```", parse_mode="MarkdownV2"))
+    notifier.send(msg)
+
+
+def flush_messages():
+    notifier.close()
@@ -0,0 +1,103 @@
+import os
+import threading
+import time
+
+from prices.lib.log import get_logger
+from prices.scrape.util import read_cache, update_cache
+
+# Page sizes for the paginated store APIs are learned rather than hardcoded. A controller starts from the last size
+# that worked for its store and doubles it after each full page, up to the store's maximum. It settles on the largest
+# size the API actually honours:
+#   - a short page while the response's total says more items remain means the server capped the page, so the
+#     returned count becomes the store's limit
+#   - an error response at a probed size halves it and the caller retries the same offset
+# Sizes are only probed on responses that carry a total, since without one a capped page is indistinguishable from
+# the last page. Learned sizes are kept in $PRICES_CACHE_DIR/page_sizes.json between runs. An error can be transient
+# (a 429 or 503 says nothing about the page size), so a learned limit expires after $PRICES_PAGE_LIMIT_TTL seconds and
+# the size is probed upwards again.
+CACHE_FILE = "page_sizes.json"
+LIMIT_TTL = int(os.getenv("PRICES_PAGE_LIMIT_TTL", str(7 * 24 * 3600)))
+
+logger = get_logger(__name__)
+
+_controllers = {}
+_controllers_lock = threading.Lock()
+
+
+class PageSizeController:
+    def __init__(self, store: str, default: int, maximum: int):
+        self.store = store
+        self.default = default
+        self.maximum = maximum
+        self.lock = threading.Lock()
+
+        learned = read_cache(CACHE_FILE, {}).get(store, {})
+
+        # The largest size the API is known to accept, if it's been found to be below the maximum
+        self.limit = learned.get("limit")
+        self.limit_at = learned.get("limit_at")
+        if self.limit is not None and (self.limit_at is None or time.time() - self.limit_at >= LIMIT_TTL):
+            self.limit = self.limit_at = None
+        self.size = max(default, min(learned.get("size", default), self.limit or maximum))
+
+        self.requests = {}
+
+    def _count(self, category):
+        self.requests[category] = self.requests.get(category, 0) + 1
+
+    def page(self, category, requested: int, returned: int, fetched: int, total: int | None = None) -> bool:
+        # Record a page of `returned` items out of `requested`, with `fetched` items of the category seen so far
+        # including these. Returns True once the category is exhausted, so no trailing empty page is requested.
+        with self.lock:
+            self._count(category)
+
+            if total is None:
+                return returned < requested
+
+            exhausted = returned == 0 or fetched >= total
+
+            if returned < requested and not exhausted:
+                # Truncated: the server won't return more than this per page
+                self.limit = returned
+                self.limit_at = time.time()
+                self.size = max(1, returned)
+            elif returned == requested and not exhausted and requested == self.size:
+                self.size = min(self.size * 2, self.limit or self.maximum)
+
+            return exhausted
+
+    def failed(self, category, requested: int) -> bool:
+        # Record a failed request. Returns True if the page size was reduced and the request is worth retrying.
+        with self.lock:
+            self._count(category)
+
+            if requested <= self.default:
+                return False
+
+            # Categories fail concurrently, so a late failure at a larger size mustn't raise a limit another set lower
+            self.limit = min(self.limit or self.maximum, max(self.default, requested // 2))
+            self.limit_at = time.time()
+            self.size = min(self.size, self.limit)
+            return True
+
+    def report(self, location: str) -> dict:
+        # Log and reset the per-category request counts for a location and persist the learned size
+        with self.lock:
+            requests, self.requests = self.requests, {}
+            state = {"size": self.size, "limit": self.limit, "limit_at": self.limit_at}
+
+        update_cache(CACHE_FILE, lambda cache: (cache or {}) | {self.store: state})
+
+        logger.info("pagination", store=self.store, location=location, page_size=state["size"],
+                    requests=sum(requests.values()), categories=len(requests),
+                    requests_per_category=" ".join(f"{category}:{count}" for category, count in requests.items()))
+
+        return requests
+
+
+def controller(store: str, default: int, maximum: int) -> PageSizeController:
+    # One controller per store, shared by all of its locations
+    with _controllers_lock:
+        if store not in _controllers:
+            _controllers[store] = PageSizeController(store, default, maximum)
+        return _controllers[store]
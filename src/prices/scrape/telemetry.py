@@ -0,0 +1,140 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from tabulate import tabulate
+
+
+# The job being scraped in the current thread. Set by JobMetrics.track() so that the HTTP helpers and retry() can
+# attribute requests, bytes and sleeps to the right (store, location) without threading it through every scraper.
+current_job = contextvars.ContextVar("current_job", default=None)
+
+
+class JobMetrics:
+    COUNTERS = ("http_requests", "http_bytes", "retries", "products", "db_rows")
+    TIMERS = ("wall_time", "network_time", "wait_time", "scrape_time", "worker_time", "blocked_time", "db_time")
+
+    def __init__(self, run_id: str, store: str, location_id: int, location_name: str = ""):
+        self.run_id = run_id
+        self.store = store
+        self.location_id = location_id
+        self.location_name = location_name
+        self.started_at = None
+        self.error = None
+        self.lock = threading.Lock()
+        self.values = dict.fromkeys(self.COUNTERS, 0) | dict.fromkeys(self.TIMERS, 0.0)
+
+    def add(self, **values):
+        with self.lock:
+            for key, value in values.items():
+                self.values[key] += value
+
+    @property
+    def parse_time(self) -> float:
+        # Time spent inside the scraper that wasn't waiting on the network or sleeping between requests. Scrapers
+        # fan requests out over worker threads, so network and wait times are summed across threads and come off
+        # the summed busy time of every thread: the consumer's time in the generator plus the workers', less the
+        # time any of them sat blocked on another thread's results.
+        busy = self.values["scrape_time"] + self.values["worker_time"] - self.values["blocked_time"]
+        return max(0.0, busy - self.values["network_time"] - self.values["wait_time"])
+
+    @contextmanager
+    def track(self):
+        self.started_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        token = current_job.set(self)
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.add(wall_time=time.perf_counter() - start)
+            current_job.reset(token)
+
+    def products(self, products):
+        # Wrap a scraper generator, counting what it yields and timing how long each item takes to produce
+        iterator = iter(products)
+        while True:
+            start = time.perf_counter()
+            try:
+                product = next(iterator)
+            except StopIteration:
+                self.add(scrape_time=time.perf_counter() - start)
+                return
+            self.add(scrape_time=time.perf_counter() - start, products=1)
+            yield product
+
+    def as_dict(self) -> dict:
+        with self.lock:
+            values = dict(self.values)
+
+        return {
+            "run_id": self.run_id,
+            "store": self.store,
+            "location_id": self.location_id,
+            "started_at": self.started_at or self.run_id,
+            "wall_time": values["wall_time"],
+            "http_requests": values["http_requests"],
+            "http_bytes": values["http_bytes"],
+            "retries": values["retries"],
+            "products": values["products"],
+            "db_rows": values["db_rows"],
+            "network_time": values["network_time"],
+            "wait_time": values["wait_time"],
+            "parse_time": self.parse_time,
+            "db_time": values["db_time"],
+            "error": self.error
+        }
+
+
+def record_request(size: int, seconds: float):
+    job = current_job.get()
+    if job is not None:
+        job.add(http_requests=1, http_bytes=size, network_time=seconds)
+
+
+def record_retry():
+    job = current_job.get()
+    if job is not None:
+        job.add(retries=1)
+
+
+def record_wait(seconds: float):
+    job = current_job.get()
+    if job is not None:
+        job.add(wait_time=seconds)
+
+
+def record_worker(seconds: float):
+    job = current_job.get()
+    if job is not None:
+        job.add(worker_time=seconds)
+
+
+def record_blocked(seconds: float):
+    job = current_job.get()
+    if job is not None:
+        job.add(blocked_time=seconds)
+
+
+def format_report(jobs: list[JobMetrics]) -> str:
+    rows = []
+    for job in sorted(jobs, key=lambda j: j.values["wall_time"], reverse=True):
+        metrics = job.as_dict()
+        rows.append([
+            job.store,
+            job.location_name or job.location_id,
+            f"{metrics['wall_time']:.0f}",
+            metrics["http_requests"],
+            f"{metrics['http_bytes'] / 1_000_000:.1f}",
+            metrics["retries"],
+            metrics["products"],
+            metrics["db_rows"],
+            f"{metrics['network_time']:.0f}",
+            f"{metrics['parse_time']:.0f}",
+            f"{metrics['db_time']:.0f}",
+            "error" if metrics["error"] else ""
+        ])
+
+    return tabulate(rows, headers=["Store", "Location", "Wall s", "Requests", "MB", "Retries", "Products", "Rows",
+                                   "Net s", "Parse s", "DB s", ""])
@@ -0,0 +1,33 @@
+import json
+from types import SimpleNamespace
+
+from prices.scrape import decode
+
+
+def test_storefront_page_keeps_only_the_fields_scrapers_read():
+    page = {
+        "items": [{"sku": "1", "name": "Milk", "price": "$2.99", "image": "milk.png",
+                   "attributes": {"aurus SNAP Flag": "Y", "color": "white"}}],
+        "total": 1,
+        "facets": [],
+    }
+    assert decode.storefront_page(page) == {
+        "items": [{"sku": "1", "name": "Milk", "price": "$2.99", "attributes": {"aurus SNAP Flag": "Y"}}],
+        "total": 1,
+    }
+
+
+def test_storefront_page_without_items():
+    assert decode.storefront_page({"items": None}) == {"items": [], "total": None}
+
+
+def test_aldi_products_takes_the_total_from_the_pagination_metadata():
+    page = {"data": [{"sku": "1", "name": "Eggs", "image": "eggs.png"}], "meta": {"pagination": {"totalCount": 40}}}
+    assert decode.aldi_products(page) == {"items": [{"sku": "1", "name": "Eggs"}], "total": 40}
+    assert decode.aldi_products({"data": []})["total"] is None
+
+
+def test_response_json_decodes_inline_without_a_pool():
+    response = SimpleNamespace(content=json.dumps({"items": [{"sku": "1"}], "total": 1}).encode())
+    assert decode.response_json(response, decode.storefront_page) == {"items": [{"sku": "1"}], "total": 1}
+    assert decode.response_json(response) == {"items": [{"sku": "1"}], "total": 1}
@@ -0,0 +1,70 @@
+import json
+import time
+
+import pytest
+
+from prices.scrape import pagination, util
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(util, "CACHE_DIR", str(tmp_path))
+    return tmp_path
+
+
+def test_size_doubles_after_full_pages_up_to_the_maximum():
+    pager = pagination.PageSizeController("Cub", 50, 200)
+    sizes = []
+    for _ in range(4):
+        sizes.append(pager.size)
+        pager.page("a", pager.size, pager.size, pager.size, 10_000)
+    assert sizes == [50, 100, 200, 200]
+
+
+def test_truncated_page_sets_the_limit():
+    pager = pagination.PageSizeController("Cub", 50, 200)
+    pager.size = 200
+    assert not pager.page("a", 200, 120, 120, 1000)
+    assert (pager.limit, pager.size) == (120, 120)
+
+    # Full pages at the limit don't probe past it
+    pager.page("a", 120, 120, 240, 1000)
+    assert pager.size == 120
+
+
+def test_pages_without_a_total_end_on_a_short_page():
+    pager = pagination.PageSizeController("Cub", 50, 200)
+    assert not pager.page("a", 50, 50, 50)
+    assert pager.page("a", 50, 20, 70)
+    assert pager.size == 50
+
+
+def test_failures_halve_the_size_down_to_the_default():
+    pager = pagination.PageSizeController("Cub", 50, 200)
+    pager.size = 200
+    assert pager.failed("a", 200)
+    assert (pager.limit, pager.size) == (100, 100)
+    assert pager.failed("a", 100)
+    assert pager.size == 50
+    assert not pager.failed("a", 50)
+
+
+def test_a_late_failure_never_raises_the_limit():
+    pager = pagination.PageSizeController("Cub", 50, 200)
+    pager.size = 200
+    pager.failed("a", 100)
+    pager.failed("b", 200)
+    assert (pager.limit, pager.size) == (50, 50)
+
+
+def test_learned_limits_persist_until_they_expire(cache_dir, monkeypatch):
+    pager = pagination.PageSizeController("Cub", 50, 200)
+    pager.size = 200
+    pager.failed("a", 200)
+    assert pager.report("1") == {"a": 1}
+
+    assert pagination.PageSizeController("Cub", 50, 200).limit == 100
+
+    limit_at = json.loads((cache_dir / pagination.CACHE_FILE).read_text())["Cub"]["limit_at"]
+    monkeypatch.setattr(time, "time", lambda: limit_at + pagination.LIMIT_TTL)
+    assert pagination.PageSizeController("Cub", 50, 200).limit is None
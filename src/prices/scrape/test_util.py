@@ -0,0 +1,88 @@
+import threading
+import time
+
+import pytest
+
+from prices.scrape import telemetry
+from prices.scrape.util import fan_out, plan_categories
+
+
+def test_fan_out_yields_in_item_order():
+    def fetch(item):
+        # Later items finish first
+        time.sleep(0.01 * (5 - item))
+        yield from (f"{item}a", f"{item}b")
+
+    assert list(fan_out(list(range(5)), fetch, 4)) == [f"{item}{part}" for item in range(5) for part in "ab"]
+
+
+def test_fan_out_raises_at_the_failing_items_turn():
+    def fetch(item):
+        if item == 2:
+            raise RuntimeError("boom")
+        yield item
+
+    results = []
+    with pytest.raises(RuntimeError, match="boom"):
+        for result in fan_out(list(range(5)), fetch, 4):
+            results.append(result)
+    assert results == [0, 1]
+
+
+def test_fan_out_stops_starting_items_when_the_consumer_stops():
+    started = []
+    lock = threading.Lock()
+
+    def fetch(item):
+        with lock:
+            started.append(item)
+        time.sleep(0.02)
+        yield item
+
+    for _ in fan_out(list(range(20)), fetch, 2):
+        break
+    time.sleep(0.1)
+    assert len(started) < 20
+
+
+def test_fan_out_attributes_worker_time_to_the_current_job():
+    def fetch(item):
+        time.sleep(0.05)
+        telemetry.record_request(0, 0.05)
+        yield item
+
+    job = telemetry.JobMetrics("run", "Cub", 1)
+    with job.track():
+        assert list(job.products(fan_out(list(range(8)), fetch, 4))) == list(range(8))
+
+    assert job.values["http_requests"] == 8
+    # Network time is summed across the workers, so it's more than the consumer's time in the generator, but not
+    # more than the summed busy time of every thread that parse time is taken from
+    values = job.values
+    assert values["network_time"] > values["scrape_time"]
+    assert values["scrape_time"] + values["worker_time"] - values["blocked_time"] >= values["network_time"]
+    assert job.parse_time < 0.1
+
+
+def category(id: str, count: int | None = None, *children) -> dict:
+    return {"id": id, "name": f"Category {id}", "product_count": count, "children": list(children)}
+
+
+def planned_ids(categories: list[dict]) -> list[str]:
+    return [planned["id"] for planned in plan_categories(categories)]
+
+
+def test_plan_categories_fetches_a_parent_that_covers_its_children():
+    assert planned_ids([category("1", 10, category("2", 4), category("3", 6))]) == ["1"]
+    # Storefront departments have no count and list their whole subtree
+    assert planned_ids([category("1", None, category("2", 4))]) == ["1"]
+
+
+def test_plan_categories_descends_when_a_parent_has_fewer_products_than_its_children():
+    assert planned_ids([category("1", 3, category("2", 4), category("3", 6))]) == ["1", "2", "3"]
+    assert planned_ids([category("1", 0, category("2", 4), category("3", 0))]) == ["2"]
+
+
+def test_plan_categories_plans_each_id_once():
+    tree = [category("1", 0, category("2", 4)), category("3", 0, category("2", 4))]
+    assert planned_ids(tree) == ["2"]
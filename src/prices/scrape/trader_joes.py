@@ -1,19 +1,96 @@
-import requests
-import json
-from typing import Generator, Any
-from prices.scrape.util import retry, split_price, split_size_and_unit, get_simplified_category, normalize_units
-
-
-def scrape_trader_joes_products(store_id: str = "713") -> Generator[dict[str, Any], None, None]:
-    headers = {
-        'accept': '*/*',
-        'content-type': 'application/json',
-        'user-agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/134.0.0.0 Safari/537.36'
+import os
+import threading
+import time
+from typing import Generator
+
+from prices.lib.log import get_logger
+from prices.lib.product import ScrapedProduct
+from prices.scrape import pagination
+from prices.scrape.decode import response_json
+from prices.scrape.util import fan_out, plan_categories, read_cache, retry, http_post, split_size_and_unit, get_simplified_category, normalize_units, update_cache
+
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+# Categories fetched at once for a location, and pages of each category once its page count is known
+CATEGORY_WORKERS = 4
+PAGE_WORKERS = 2
+
+# The category tree is the same for every store, so it's fetched at most once per TTL and shared by all locations and
+# runs. Each store's per-category page counts are kept from its last scrape: a category whose product_count hasn't
+# changed since then has all of its pages requested at once, and a changed one has its first page fetched to learn
+# the count before the rest.
+CATEGORY_TREE_TTL = int(os.getenv("PRICES_TJ_CATEGORY_TTL", str(24 * 3600)))
+CATEGORY_TREE_CACHE = "trader_joes_categories.json"
+SNAPSHOT_CACHE = "trader_joes_snapshot.json"
+
+HEADERS = {
+    'accept': '*/*',
+    'content-type': 'application/json',
+    'user-agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/134.0.0.0 Safari/537.36'
+}
+
+PRODUCTS_QUERY = """
+query SearchProducts($categoryId: String, $currentPage: Int, $pageSize: Int, $storeCode: String = "713", $availability: String = "1", $published: String = "1") {
+  products(
+    filter: {store_code: {eq: $storeCode}, published: {eq: $published}, availability: {match: $availability}, category_id: {eq: $categoryId}}
+    sort: {popularity: DESC}
+    currentPage: $currentPage
+    pageSize: $pageSize
+  ) {
+    items {
+      sku
+      item_title
+      category_hierarchy {
+        id
+        name
+        __typename
+      }
+      sales_size
+      sales_uom_description
+      price_range {
+        minimum_price {
+          final_price {
+            currency
+            value
+            __typename
+          }
+          __typename
+        }
+        __typename
+      }
+      retail_price
+      item_characteristics
+      __typename
     }
-
-    categories_query = """
-    {
-      categoryList(filters: null) {
+    total_count
+    pageInfo: page_info {
+      currentPage: current_page
+      totalPages: total_pages
+      __typename
+    }
+    __typename
+  }
+}
+"""
+
+CATEGORIES_QUERY = """
+{
+  categoryList(filters: null) {
+    id
+    level
+    name
+    path
+    url_key
+    product_count
+    children {
+      id
+      level
+      name
+      path
+      url_key
+      product_count
+      children {
         id
         level
         name
@@ -34,204 +111,202 @@ def scrape_trader_joes_products(store_id: str = "713") -> Generator[dict[str, An
             path
             url_key
             product_count
-            children {
-              id
-              level
-              name
-              path
-              url_key
-              product_count
-              children {
-                id
-                level
-                name
-                path
-                url_key
-                product_count
-                __typename
-              }
-              __typename
-            }
             __typename
           }
           __typename
         }
         __typename
       }
+      __typename
+    }
+    __typename
+  }
+}
+"""
+
+logger = get_logger(__name__)
+
+_tree_lock = threading.Lock()
+
+
+def get_category_tree() -> list | None:
+    with _tree_lock:
+        cached = read_cache(CATEGORY_TREE_CACHE)
+        if cached and time.time() - cached["fetched_at"] < CATEGORY_TREE_TTL:
+            return cached["categories"]
+
+        with retry():
+            response = http_post(
+                'https://www.traderjoes.com/api/graphql',
+                headers=HEADERS,
+                json={"query": CATEGORIES_QUERY}
+            )
+
+        categories = None
+        if response.status_code == 200:
+            categories = (response_json(response).get('data') or {}).get('categoryList')
+
+        if categories is None:
+            # An expired tree is still better than none
+            logger.warning("couldn't fetch category tree", status=response.status_code, cached=bool(cached))
+            return cached["categories"] if cached else None
+
+        update_cache(CATEGORY_TREE_CACHE, lambda _: {"fetched_at": time.time(), "categories": categories})
+        return categories
+
+
+def fetch_page(store_id: str, category_id: str, page: int, page_size: int) -> dict | None:
+    variables = {
+        "storeCode": store_id,
+        "availability": "1",
+        "published": "1",
+        "categoryId": str(category_id),
+        "currentPage": page,
+        "pageSize": page_size
     }
-    """
 
     with retry():
-        categories_response = requests.post(
+        products_response = http_post(
             'https://www.traderjoes.com/api/graphql',
-            headers=headers,
-            json={"query": categories_query}
+            headers=HEADERS,
+            json={"operationName": "SearchProducts", "variables": variables, "query": PRODUCTS_QUERY}
         )
 
-    if categories_response.status_code != 200:
-        return
+    if products_response.status_code != 200:
+        return None
 
-    categories_data = categories_response.json()
+    try:
+        products = response_json(products_response)['data']['products']
+        # A page without its items or page count can't be used any more than a failed one
+        if isinstance(products['items'], list) and isinstance(products['pageInfo']['totalPages'], int):
+            return products
+    except (KeyError, TypeError):
+        pass
 
-    def extract_categories_with_products(categories):
-        result = []
-        for category in categories:
-            if category.get('product_count', 0) > 0:
-                result.append({
-                    'id': category['id'],
-                    'name': category['name']
-                })
+    return None
 
-            if category.get('children'):
-                result.extend(extract_categories_with_products(category['children']))
 
-        return result
+def parse_products(products: list, category_name: str) -> Generator[ScrapedProduct, None, None]:
+    for product in products:
+        sku = product['sku']
 
+        name = product['item_title'].strip()
+
+        price = None
+        if product.get('price_range') and product['price_range']['minimum_price']['final_price']['value']:
+            price = product['price_range']['minimum_price']['final_price']['value']
+        elif product.get('retail_price'):
+            try:
+                price = float(product['retail_price'])
+            except (ValueError, TypeError):
+                price = None
+
+        raw_size = str(product.get('sales_size', ''))
+        size, unit = split_size_and_unit(raw_size)
+        if not unit and product.get('sales_uom_description'):
+            unit = normalize_units(product.get('sales_uom_description', ''))
+
+        brand = "Trader Joe's"
+        available = True
+        snap_eligible = False
+
+        if product.get('category_hierarchy'):
+            hierarchy = product['category_hierarchy']
+            raw_category = hierarchy[-1]['name'] if hierarchy else category_name
+            category = get_simplified_category(raw_category)
+        else:
+            category = get_simplified_category(category_name)
+
+        yield ScrapedProduct.create(sku, name, price, size, brand, unit, snap_eligible, available, category)
+
+
+def scrape_trader_joes_category(store_id: str, category: dict, pager: pagination.PageSizeController,
+                                snapshot: dict, updates: dict) -> Generator[ScrapedProduct, None, None]:
+    # A malformed product ends its category, as a malformed page does, rather than the whole location
     try:
-        all_categories = extract_categories_with_products(categories_data['data']['categoryList'])
-    except KeyError as e:
+        category_id = category['id']
+        # Pages are numbered, so the size can only change between categories
+        page_size = pager.size
+        fetched = 0
+        total_count = None
+
+        # JSON object keys are strings, whatever type the API gives IDs
+        previous = snapshot.get(str(category_id))
+        if previous and previous["product_count"] == category["product_count"] and previous["page_size"] == page_size:
+            fetched_pages = 0
+            total_pages = previous["total_pages"]
+        else:
+            while (first := fetch_page(store_id, category_id, 1, page_size)) is None:
+                if not pager.failed(category_id, page_size):
+                    return
+                page_size = pager.size
+
+            fetched = len(first['items'])
+            total_count = first.get('total_count')
+            pager.page(category_id, page_size, fetched, fetched, total_count)
+            yield from parse_products(first['items'], category['name'])
+
+            fetched_pages = 1
+            total_pages = first['pageInfo']['totalPages']
+
+        while fetched_pages < total_pages:
+            # The page count can grow while pages are being fetched, in which case the new pages are fetched next
+            latest = total_pages
+            pages = fan_out(range(fetched_pages + 1, total_pages + 1),
+                            lambda page: [fetch_page(store_id, category_id, page, page_size)], PAGE_WORKERS)
+
+            for data in pages:
+                if data is None:
+                    # A failed page ends the category, as it did when pages were fetched one at a time
+                    return
+
+                fetched += len(data['items'])
+                total_count = data.get('total_count')
+                pager.page(category_id, page_size, len(data['items']), fetched, total_count)
+                yield from parse_products(data['items'], category['name'])
+
+                latest = max(latest, data['pageInfo']['totalPages'])
+
+            fetched_pages, total_pages = total_pages, latest
+
+        updates[str(category_id)] = {
+            "product_count": category["product_count"],
+            "page_size": page_size,
+            "total_pages": total_pages,
+            "total_count": total_count
+        }
+    except (KeyError, TypeError) as e:
+        logger.warning("malformed category page", category=category['id'], error=e)
+
+
+def scrape_trader_joes_products(store_id: str = "713") -> Generator[ScrapedProduct, None, None]:
+    tree = get_category_tree()
+    if tree is None:
         return
 
+    # Every level of the hierarchy has a product count, and a category whose count covers its subcategories' lists
+    # their products too, so the subcategories aren't fetched again
+    all_categories = plan_categories(tree)
+
+    pager = pagination.controller("Trader Joe's", PAGE_SIZE, MAX_PAGE_SIZE)
+    snapshot = read_cache(SNAPSHOT_CACHE, {}).get(store_id, {})
+    updates = {}
     processed_skus = set()
-    total_products = 0
-
-    for i, category_info in enumerate(all_categories):
-        category_id = category_info['id']
-        category_name = category_info['name']
-
-        page = 1
-        page_size = 50
-        category_products = 0
-
-        while True:
-            products_query = """
-            query SearchProducts($categoryId: String, $currentPage: Int, $pageSize: Int, $storeCode: String = "713", $availability: String = "1", $published: String = "1") {
-              products(
-                filter: {store_code: {eq: $storeCode}, published: {eq: $published}, availability: {match: $availability}, category_id: {eq: $categoryId}}
-                sort: {popularity: DESC}
-                currentPage: $currentPage
-                pageSize: $pageSize
-              ) {
-                items {
-                  sku
-                  item_title
-                  category_hierarchy {
-                    id
-                    name
-                    __typename
-                  }
-                  sales_size
-                  sales_uom_description
-                  price_range {
-                    minimum_price {
-                      final_price {
-                        currency
-                        value
-                        __typename
-                      }
-                      __typename
-                    }
-                    __typename
-                  }
-                  retail_price
-                  item_characteristics
-                  __typename
-                }
-                total_count
-                pageInfo: page_info {
-                  currentPage: current_page
-                  totalPages: total_pages
-                  __typename
-                }
-                __typename
-              }
-            }
-            """
-
-            variables = {
-                "storeCode": store_id,
-                "availability": "1",
-                "published": "1",
-                "categoryId": str(category_id),
-                "currentPage": page,
-                "pageSize": page_size
-            }
-
-            with retry():
-                products_response = requests.post(
-                    'https://www.traderjoes.com/api/graphql',
-                    headers=headers,
-                    json={"operationName": "SearchProducts", "variables": variables, "query": products_query}
-                )
-
-            if products_response.status_code != 200:
-                break
-
-            products_data = products_response.json()
 
-            try:
-                products = products_data['data']['products']['items']
-
-                # If the server returned no products, break
-                if not products:
-                    break
-
-                for product in products:
-                    sku = product['sku']
-
-                    if sku in processed_skus:
-                        continue
-
-                    processed_skus.add(sku)
-
-                    name = product['item_title'].strip()
-
-                    price = None
-                    if product.get('price_range') and product['price_range']['minimum_price']['final_price']['value']:
-                        price = product['price_range']['minimum_price']['final_price']['value']
-                    elif product.get('retail_price'):
-                        try:
-                            price = float(product['retail_price'])
-                        except (ValueError, TypeError):
-                            price = None
-
-                    raw_size = str(product.get('sales_size', ''))
-                    size, unit = split_size_and_unit(raw_size)
-                    if not unit and product.get('sales_uom_description'):
-                        unit = normalize_units(product.get('sales_uom_description', ''))
-
-                    brand = "Trader Joe's"
-                    available = True
-                    snap_eligible = False
-
-                    if product.get('category_hierarchy'):
-                        hierarchy = product['category_hierarchy']
-                        raw_category = hierarchy[-1]['name'] if hierarchy else category_name
-                        category = get_simplified_category(raw_category)
-                    else:
-                        category = get_simplified_category(category_name)
-
-                    product_info = {
-                        'sku': sku,
-                        'name': name,
-                        'price': price,
-                        'size': size,
-                        'brand': brand,
-                        'unit': unit,
-                        'snap_eligible': snap_eligible,
-                        'available': available,
-                        'category': category
-                    }
-
-                    total_products += 1
-                    category_products += 1
-                    yield product_info
-
-                page_info = products_data['data']['products']['pageInfo']
-                if page_info['currentPage'] >= page_info['totalPages']:
-                    break
-
-                page += 1
-
-            except KeyError as e:
-                break
\ No newline at end of file
+    # Categories are fetched concurrently but yielded in order, so the first category listing a SKU keeps it
+    products = fan_out(all_categories,
+                       lambda category: scrape_trader_joes_category(store_id, category, pager, snapshot, updates),
+                       CATEGORY_WORKERS)
+
+    for product in products:
+        if product.sku in processed_skus:
+            continue
+        processed_skus.add(product.sku)
+        yield product
+
+    unchanged = sum(1 for category in all_categories
+                    if snapshot.get(str(category['id']), {}).get("product_count") == category["product_count"])
+    logger.info("category snapshot", store_id=store_id, categories=len(all_categories), unchanged=unchanged)
+
+    update_cache(SNAPSHOT_CACHE, lambda cache: (cache or {}) | {store_id: updates})
+    pager.report(store_id)
@@ -1,6 +1,26 @@
+import contextvars
+import json
+import os
+import queue
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 
+import requests
+
+from prices.scrape import telemetry
+
+
+# Politeness delay before every request; benchmarks against replayed fixtures set this to 0
+REQUEST_DELAY = 0.5
+
+# Scraper state kept between runs, such as learned page sizes and category snapshots
+CACHE_DIR = os.getenv("PRICES_CACHE_DIR", "cache")
+
+_done = object()
+_cache_lock = threading.Lock()
+
 
 @contextmanager
 def retry():
@@ -8,14 +28,137 @@ def retry():
    while True:
        attempt += 1
        try:
-           time.sleep(0.5)
+           time.sleep(REQUEST_DELAY)
+           telemetry.record_wait(REQUEST_DELAY)
            yield
            break
        except Exception as e:
+           telemetry.record_retry()
            if attempt >= 3:
                raise e
            delay = min(1.0 * (2 ** (attempt - 1)), 60.0)
            time.sleep(delay)
+           telemetry.record_wait(delay)
+
+
+def http_request(method: str, url: str, **kwargs) -> requests.Response:
+    # All scraper traffic goes through here so it can be counted and timed against the current scrape job
+    start = time.perf_counter()
+    response = requests.request(method, url, **kwargs)
+    size = len(response.content)
+    telemetry.record_request(size, time.perf_counter() - start)
+    return response
+
+
+def http_get(url: str, **kwargs) -> requests.Response:
+    return http_request("GET", url, **kwargs)
+
+
+def http_post(url: str, **kwargs) -> requests.Response:
+    return http_request("POST", url, **kwargs)
+
+
+def read_cache(name: str, default=None):
+    try:
+        with _cache_lock, open(os.path.join(CACHE_DIR, name)) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return default
+
+
+def update_cache(name: str, update):
+    # Read-modify-write of a JSON cache file; update() receives the current contents (or None) and returns the new
+    path = os.path.join(CACHE_DIR, name)
+    with _cache_lock:
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            data = None
+
+        data = update(data)
+
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(path + ".tmp", "w") as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+        os.replace(path + ".tmp", path)
+
+    return data
+
+
+def fan_out(items: list, fetch, max_workers: int):
+    # Runs fetch(item), a generator, for every item on up to max_workers threads and yields everything they produce
+    # in item order: all of the first item's results, then the second's, and so on, exactly as a serial loop would.
+    # Results of items that finish ahead of their turn are buffered. An exception is raised when its item's turn
+    # comes. Workers run in a copy of the caller's context, so telemetry still attributes their requests to the
+    # current job.
+    if max_workers <= 1 or len(items) <= 1:
+        for item in items:
+            yield from fetch(item)
+        return
+
+    queues = [queue.Queue() for _ in items]
+    cancelled = threading.Event()
+
+    def produce(item, results: queue.Queue):
+        start = time.perf_counter()
+        try:
+            for result in fetch(item):
+                if cancelled.is_set():
+                    return
+                results.put(result)
+        except Exception as e:
+            results.put(e)
+        finally:
+            telemetry.record_worker(time.perf_counter() - start)
+            results.put(_done)
+
+    def get(results: queue.Queue):
+        start = time.perf_counter()
+        result = results.get()
+        telemetry.record_blocked(time.perf_counter() - start)
+        return result
+
+    executor = ThreadPoolExecutor(max_workers, thread_name_prefix="fan-out")
+    try:
+        for item, results in zip(items, queues):
+            executor.submit(contextvars.copy_context().run, produce, item, results)
+
+        for results in queues:
+            while (result := get(results)) is not _done:
+                if isinstance(result, Exception):
+                    raise result
+                yield result
+    finally:
+        # If the consumer stopped early, don't start the remaining items and let running ones wind down
+        cancelled.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def plan_categories(categories: list[dict]) -> list[dict]:
+    # Chooses the fewest category listings that still cover every product in a category tree of
+    # {"id", "name", "product_count", "children"} dicts; product_count and children are optional. A category's listing
+    # includes its subcategories' products when it has no count (storefront departments list their whole subtree) or
+    # its count is at least theirs combined, and then its subcategories aren't fetched separately. Otherwise it's
+    # fetched if it has products of its own and its subcategories are planned in turn. Each ID is planned once.
+    planned = []
+    seen = set()
+
+    def plan(nodes):
+        for node in nodes:
+            children = node.get("children") or []
+            count = node.get("product_count")
+            covers_children = count is None or count >= sum(child.get("product_count") or 0 for child in children)
+
+            if (count is None or count > 0) and node["id"] not in seen:
+                seen.add(node["id"])
+                planned.append({"id": node["id"], "name": node["name"], "product_count": count})
+
+            if children and not (covers_children and (count is None or count > 0)):
+                plan(children)
+
+    plan(categories)
+    return planned
 
 
 def normalize_units(unit: str) -> str:
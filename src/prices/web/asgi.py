@@ -0,0 +1,325 @@
+import asyncio
+import functools
+import re
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+
+from asgiref.wsgi import WsgiToAsgi
+from werkzeug.datastructures import Headers, MultiDict
+from werkzeug.http import parse_accept_header, parse_etags, quote_etag
+
+from prices.lib.database import Database
+from prices.web import main
+from prices.web.cache import cache_control, cache_key
+from prices.web.responses import EXPORT_FORMATS, choose_encoding, compress, dumps, export_header, ndjson, row_encoder
+
+# ASGI server mode (pip install prices[asgi]):
+#   uvicorn prices.web.asgi:app --workers 2
+# The JSON APIs are served natively, with SQLite calls run on a bounded thread pool so a slow query only holds a
+# pool thread rather than the event loop. They share the Flask app's response cache, so both servers answer from
+# the same entries with the same ETags. Long results stream as NDJSON. Everything else is passed through to the
+# Flask app unchanged.
+
+DB_THREADS = 8
+# Streams hold a thread for as long as the client keeps reading, so they get a pool of their own. Streams beyond it
+# wait for a thread rather than taking one from the other routes.
+STREAM_THREADS = 4
+
+_done = object()
+
+
+class AsyncDatabase:
+    def __init__(self, db: Database, max_workers: int = DB_THREADS, stream_workers: int = STREAM_THREADS,
+                 queue_size: int = 8):
+        self.db = db
+        self.queue_size = queue_size
+        # Each pool thread gets its own SQLite connection through Database's thread-local, so this also bounds the
+        # number of open connections
+        self.executor = ThreadPoolExecutor(max_workers, thread_name_prefix="db")
+        self.stream_executor = ThreadPoolExecutor(stream_workers, thread_name_prefix="db-stream")
+
+    def __getattr__(self, name: str):
+        method = getattr(self.db, name)
+
+        async def call(*args, **kwargs):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, functools.partial(method, *args, **kwargs))
+
+        return call
+
+    async def stream(self, name: str, *args, chunk_size: int = 500, **kwargs):
+        # Runs a Database generator on a stream pool thread and yields its items in chunks. The queue is bounded, so a slow
+        # client pauses the query instead of buffering the whole result.
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(self.queue_size)
+        cancelled = threading.Event()
+
+        def put(item):
+            asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+        def produce():
+            try:
+                chunk = []
+                for item in getattr(self.db, name)(*args, **kwargs):
+                    if cancelled.is_set():
+                        return
+                    chunk.append(item)
+                    if len(chunk) >= chunk_size:
+                        put(chunk)
+                        chunk = []
+                if chunk:
+                    put(chunk)
+            except Exception as e:
+                put(e)
+            finally:
+                put(_done)
+
+        future = loop.run_in_executor(self.stream_executor, produce)
+
+        try:
+            while (item := await queue.get()) is not _done:
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # If the client went away, stop the producer and unblock it if it's waiting on a full queue
+            cancelled.set()
+            while not future.done():
+                while not queue.empty():
+                    queue.get_nowait()
+                await asyncio.sleep(0.01)
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.stream_executor.shutdown(wait=False, cancel_futures=True)
+
+
+class Request:
+    def __init__(self, scope: dict):
+        self.path = scope["path"]
+        self.args = MultiDict(parse_qsl(scope["query_string"].decode("latin-1"), keep_blank_values=True))
+        self.headers = Headers([(key.decode("latin-1"), value.decode("latin-1")) for key, value in scope["headers"]])
+        self.accept_encodings = parse_accept_header(self.headers.get("Accept-Encoding"))
+
+
+async def send_response(send, status: int, body: bytes, content_type: str, headers: list | None = None):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", content_type.encode()), (b"content-length", str(len(body)).encode())] +
+                   (headers or [])
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def send_json(request: Request, send, data, status: int = 200):
+    body = dumps(data)
+    headers = [(b"vary", b"Accept-Encoding")]
+
+    encoding = choose_encoding(body, "application/json", request.accept_encodings)
+    if encoding is not None:
+        body = compress(body, encoding)
+        headers.append((b"content-encoding", encoding.encode()))
+
+    await send_response(send, status, body, "application/json", headers)
+
+
+async def send_stream(request: Request, send, chunks, content_type: str, encode, headers: list | None = None,
+                      prefix: bytes = b""):
+    # Chunked response; prefix, then each chunk of rows encoded to bytes by encode(), gzipped on the fly if accepted
+    headers = [(b"content-type", content_type.encode()), (b"vary", b"Accept-Encoding")] + (headers or [])
+
+    compressor = None
+    if request.accept_encodings["gzip"]:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        headers.append((b"content-encoding", b"gzip"))
+
+    await send({"type": "http.response.start", "status": 200, "headers": headers})
+
+    if prefix:
+        body = compressor.compress(prefix) if compressor is not None else prefix
+        if body:
+            await send({"type": "http.response.body", "body": body, "more_body": True})
+
+    async for chunk in chunks:
+        body = encode(chunk)
+        if compressor is not None:
+            body = compressor.compress(body)
+        if body:
+            await send({"type": "http.response.body", "body": body, "more_body": True})
+
+    await send({"type": "http.response.body", "body": compressor.flush() if compressor else b""})
+
+
+def cached(max_age: int = 0):
+    # The native counterpart of ResponseCache.cached, for handlers that return (data, status) instead of sending.
+    # Only 200 responses are cached.
+    control = cache_control(max_age).encode()
+
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(request: Request, send, **kwargs):
+            start = time.perf_counter()
+            # Re-reading the data version is a query, so it runs on the pool too
+            version = await asyncio.get_running_loop().run_in_executor(adb.executor, main.cache.current_version)
+            key = cache_key(request.path, request.args)
+
+            entry = main.cache.get(key, version)
+            hit = entry is not None
+
+            if entry is None:
+                data, status = await handler(request, **kwargs)
+                if status != 200:
+                    main.cache.record(False, time.perf_counter() - start)
+                    return await send_json(request, send, data, status)
+                entry = main.cache.store(key, version, dumps(data), "application/json")
+
+            encoding = choose_encoding(entry.body, entry.mimetype, request.accept_encodings)
+            body, etag = main.cache.encode(entry, encoding)
+
+            headers = [(b"vary", b"Accept-Encoding"), (b"etag", quote_etag(etag).encode()), (b"cache-control", control)]
+            if encoding is not None:
+                headers.append((b"content-encoding", encoding.encode()))
+
+            not_modified = parse_etags(request.headers.get("If-None-Match")).contains_weak(etag)
+            main.cache.record(hit, time.perf_counter() - start, not_modified)
+
+            if not_modified:
+                return await send_response(send, 304, b"", entry.mimetype, headers)
+            await send_response(send, 200, body, entry.mimetype, headers)
+
+        return wrapper
+
+    return decorator
+
+
+@cached(max_age=60)
+async def get_products(request: Request):
+    try:
+        products, next_cursor = await adb.search_products(**main.product_search_args(request.args))
+    except ValueError as e:
+        return {"error": str(e)}, 400
+
+    return {"items": products, "next_cursor": next_cursor}, 200
+
+
+@cached(max_age=60)
+async def get_bargains(request: Request):
+    try:
+        limit = main.limit_arg(request.args, 50)
+        bargains, next_cursor = await adb.get_bargains(limit, request.args.get("cursor"))
+    except ValueError as e:
+        return {"error": str(e)}, 400
+
+    return {"items": bargains, "next_cursor": next_cursor}, 200
+
+
+@cached(max_age=60)
+async def get_price_history(request: Request, store: str, sku: str):
+    product = await adb.get_product(store, sku)
+
+    if not product:
+        return {"error": "Product not found"}, 404
+
+    bucket = request.args.get("bucket", "day")
+
+    try:
+        dates = main.date_args(request.args, "start", "end")
+        # The history and current prices are independent, so run them on two pool threads at once
+        price_history, current_prices = await asyncio.gather(
+            adb.get_price_history(product["id"], dates["start"], dates["end"], bucket),
+            adb.get_current_prices(product["id"])
+        )
+    except ValueError as e:
+        return {"error": str(e)}, 400
+
+    result = {
+        "product": product,
+        "current_prices": current_prices,
+        "price_history": price_history
+    }
+
+    return result, 200
+
+
+async def stream_prices(request: Request, send, store: str, sku: str):
+    product = await adb.get_product(store, sku)
+
+    if not product:
+        return await send_json(request, send, {"error": "Product not found"}, 404)
+
+    try:
+        dates = main.date_args(request.args, "start", "end")
+    except ValueError as e:
+        return await send_json(request, send, {"error": str(e)}, 400)
+
+    chunks = adb.stream("iter_prices", product["id"], dates["start"], dates["end"])
+    await send_stream(request, send, chunks, "application/x-ndjson", ndjson)
+
+
+async def export(request: Request, send, dataset: str):
+    try:
+        format, filters = main.export_args(request.args)
+    except ValueError as e:
+        return await send_json(request, send, {"error": str(e)}, 400)
+
+    method, columns = main.EXPORTS[dataset]
+    headers = [(b"content-disposition", f'attachment; filename="{dataset}.{format}"'.encode())]
+
+    await send_stream(request, send, adb.stream(method, **filters), EXPORT_FORMATS[format],
+                      row_encoder(format, columns), headers, export_header(format, columns))
+
+
+@cached()
+async def get_comparisons(request: Request):
+    return await adb.list_comparisons(), 200
+
+
+@cached()
+async def get_comparison(request: Request, comparison_id: str):
+    comparison = await adb.get_comparison(int(comparison_id))
+    if not comparison:
+        return {"error": "Comparison not found"}, 404
+    return comparison, 200
+
+
+# Native GET routes, mirroring the Flask routes of the same paths
+ROUTES = [
+    (re.compile(r"/api/products"), get_products),
+    (re.compile(r"/api/bargains"), get_bargains),
+    (re.compile(r"/api/price-history/(?P<store>[^/]+)/(?P<sku>[^/]+)"), get_price_history),
+    (re.compile(r"/api/price-history/(?P<store>[^/]+)/(?P<sku>[^/]+)/prices\.ndjson"), stream_prices),
+    (re.compile(r"/api/export/(?P<dataset>products|prices)"), export),
+    (re.compile(r"/api/comparisons"), get_comparisons),
+    (re.compile(r"/api/comparisons/(?P<comparison_id>\d+)"), get_comparison),
+]
+
+adb = AsyncDatabase(main.db)
+flask_app = WsgiToAsgi(main.app)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            adb.close()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+
+    if scope["type"] == "http" and scope["method"] == "GET":
+        for pattern, handler in ROUTES:
+            match = pattern.fullmatch(scope["path"])
+            if match:
+                return await handler(Request(scope), send, **match.groupdict())
+
+    await flask_app(scope, receive, send)
@@ -0,0 +1,168 @@
+import functools
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+from flask import current_app, request
+
+from prices.web.responses import choose_encoding, compress
+
+
+def cache_key(path: str, args) -> tuple:
+    return path, tuple(sorted(args.items(multi=True)))
+
+
+def cache_control(max_age: int) -> str:
+    # A max_age of 0 lets browsers and proxies keep a copy but makes them revalidate it on every use
+    return f"public, max-age={max_age}" if max_age else "public, no-cache"
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    mimetype: str
+    etag: str
+    version: str
+    expires: float
+    # Compressed copies of body, filled in the first time each encoding is requested
+    encoded: dict
+
+
+class ResponseCache:
+    # Whole-response cache for read-only views. Prices only change when the scraper finishes (or a comparison is
+    # edited), and both bump the database's data version, so entries are dropped as soon as that stamp changes.
+    # The TTL only bounds how long a response can be served if a version bump is somehow missed.
+    def __init__(self, data_version, max_entries: int = 1024, ttl: float = 3600.0, version_interval: float = 5.0):
+        self.data_version = data_version
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.version_interval = version_interval
+
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.version = None
+        self.version_checked = 0.0
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "not_modified": 0,
+            "evictions": 0,
+            "hit_seconds": 0.0,
+            "miss_seconds": 0.0
+        }
+
+    def current_version(self) -> str:
+        # The stamp is re-read at most once per interval rather than on every request
+        now = time.monotonic()
+        if now - self.version_checked >= self.version_interval:
+            version = self.data_version()
+            with self.lock:
+                self.version_checked = now
+                if version != self.version:
+                    self.entries.clear()
+                    self.version = version
+
+        return self.version
+
+    def invalidate(self):
+        # Forces the next request to re-read the data version, e.g. after this process has written to the database
+        with self.lock:
+            self.version_checked = 0.0
+
+    def get(self, key, version: str) -> CachedResponse | None:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+
+            if entry.version != version or entry.expires <= time.monotonic():
+                del self.entries[key]
+                return None
+
+            self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry: CachedResponse):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def store(self, key, version: str, body: bytes, mimetype: str) -> CachedResponse:
+        etag = f"{version}-{hashlib.sha1(body).hexdigest()[:16]}"
+        entry = CachedResponse(body, mimetype, etag, version, time.monotonic() + self.ttl, {})
+        self.put(key, entry)
+        return entry
+
+    def encode(self, entry: CachedResponse, encoding: str | None) -> tuple[bytes, str]:
+        # The body in the given encoding and its ETag. Each encoding is a different representation, so it needs its
+        # own strong ETag.
+        if encoding is None:
+            return entry.body, entry.etag
+
+        body = entry.encoded.get(encoding)
+        if body is None:
+            body = entry.encoded[encoding] = compress(entry.body, encoding)
+        return body, f"{entry.etag}-{encoding}"
+
+    def record(self, hit: bool, seconds: float, not_modified: bool = False):
+        with self.lock:
+            if hit:
+                self.stats["hits"] += 1
+                self.stats["hit_seconds"] += seconds
+            else:
+                self.stats["misses"] += 1
+                self.stats["miss_seconds"] += seconds
+            if not_modified:
+                self.stats["not_modified"] += 1
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return self.stats | {"entries": len(self.entries)}
+
+    def cached(self, max_age: int = 0):
+        # Caches successful responses by path and query string, along with their compressed forms, and answers
+        # If-None-Match with 304. The ASGI server's native routes share the cache through the same methods.
+        control = cache_control(max_age)
+
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                version = self.current_version()
+                key = cache_key(request.path, request.args)
+
+                entry = self.get(key, version)
+                hit = entry is not None
+
+                if entry is None:
+                    response = current_app.make_response(view(*args, **kwargs))
+
+                    # Errors and redirects are never cached
+                    if response.status_code != 200:
+                        self.record(False, time.perf_counter() - start)
+                        return response
+
+                    entry = self.store(key, version, response.get_data(), response.mimetype)
+
+                encoding = choose_encoding(entry.body, entry.mimetype)
+                body, etag = self.encode(entry, encoding)
+
+                response = current_app.response_class(body, mimetype=entry.mimetype)
+                response.vary.add("Accept-Encoding")
+                if encoding is not None:
+                    response.headers["Content-Encoding"] = encoding
+                response.set_etag(etag)
+                response.headers["Cache-Control"] = control
+                response.make_conditional(request)
+
+                self.record(hit, time.perf_counter() - start, response.status_code == 304)
+                return response
+
+            return wrapper
+
+        return decorator
@@ -0,0 +1,24 @@
+import pytest
+
+from prices.lib.product import ScrapedProduct
+from prices.web import main
+
+
+@pytest.fixture(scope="session")
+def client(tmp_path_factory):
+    # The app's database is opened lazily, so it can be pointed at a scratch file before the first request. The
+    # ASGI server shares it, along with the response cache.
+    main.db.close()
+    main.db.database_path = str(tmp_path_factory.mktemp("web") / "prices.db")
+    main.cache.invalidate()
+
+    location_id = main.db.create_location("Cub", "Cub #1", "1", "55101")
+    main.db.save_batch(location_id, [
+        ScrapedProduct.create(str(sku), f"Product {sku}", 1.99, 1.0, "Brand", "oz", True, True, "Pantry")
+        for sku in range(5)
+    ])
+    main.cache.invalidate()
+
+    yield main.app.test_client()
+
+    main.db.close()
@@ -1,69 +1,47 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for
+from datetime import datetime
+from itertools import chain
+
+from flask import Flask, render_template, request, redirect, url_for, Response, stream_with_context
 
 from prices.lib.constants import CATEGORIES
 from prices.lib.database import Database
+from prices.lib import optimizer
+from prices.lib.log import configure_logging
+from prices.web.cache import ResponseCache
+from prices.web.metrics import render_prometheus, render_cache_metrics
+from prices.web.responses import EXPORT_FORMATS, chunked, compress_response, dumps, export_header, gzip_stream, \
+    json_response, row_encoder
+
+configure_logging()
 
 app = Flask(__name__)
-db = Database("prices.db")
+app.after_request(compress_response)
+db = Database("prices.db", profile="serving")
+cache = ResponseCache(db.get_data_version)
+
+# Bulk exports: the Database generator behind each one and its columns, in CSV order
+EXPORTS = {
+    "products": ("export_products", ["id", "store", "sku", "name", "brand", "size", "unit", "category",
+                                     "snap_eligible", "first_seen", "last_seen", "active"]),
+    "prices": ("export_prices", ["date", "product_id", "store", "sku", "location_code", "location", "price",
+                                 "available"])
+}
+
+# Largest page the paginated endpoints return; larger limits are capped to it
+MAX_LIMIT = 200
 
 
 @app.route("/")
+@cache.cached()
 def index():
     stats = db.get_stats()
     return render_template("index.html", stats=stats)
 
 
 @app.route("/comparisons")
+@cache.cached()
 def list_comparisons():
-    comparisons = db.list_comparisons()
-
-    # Enhance each comparison with additional data
-    for comparison in comparisons:
-        # Get full comparison data to access products
-        full_comparison = db.get_comparison(comparison["id"])
-
-        if not full_comparison or not full_comparison["products"]:
-            comparison["best_value_product"] = None
-            comparison["unit"] = None
-            comparison["savings"] = None
-            continue
-
-        # Calculate unit prices for each product
-        for product in full_comparison["products"]:
-            size_value = product["size"]
-
-            if product["lowest_price"] is not None and size_value > 0:
-                product["unit_price"] = product["lowest_price"] / size_value
-            else:
-                product["unit_price"] = None
-
-        # Find best value product
-        best_value_product = None
-        lowest_unit_price = None
-
-        for product in full_comparison["products"]:
-            if product["unit_price"] is not None:
-                if lowest_unit_price is None or product["unit_price"] < lowest_unit_price:
-                    lowest_unit_price = product["unit_price"]
-                    best_value_product = product
-
-        # Find second best product to calculate savings
-        second_best_price = None
-        for product in full_comparison["products"]:
-            if product["unit_price"] is not None and product != best_value_product:
-                if second_best_price is None or product["unit_price"] < second_best_price:
-                    second_best_price = product["unit_price"]
-
-        # Calculate savings (difference between best and second best)
-        savings = None
-        if lowest_unit_price is not None and second_best_price is not None:
-            savings = lowest_unit_price - second_best_price
-
-        # Add the calculated data to the comparison
-        comparison["best_value_product"] = best_value_product
-        comparison["unit"] = full_comparison["products"][0]["unit"] if full_comparison["products"] else None
-        comparison["savings"] = savings
-
+    comparisons = db.list_comparison_summaries()
     return render_template("comparisons/index.html", comparisons=comparisons)
 
 
@@ -127,6 +105,7 @@ def new_comparison():
         try:
             # Create an empty comparison with just a title
             comparison_id = db.create_comparison(title, [])
+            cache.invalidate()
 
             # Redirect to edit page for the new comparison
             return redirect(url_for("edit_comparison", comparison_id=comparison_id))
@@ -162,17 +141,40 @@ def bargains():
     return render_template("bargains/index.html")
 
 
+@app.route("/price-changes")
+def price_changes():
+    return render_template("price_changes/index.html")
+
+
 @app.route("/price-history/<store>/<sku>")
 def price_history(store, sku):
     return render_template("price_history/index.html", store=store, sku=sku)
 
 
-@app.route("/api/products")
-def get_products():
-    query = request.args.get("q")
-    snap = request.args.get("snap")
-    store = request.args.get("store")
-    category = request.args.get("category")
+@app.route("/scrape-runs")
+def scrape_runs():
+    runs = db.list_scrape_runs()
+    jobs = db.get_scrape_metrics(request.args.get("run"))
+    return render_template("scrape_runs/index.html", runs=runs, jobs=jobs)
+
+
+@app.route("/metrics")
+def metrics():
+    body = render_prometheus(db.get_scrape_metrics()) + render_cache_metrics(cache.snapshot())
+    return Response(body, mimetype="text/plain; version=0.0.4")
+
+
+def limit_arg(args, default: int) -> int:
+    # Shared with the ASGI server
+    limit = int(args.get("limit", default))
+    if limit < 1:
+        raise ValueError("limit must be at least 1")
+    return min(limit, MAX_LIMIT)
+
+
+def product_search_args(args) -> dict:
+    # Shared with the ASGI server's native /api/products route
+    snap = args.get("snap")
 
     if snap == "1":
         snap = True
@@ -181,70 +183,195 @@ def get_products():
     else:
         snap = None
 
-    limit = int(request.args.get("limit", 20))
-    offset = int(request.args.get("offset", 0))
+    return {
+        "query": args.get("q"),
+        "snap": snap,
+        "store": args.get("store"),
+        "category": args.get("category"),
+        "limit": limit_arg(args, 20),
+        "cursor": args.get("cursor"),
+        "include_inactive": args.get("inactive") == "1"
+    }
 
-    products = db.search_products(query, snap, store, category, limit, offset)
-    return jsonify(products)
+
+@app.route("/api/products")
+@cache.cached(max_age=60)
+def get_products():
+    try:
+        products, next_cursor = db.search_products(**product_search_args(request.args))
+    except ValueError as e:
+        return json_response({"error": str(e)}, 400)
+
+    return json_response({"items": products, "next_cursor": next_cursor})
 
 
 @app.route("/api/bargains")
+@cache.cached(max_age=60)
 def get_bargains():
-    limit = int(request.args.get("limit", 50))
-    offset = int(request.args.get("offset", 0))
+    try:
+        limit = limit_arg(request.args, 50)
+        bargains, next_cursor = db.get_bargains(limit, request.args.get("cursor"))
+    except ValueError as e:
+        return json_response({"error": str(e)}, 400)
+
+    return json_response({"items": bargains, "next_cursor": next_cursor})
+
+
+@app.route("/api/events")
+@cache.cached(max_age=60)
+def get_price_events():
+    try:
+        limit = limit_arg(request.args, 50)
+        events, next_cursor = db.get_price_events(request.args.get("date"), request.args.get("event"),
+                                                  request.args.get("store"), limit, request.args.get("cursor"))
+    except ValueError as e:
+        return json_response({"error": str(e)}, 400)
+
+    return json_response({"items": events, "next_cursor": next_cursor})
+
+
+def date_args(args, *keys) -> dict:
+    # Shared with the ASGI server. Streamed responses have sent their headers before the database reads the dates,
+    # so they're checked up front.
+    dates = {key: args.get(key) for key in keys}
+
+    for key, value in dates.items():
+        if value:
+            try:
+                datetime.strptime(value, "%Y-%m-%d")
+            except ValueError:
+                raise ValueError(f"Invalid {key} date, expected YYYY-MM-DD: {value}")
 
-    bargains = db.get_bargains(limit, offset)
-    return jsonify(bargains)
+    return dates
 
 
 @app.route("/api/price-history/<store>/<sku>")
+@cache.cached(max_age=60)
 def get_price_history(store, sku):
-    prices = db.get_prices(store, sku)
-
-    products = db.search_products(query=sku)
-    product = next((p for p in products if p["store"] == store and p["sku"] == sku), None)
+    product = db.get_product(store, sku)
 
     if not product:
-        return jsonify({"error": "Product not found"}), 404
+        return json_response({"error": "Product not found"}, 404)
+
+    bucket = request.args.get("bucket", "day")
 
-    dates = {}
-    for price in prices:
-        date = price["date"]
-        if date not in dates:
-            dates[date] = []
-        dates[date].append(price)
+    try:
+        dates = date_args(request.args, "start", "end")
+        price_history = db.get_price_history(product["id"], dates["start"], dates["end"], bucket)
+    except ValueError as e:
+        return json_response({"error": str(e)}, 400)
 
     result = {
         "product": product,
-        "price_history": [
-            {
-                "date": date,
-                "prices": date_prices,
-                "min_price": min(p["price"] for p in date_prices),
-                "max_price": max(p["price"] for p in date_prices),
-                "avg_price": sum(p["price"] for p in date_prices) / len(date_prices),
-                "location_count": len(date_prices),
-                "available_count": sum(1 for p in date_prices if p["available"])
-            }
-            for date, date_prices in sorted(dates.items(), reverse=True)
-        ]
+        "current_prices": db.get_current_prices(product["id"]),
+        "price_history": price_history
     }
 
-    return jsonify(result)
+    return json_response(result)
+
+
+@app.route("/api/price-history/<store>/<sku>/prices.ndjson")
+def stream_prices(store, sku):
+    product = db.get_product(store, sku)
+
+    if not product:
+        return json_response({"error": "Product not found"}, 404)
+
+    try:
+        dates = date_args(request.args, "start", "end")
+    except ValueError as e:
+        return json_response({"error": str(e)}, 400)
+
+    # Every per-location price, one JSON object per line, written as it's read from the database
+    prices = db.iter_prices(product["id"], dates["start"], dates["end"])
+    lines = (dumps(price) + b"\n" for price in prices)
+
+    return Response(stream_with_context(lines), mimetype="application/x-ndjson")
+
+
+def export_args(args) -> tuple[str, dict]:
+    # Shared with the ASGI server's native export route
+    format = args.get("format", "ndjson")
+    if format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown format: {format}")
+
+    filters = {
+        "store": args.get("store"),
+        "category": args.get("category"),
+        **date_args(args, "since", "until")
+    }
+
+    return format, filters
+
+
+@app.route("/api/export/<dataset>")
+def export(dataset):
+    if dataset not in EXPORTS:
+        return json_response({"error": f"Unknown export: {dataset}"}, 404)
+
+    try:
+        format, filters = export_args(request.args)
+    except ValueError as e:
+        return json_response({"error": str(e)}, 400)
+
+    # Rows go from the database cursor to the client a chunk at a time, so memory use doesn't grow with the export
+    method, columns = EXPORTS[dataset]
+    body = chain([export_header(format, columns)],
+                 map(row_encoder(format, columns), chunked(getattr(db, method)(**filters))))
+
+    headers = {"Content-Disposition": f'attachment; filename="{dataset}.{format}"', "Vary": "Accept-Encoding"}
+    if request.accept_encodings["gzip"]:
+        body = gzip_stream(body)
+        headers["Content-Encoding"] = "gzip"
+
+    return Response(stream_with_context(body), mimetype=EXPORT_FORMATS[format], headers=headers)
+
+
+@app.route("/api/basket", methods=["POST"])
+def plan_basket():
+    # {"items": [{"comparison_id": 1, "quantity": 2}, ...], "max_stores": 2, "stores": ["Cub", "ALDI"]}
+    data = request.json
+
+    if not isinstance(data, dict) or not data.get("items"):
+        return json_response({"error": "Missing required fields"}, 400)
+
+    stores = data.get("stores")
+    if stores is not None and (not isinstance(stores, list) or not all(isinstance(s, str) for s in stores)):
+        return json_response({"error": "stores must be a list of store names"}, 400)
+
+    try:
+        quantities = {}
+        for item in data["items"]:
+            comparison_id = int(item["comparison_id"])
+            quantity = int(item.get("quantity", 1))
+            if quantity < 1:
+                return json_response({"error": "quantity must be at least 1"}, 400)
+            quantities[comparison_id] = quantities.get(comparison_id, 0) + quantity
+        max_stores = int(data.get("max_stores", 2))
+    except (KeyError, TypeError, ValueError):
+        return json_response({"error": "Invalid basket"}, 400)
+
+    if max_stores < 1:
+        return json_response({"error": "max_stores must be at least 1"}, 400)
+
+    offers = db.get_basket_offers(list(quantities), stores)
+    return json_response(optimizer.plan_basket(offers, quantities, max_stores))
 
 
 @app.route("/api/comparisons", methods=["GET"])
+@cache.cached()
 def get_comparisons():
     comparisons = db.list_comparisons()
-    return jsonify(comparisons)
+    return json_response(comparisons)
 
 
 @app.route("/api/comparisons/<int:comparison_id>", methods=["GET"])
+@cache.cached()
 def get_comparison(comparison_id):
     comparison = db.get_comparison(comparison_id)
     if not comparison:
-        return jsonify({"error": "Comparison not found"}), 404
-    return jsonify(comparison)
+        return json_response({"error": "Comparison not found"}, 404)
+    return json_response(comparison)
 
 
 @app.route("/api/comparisons", methods=["POST"])
@@ -252,19 +379,20 @@ def create_comparison():
     data = request.json
 
     if not data or "title" not in data or "product_ids" not in data:
-        return jsonify({"error": "Missing required fields"}), 400
+        return json_response({"error": "Missing required fields"}, 400)
 
     title = data["title"]
     product_ids = data["product_ids"]
 
     if not title.strip():
-        return jsonify({"error": "Title cannot be empty"}), 400
+        return json_response({"error": "Title cannot be empty"}, 400)
 
     try:
         comparison_id = db.create_comparison(title, product_ids)
-        return jsonify({"id": comparison_id, "title": title}), 201
+        cache.invalidate()
+        return json_response({"id": comparison_id, "title": title}, 201)
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return json_response({"error": str(e)}, 500)
 
 
 @app.route("/api/comparisons/<int:comparison_id>", methods=["PUT"])
@@ -272,23 +400,27 @@ def update_comparison(comparison_id):
     data = request.json
 
     if not data:
-        return jsonify({"error": "No data provided"}), 400
+        return json_response({"error": "No data provided"}, 400)
 
     title = data.get("title")
     product_ids = data.get("product_ids")
 
     if not db.update_comparison(comparison_id, title, product_ids):
-        return jsonify({"error": "Comparison not found"}), 404
+        return json_response({"error": "Comparison not found"}, 404)
 
-    return jsonify({"success": True})
+    cache.invalidate()
+
+    return json_response({"success": True})
 
 
 @app.route("/api/comparisons/<int:comparison_id>", methods=["DELETE"])
 def delete_comparison(comparison_id):
     if not db.delete_comparison(comparison_id):
-        return jsonify({"error": "Comparison not found"}), 404
+        return json_response({"error": "Comparison not found"}, 404)
+
+    cache.invalidate()
 
-    return jsonify({"success": True})
+    return json_response({"success": True})
 
 
 if __name__ == "__main__":
@@ -0,0 +1,60 @@
+# Prometheus text exposition for the most recent scrape run. Every value is a gauge labelled by store and location,
+# so dashboards can chart which job is the long pole from one run to the next.
+
+SCRAPE_GAUGES = [
+    ("wall_time", "prices_scrape_wall_seconds", "Wall time of the scrape job"),
+    ("network_time", "prices_scrape_network_seconds", "Time spent waiting on store APIs, summed across concurrent requests"),
+    ("wait_time", "prices_scrape_wait_seconds", "Time spent in politeness and retry delays, summed across threads"),
+    ("parse_time", "prices_scrape_parse_seconds", "Time spent parsing store API responses"),
+    ("db_time", "prices_scrape_db_seconds", "Time spent writing the job's products to the database"),
+    ("http_requests", "prices_scrape_http_requests", "HTTP requests made by the scrape job"),
+    ("http_bytes", "prices_scrape_http_bytes", "Response bytes downloaded by the scrape job"),
+    ("retries", "prices_scrape_retries", "Failed requests that were retried"),
+    ("products", "prices_scrape_products", "Products yielded by the scraper"),
+    ("db_rows", "prices_scrape_db_rows", "Price rows written to the database"),
+]
+
+
+def escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def render_prometheus(scrape_metrics: list[dict]) -> str:
+    lines = []
+
+    for key, name, description in SCRAPE_GAUGES:
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} gauge")
+        for job in scrape_metrics:
+            labels = f'store="{escape_label(job["store"])}",location="{escape_label(job["location_name"])}"'
+            lines.append(f"{name}{{{labels}}} {job[key]}")
+
+    lines.append("# HELP prices_scrape_errors Scrape jobs that failed in the most recent run")
+    lines.append("# TYPE prices_scrape_errors gauge")
+    lines.append(f"prices_scrape_errors {sum(1 for job in scrape_metrics if job['error'])}")
+
+    return "\n".join(lines) + "\n"
+
+
+def render_cache_metrics(stats: dict) -> str:
+    lines = [
+        "# HELP prices_web_cache_requests_total Requests served by cached views",
+        "# TYPE prices_web_cache_requests_total counter",
+        f'prices_web_cache_requests_total{{result="hit"}} {stats["hits"]}',
+        f'prices_web_cache_requests_total{{result="miss"}} {stats["misses"]}',
+        "# HELP prices_web_cache_seconds_total Time spent serving cached views",
+        "# TYPE prices_web_cache_seconds_total counter",
+        f'prices_web_cache_seconds_total{{result="hit"}} {stats["hit_seconds"]}',
+        f'prices_web_cache_seconds_total{{result="miss"}} {stats["miss_seconds"]}',
+        "# HELP prices_web_cache_not_modified_total Cached views answered with 304 Not Modified",
+        "# TYPE prices_web_cache_not_modified_total counter",
+        f"prices_web_cache_not_modified_total {stats['not_modified']}",
+        "# HELP prices_web_cache_evictions_total Entries evicted to stay within the cache size",
+        "# TYPE prices_web_cache_evictions_total counter",
+        f"prices_web_cache_evictions_total {stats['evictions']}",
+        "# HELP prices_web_cache_entries Responses currently cached",
+        "# TYPE prices_web_cache_entries gauge",
+        f"prices_web_cache_entries {stats['entries']}"
+    ]
+
+    return "\n".join(lines) + "\n"
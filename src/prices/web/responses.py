@@ -0,0 +1,129 @@
+import csv
+import gzip
+import io
+import json
+import zlib
+
+from flask import current_app, request
+
+# Both are optional (pip install prices[speedups]); without them responses fall back to the standard library's
+# json and gzip-only compression
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this aren't worth the CPU or the extra headers
+MIN_COMPRESS_SIZE = 1024
+
+COMPRESSIBLE_MIMETYPES = {"application/json", "text/html", "text/plain", "text/csv", "application/x-ndjson"}
+
+
+def dumps(data) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(",", ":")).encode()
+
+
+def json_response(data, status: int = 200):
+    return current_app.response_class(dumps(data), status=status, mimetype="application/json")
+
+
+def choose_encoding(body: bytes, mimetype: str, accepted=None) -> str | None:
+    # Brotli when the client and server both support it, otherwise gzip, otherwise send the body as is. accepted
+    # defaults to the current Flask request's Accept-Encoding.
+    if len(body) < MIN_COMPRESS_SIZE or mimetype not in COMPRESSIBLE_MIMETYPES:
+        return None
+
+    if accepted is None:
+        accepted = request.accept_encodings
+    if brotli is not None and accepted["br"]:
+        return "br"
+    if accepted["gzip"]:
+        return "gzip"
+
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6)
+
+
+def compress_response(response):
+    # after_request hook for responses that weren't already compressed by the response cache
+    if response.direct_passthrough or response.is_streamed or "Content-Encoding" in response.headers:
+        return response
+
+    response.vary.add("Accept-Encoding")
+
+    body = response.get_data()
+    encoding = choose_encoding(body, response.mimetype)
+    if encoding is None:
+        return response
+
+    response.set_data(compress(body, encoding))
+    response.headers["Content-Encoding"] = encoding
+    return response
+
+
+# Streamed export formats and their content types
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv"
+}
+
+
+class CsvEncoder:
+    # Encodes successive chunks of rows as the lines of one CSV document; its header comes from export_header()
+    def __init__(self, columns: list[str]):
+        self.columns = columns
+
+    def __call__(self, rows: list[dict]) -> bytes:
+        buffer = io.StringIO()
+        csv.DictWriter(buffer, self.columns).writerows(rows)
+        return buffer.getvalue().encode()
+
+
+def ndjson(rows: list[dict]) -> bytes:
+    return b"".join(dumps(row) + b"\n" for row in rows)
+
+
+def row_encoder(format: str, columns: list[str]):
+    return ndjson if format == "ndjson" else CsvEncoder(columns)
+
+
+def export_header(format: str, columns: list[str]) -> bytes:
+    # Sent before the first chunk of rows, so a CSV export with no rows still has its header
+    if format != "csv":
+        return b""
+    buffer = io.StringIO()
+    csv.DictWriter(buffer, columns).writeheader()
+    return buffer.getvalue().encode()
+
+
+def chunked(rows, size: int = 500):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def gzip_stream(chunks):
+    # Gzip a stream of byte chunks on the fly, without buffering the whole body
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        body = compressor.compress(chunk)
+        if body:
+            yield body
+    yield compressor.flush()
@@ -0,0 +1,57 @@
+import asyncio
+import threading
+
+import pytest
+
+from prices.web import asgi, main
+
+
+def get(path: str, query: str = "", headers: dict | None = None) -> tuple[int, dict, bytes]:
+    # One GET through the ASGI app, returning the status, headers and the whole body
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": path,
+        "query_string": query.encode(),
+        "headers": [(key.lower().encode(), value.encode()) for key, value in (headers or {}).items()],
+    }
+    asyncio.run(asgi.app(scope, receive, send))
+
+    start = messages[0]
+    return (start["status"], {key.decode(): value.decode() for key, value in start["headers"]},
+            b"".join(message.get("body", b"") for message in messages[1:]))
+
+
+def test_native_routes_share_the_flask_apps_cached_responses(client):
+    flask = client.get("/api/products", query_string={"limit": "3"})
+    status, headers, body = get("/api/products", "limit=3")
+
+    assert status == 200
+    assert body == flask.data
+    assert headers["etag"].strip('"') == flask.headers["ETag"].strip('"')
+
+    status, _, body = get("/api/products", "limit=3", {"If-None-Match": headers["etag"]})
+    assert status == 304
+    assert body == b""
+
+
+@pytest.mark.parametrize("path", ["/api/products", "/api/bargains"])
+def test_native_routes_reject_invalid_limits(client, path):
+    status, _, _ = get(path, "limit=0")
+    assert status == 400
+
+
+def test_streams_run_on_their_own_pool(client):
+    status, headers, body = get("/api/export/prices", "format=csv&store=Nowhere")
+
+    assert status == 200
+    assert body.decode().splitlines() == [",".join(main.EXPORTS["prices"][1])]
+    assert any(thread.name.startswith("db-stream") for thread in threading.enumerate())
@@ -0,0 +1,89 @@
+import gzip
+
+import pytest
+from flask import Flask
+
+from prices.web.cache import ResponseCache
+from prices.web.responses import json_response
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.version = "1"
+    app.calls = 0
+    app.cache = ResponseCache(lambda: app.version, version_interval=0)
+
+    @app.route("/items")
+    @app.cache.cached(max_age=60)
+    def items():
+        app.calls += 1
+        return json_response({"version": app.version, "padding": "x" * 2000})
+
+    @app.route("/missing")
+    @app.cache.cached()
+    def missing():
+        app.calls += 1
+        return json_response({"error": "Not found"}, 404)
+
+    return app
+
+
+def test_responses_are_served_from_the_cache(app):
+    client = app.test_client()
+    first = client.get("/items")
+    second = client.get("/items")
+
+    assert app.calls == 1
+    assert first.data == second.data
+    assert first.headers["ETag"] == second.headers["ETag"]
+    assert first.headers["Cache-Control"] == "public, max-age=60"
+
+
+def test_matching_etags_get_not_modified(app):
+    client = app.test_client()
+    etag = client.get("/items").headers["ETag"]
+
+    response = client.get("/items", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.data == b""
+
+
+def test_a_new_data_version_drops_cached_responses(app):
+    client = app.test_client()
+    etag = client.get("/items").headers["ETag"]
+
+    app.version = "2"
+    response = client.get("/items", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.get_json()["version"] == "2"
+    assert response.headers["ETag"] != etag
+    assert app.calls == 2
+
+
+def test_each_encoding_has_its_own_etag(app):
+    client = app.test_client()
+    plain = client.get("/items")
+    compressed = client.get("/items", headers={"Accept-Encoding": "gzip"})
+
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(compressed.data) == plain.data
+    assert compressed.headers["ETag"] != plain.headers["ETag"]
+    assert "Accept-Encoding" in compressed.headers["Vary"]
+
+
+def test_errors_are_not_cached(app):
+    client = app.test_client()
+    assert client.get("/missing").status_code == 404
+    assert client.get("/missing").status_code == 404
+    assert app.calls == 2
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = ResponseCache(lambda: "1", max_entries=2)
+    for key in ("a", "b", "c"):
+        cache.store(key, "1", key.encode(), "text/plain")
+
+    assert cache.get("a", "1") is None
+    assert cache.get("c", "1").body == b"c"
+    assert cache.snapshot()["evictions"] == 1
@@ -0,0 +1,91 @@
+import gzip
+import json
+
+import pytest
+
+from prices.web import main
+
+
+@pytest.mark.parametrize("path", ["/api/products", "/api/bargains", "/api/events"])
+@pytest.mark.parametrize("limit", ["0", "-1", "ten"])
+def test_invalid_limits_are_rejected(client, path, limit):
+    response = client.get(path, query_string={"limit": limit})
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+
+def test_large_limits_are_capped(client, monkeypatch):
+    monkeypatch.setattr(main, "MAX_LIMIT", 2)
+    response = client.get("/api/products", query_string={"limit": "1000"})
+    assert response.status_code == 200
+    assert len(response.get_json()["items"]) == 2
+
+
+def test_products_page_through_with_cursors(client):
+    names = []
+    query = {"limit": "2"}
+    while True:
+        body = client.get("/api/products", query_string=query).get_json()
+        names.extend(item["name"] for item in body["items"])
+        if body["next_cursor"] is None:
+            break
+        query["cursor"] = body["next_cursor"]
+
+    assert names == [f"Product {sku}" for sku in range(5)]
+
+
+@pytest.mark.parametrize("path", ["/api/products", "/api/bargains", "/api/events"])
+def test_invalid_cursors_are_rejected(client, path):
+    assert client.get(path, query_string={"cursor": "garbage"}).status_code == 400
+
+
+@pytest.mark.parametrize("body", [
+    [1, 2],
+    {"items": []},
+    {"items": [{"quantity": 1}]},
+    {"items": [{"comparison_id": 1, "quantity": 0}]},
+    {"items": [{"comparison_id": 1, "quantity": -3}]},
+    {"items": [{"comparison_id": 1}], "max_stores": 0},
+    {"items": [{"comparison_id": 1}], "stores": "Cub"},
+    {"items": [{"comparison_id": 1}], "stores": [1]},
+])
+def test_invalid_baskets_are_rejected(client, body):
+    response = client.post("/api/basket", json=body)
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+
+def test_basket_is_planned(client):
+    products, _ = main.db.search_products(limit=2)
+    comparison_id = main.db.create_comparison("Product", [product["id"] for product in products])
+
+    response = client.post("/api/basket", json={"items": [{"comparison_id": comparison_id, "quantity": 2}],
+                                                "stores": ["Cub"]})
+    assert response.status_code == 200
+    assert response.get_json()["total"] == 3.98
+
+
+def test_csv_export(client):
+    response = client.get("/api/export/products", query_string={"format": "csv"})
+    lines = response.data.decode().splitlines()
+    assert response.status_code == 200
+    assert response.mimetype == "text/csv"
+    assert lines[0] == ",".join(main.EXPORTS["products"][1])
+    assert len(lines) == 6
+
+
+def test_empty_csv_export_still_has_its_header(client):
+    response = client.get("/api/export/prices", query_string={"format": "csv", "store": "Nowhere"})
+    assert response.data.decode().splitlines() == [",".join(main.EXPORTS["prices"][1])]
+
+
+def test_ndjson_export_is_gzipped_when_accepted(client):
+    response = client.get("/api/export/prices", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    rows = [json.loads(line) for line in gzip.decompress(response.data).splitlines()]
+    assert sorted(row["sku"] for row in rows) == [str(sku) for sku in range(5)]
+
+
+@pytest.mark.parametrize("query", [{"format": "xml"}, {"since": "last week"}])
+def test_invalid_export_arguments_are_rejected(client, query):
+    assert client.get("/api/export/products", query_string=query).status_code == 400